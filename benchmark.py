@@ -0,0 +1,786 @@
+import argparse
+import asyncio
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bs4 import BeautifulSoup
+
+import collection
+
+
+def synthetic_profile(username="octocat", repositories=60, followers=120, following=7):
+    # A profile page of roughly the size and shape GitHub serves: navigation,
+    # a pinned/repository list, the contribution calendar and follower links
+    navigation = "".join(
+        f'<li class="nav-item"><a class="js-nav" href="/nav/{i}">Item {i}</a></li>'
+        for i in range(200)
+    )
+    repository_items = "".join(
+        f'<li class="col-12 d-flex width-full py-4 border-bottom">'
+        f'<div class="d-inline-block mb-1"><h3 class="wb-break-all">'
+        f'<a href="/{username}/repo-{i}" itemprop="name codeRepository">repo-{i}</a>'
+        f'</h3></div><p class="col-9 d-inline-block color-fg-muted mb-2 pr-4">'
+        f"Description of repository number {i} with some longer text.</p>"
+        f'<div class="f6 color-fg-muted mt-2"><span itemprop="programmingLanguage">'
+        f'Python</span><relative-time datetime="2024-01-01T00:00:00Z">Jan 1'
+        f"</relative-time></div></li>"
+        for i in range(repositories)
+    )
+    calendar = "".join(
+        f'<td tabindex="0" data-ix="{day}" data-date="2024-01-01" '
+        f'class="ContributionCalendar-day" data-level="{day % 5}"></td>'
+        for day in range(371)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Profile</title>"
+        + "".join(f'<meta name="m{i}" content="value {i}">' for i in range(50))
+        + f"</head><body><header><ul>{navigation}</ul></header>"
+        '<div class="js-profile-editable-area">'
+        f'<a class="Link--secondary no-underline" href="/{username}?tab=followers">'
+        f'<svg class="octicon"></svg><span class="text-bold">{followers}</span>'
+        " followers</a> · "
+        f'<a class="Link--secondary no-underline" href="/{username}?tab=following">'
+        f'<span class="text-bold">{following}</span> following</a></div>'
+        f'<ul data-filterable-for="your-repos-filter">{repository_items}</ul>'
+        '<div class="js-yearly-contributions" data-count="1234">'
+        f"<table><tbody><tr>{calendar}</tr></tbody></table></div>"
+        "<footer>" + "<p>footer text</p>" * 100 + "</footer></body></html>"
+    ).encode("utf-8")
+
+
+def legacy_parse(content):
+    # The original scrape_user_profile parse: the whole document with
+    # html.parser, then three lookups
+    soup = BeautifulSoup(content, "html.parser")
+    contributions = int(
+        soup.find("div", class_="js-yearly-contributions")["data-count"]
+    )
+    links = soup.find_all("a", class_="Link--secondary")
+    return (
+        contributions,
+        int(links[0].span.get_text(strip=True)),
+        int(links[1].span.get_text(strip=True)),
+    )
+
+
+def profile_parse(content, parser, contributions_only=False):
+    user = collection.GitHubUser("benchmark")
+    user.parse_profile_html(
+        content, contributions_only=contributions_only, parser=parser
+    )
+    return user.contributions_last_year, user.followers_count, user.following_count
+
+
+def measure(function, fixtures, iterations):
+    timings = []
+    for _ in range(iterations):
+        for content in fixtures:
+            start = time.perf_counter()
+            function(content)
+            timings.append(time.perf_counter() - start)
+
+    peaks = []
+    for content in fixtures:
+        tracemalloc.start()
+        function(content)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return statistics.mean(timings), statistics.mean(peaks)
+
+
+# Saved profile pages of a busy, a casual and a brand-new account
+PROFILE_FIXTURES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "profiles"
+)
+
+
+def benchmark_profiles(fixtures_dir=PROFILE_FIXTURES, iterations=20):
+    # fixtures_dir=None measures the synthetic profile instead
+    if fixtures_dir:
+        fixtures = []
+        for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+            with open(path, "rb") as fixture:
+                fixtures.append(fixture.read())
+    else:
+        fixtures = [synthetic_profile()]
+
+    if not fixtures:
+        print(f"Error: No .html profile fixtures found in {fixtures_dir}.")
+        return []
+
+    cases = [
+        ("html.parser, full document (legacy)", legacy_parse),
+        (
+            "html.parser, strained",
+            lambda content: profile_parse(content, "html.parser"),
+        ),
+        (
+            "html.parser, contributions only (API counts)",
+            lambda content: profile_parse(content, "html.parser", True),
+        ),
+    ]
+    if collection.HTML_PARSER == "lxml":
+        cases += [
+            ("lxml, strained", lambda content: profile_parse(content, "lxml")),
+            (
+                "lxml, contributions only (API counts)",
+                lambda content: profile_parse(content, "lxml", True),
+            ),
+        ]
+
+    size = statistics.mean(len(content) for content in fixtures)
+    print(f"Profile fixtures: {len(fixtures)}, average size: {size / 1024:.0f} KiB")
+
+    results = []
+    baseline = None
+    for name, function in cases:
+        mean_time, mean_peak = measure(function, fixtures, iterations)
+        baseline = baseline or mean_time
+        results.append(
+            {"case": name, "parse_time": mean_time, "peak_memory": mean_peak}
+        )
+        print(
+            f"{name:<45} {mean_time * 1000:8.2f} ms/profile "
+            f"{mean_peak / 1024:8.0f} KiB peak  {baseline / mean_time:5.1f}x"
+        )
+    return results
+
+
+class LazyPullRequests:
+    # A sliceable stand-in for the full PR list that only renders one page;
+    # numbers gives the listing order
+    def __init__(self, handler, owner, name, numbers):
+        self.handler = handler
+        self.owner = owner
+        self.name = name
+        self.numbers = numbers
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __getitem__(self, page):
+        return [
+            self.handler.pull_request(self.owner, self.name, number)
+            for number in self.numbers[page]
+        ]
+
+
+class MockGitHubHandler(BaseHTTPRequestHandler):
+    # Keep-alive like the real API, so connection pooling is exercised
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # response would stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200, headers=None):
+        self.send_body(json.dumps(data).encode("utf-8"), status, headers)
+
+    def send_body(self, body, status=200, headers=None, content_type=None):
+        if status == 200:
+            # Validators and freshness the way GitHub sends them, so the
+            # client's cache revalidates with If-None-Match
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            headers = {
+                **(headers or {}),
+                "ETag": etag,
+                "Cache-Control": "private, max-age=60",
+            }
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type or "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def rate_limit(self, resource="core"):
+        # A fixed window of rate_limit requests per resource, reported the
+        # way GitHub does; past the limit requests are rejected with a 403
+        # until the reset
+        config = self.server.config
+        with self.server.lock:
+            now = time.time()
+            window = self.server.windows.setdefault(resource, [0.0, 0])
+            if now >= window[0]:
+                window[0] = now + config["rate_limit_window"]
+                window[1] = 0
+            window[1] += 1
+            remaining = config["rate_limit"] - window[1]
+            reset = window[0]
+        headers = {
+            "X-RateLimit-Resource": resource,
+            "X-RateLimit-Limit": str(config["rate_limit"]),
+            "X-RateLimit-Remaining": str(max(remaining, 0)),
+            "X-RateLimit-Reset": str(int(reset) + 1),
+        }
+        if remaining < 0:
+            self.send_json(
+                {"message": "API rate limit exceeded"}, status=403, headers=headers
+            )
+            return None
+        return headers
+
+    def pull_request(self, owner, name, number):
+        updated_at = self.server.updated_at(number)
+        return {
+            "number": number,
+            "title": f"Pull request {number}",
+            "body": "Synthetic pull request body " * 8,
+            "state": "open" if number % 4 == 0 else "closed",
+            "created_at": time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime(1577836800 + number * 3600)
+            ),
+            "closed_at": (
+                None
+                if number % 4 == 0
+                else time.strftime(
+                    "%Y-%m-%dT%H:%M:%SZ", time.gmtime(1577836800 + number * 7200)
+                )
+            ),
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(updated_at)),
+            # Two in three closed pull requests were merged
+            "merged_at": (
+                None
+                if number % 4 == 0 or number % 3 == 0
+                else time.strftime(
+                    "%Y-%m-%dT%H:%M:%SZ", time.gmtime(1577836800 + number * 7200)
+                )
+            ),
+            "user": {"login": f"user{number % self.server.config['users']}"},
+            "head": {"sha": f"head{number}"},
+            "base": {"sha": f"base{number}", "repo": {"full_name": f"{owner}/{name}"}},
+        }
+
+    def commit_count(self, number):
+        # Every 1000th pull request is larger than the 250 commits GitHub
+        # lists per PR, so the compare fallback gets exercised
+        return 300 if number % 1000 == 0 else number % 7 + 1
+
+    def commits(self, number):
+        users = self.server.config["users"]
+        return [
+            {
+                "sha": f"{number}-{index}",
+                # Some commits are not linked to a GitHub account
+                "author": (
+                    None
+                    if index % 5 == 4
+                    else {"login": f"user{(number + index) % users}"}
+                ),
+            }
+            for index in range(self.commit_count(number))
+        ]
+
+    def send_page(self, url, query, items, headers, wrap=None):
+        # page/per_page pagination with a Link: rel="next" header
+        page = int(query.get("page", ["1"])[0])
+        per_page = int(query.get("per_page", ["30"])[0])
+        if page * per_page < len(items):
+            next_query = dict(query, page=[str(page + 1)])
+            link = "&".join(f"{key}={value[0]}" for key, value in next_query.items())
+            headers["Link"] = (
+                f'<http://{self.headers["Host"]}{url.path}?{link}>; rel="next"'
+            )
+        items = items[(page - 1) * per_page : page * per_page]
+        self.send_json(wrap(items) if wrap else items, headers=headers)
+
+    def do_GET(self):
+        config = self.server.config
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        time.sleep(config["latency"])
+
+        if not url.path.startswith("/api/"):
+            # Profile pages live on the web host, outside the API budget
+            login = url.path.strip("/")
+            return self.send_body(
+                self.server.profile(login), content_type="text/html; charset=utf-8"
+            )
+
+        headers = self.rate_limit()
+        if headers is None:
+            return
+        path = url.path[len("/api") :]
+
+        match = re.fullmatch(r"/repos/([^/]+)/([^/]+)/pulls/(\d+)/commits", path)
+        if match:
+            # Like GitHub, this endpoint stops at 250 commits
+            return self.send_page(
+                url, query, self.commits(int(match[3]))[:250], headers
+            )
+
+        match = re.fullmatch(
+            r"/repos/([^/]+)/([^/]+)/compare/base(\d+)\.\.\.head\d+", path
+        )
+        if match:
+            return self.send_page(
+                url,
+                query,
+                self.commits(int(match[3])),
+                headers,
+                wrap=lambda commits: {"commits": commits},
+            )
+
+        match = re.fullmatch(r"/repos/([^/]+)/([^/]+)/pulls/(\d+)", path)
+        if match:
+            number = int(match[3])
+            return self.send_json(
+                {
+                    "commits": self.commit_count(number),
+                    "additions": number % 500,
+                    "deletions": number % 200,
+                    "changed_files": number % 30,
+                },
+                headers=headers,
+            )
+
+        match = re.fullmatch(r"/repos/([^/]+)/([^/]+)/pulls", path)
+        if match:
+            # Pages are built lazily; listing 100k PRs stays cheap
+            numbers = self.server.listing_order(
+                by_update=query.get("sort") == ["updated"],
+                descending=query.get("direction") == ["desc"],
+            )
+            # Like GitHub, only open pull requests unless asked otherwise
+            state = query.get("state", ["open"])[0]
+            if state != "all":
+                numbers = [
+                    number
+                    for number in numbers
+                    if (number % 4 == 0) == (state == "open")
+                ]
+            return self.send_page(
+                url, query, LazyPullRequests(self, match[1], match[2], numbers), headers
+            )
+
+        match = re.fullmatch(r"/repos/([^/]+)/([^/]+)", path)
+        if match:
+            return self.send_json(
+                {
+                    "description": "Synthetic repository",
+                    "homepage": "https://example.com",
+                    "license": {"name": "MIT License"},
+                    "forks": 42,
+                    "watchers": 1337,
+                },
+                headers=headers,
+            )
+
+        match = re.fullmatch(r"/users/([^/]+)", path)
+        if match:
+            return self.send_json(
+                {"followers": 120, "following": 7, "public_repos": 60},
+                headers=headers,
+            )
+
+        self.send_json({"message": "Not Found"}, status=404, headers=headers)
+
+    def do_POST(self):
+        config = self.server.config
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(config["latency"])
+        headers = self.rate_limit("graphql")
+        if headers is None:
+            return
+        if urlparse(self.path).path != "/api/graphql":
+            return self.send_json({"message": "Not Found"}, status=404, headers=headers)
+
+        # Like the real query, newest updates first; the cursor is an offset
+        variables = body["variables"]
+        numbers = self.server.listing_order(by_update=True, descending=True)
+        first = int(variables.get("cursor") or 0)
+        last = min(first + variables["pageSize"], len(numbers))
+        nodes = []
+        for number in numbers[first:last]:
+            pr = self.pull_request(variables["owner"], variables["name"], number)
+            nodes.append(
+                {
+                    "number": number,
+                    "title": pr["title"],
+                    "body": pr["body"],
+                    "state": pr["state"].upper(),
+                    "createdAt": pr["created_at"],
+                    "closedAt": pr["closed_at"],
+                    "updatedAt": pr["updated_at"],
+                    "mergedAt": pr["merged_at"],
+                    "author": pr["user"],
+                    "headRefOid": pr["head"]["sha"],
+                    "baseRefOid": pr["base"]["sha"],
+                    "baseRepository": {
+                        "nameWithOwner": pr["base"]["repo"]["full_name"]
+                    },
+                    "commits": {"totalCount": self.commit_count(number)},
+                    "additions": number % 500,
+                    "deletions": number % 200,
+                    "changedFiles": number % 30,
+                }
+            )
+        page_info = {
+            "hasNextPage": last < len(numbers),
+            "endCursor": str(last),
+        }
+        self.send_json(
+            {
+                "data": {
+                    "repository": {
+                        "pullRequests": {"pageInfo": page_info, "nodes": nodes}
+                    }
+                }
+            },
+            headers=headers,
+        )
+
+
+class MockGitHubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(
+        self,
+        pull_requests=100,
+        users=50,
+        latency=0.0,
+        rate_limit=10**9,
+        rate_limit_window=3600,
+    ):
+        super().__init__(("127.0.0.1", 0), MockGitHubHandler)
+        self.config = {
+            "pull_requests": pull_requests,
+            "users": users,
+            "latency": latency,
+            "rate_limit": rate_limit,
+            "rate_limit_window": rate_limit_window,
+        }
+        self.lock = threading.Lock()
+        # resource -> [window reset, requests used]
+        self.windows = {}
+        self._profiles = {}
+        # Pull requests updated after the listing was generated, in order
+        self.touched = {}
+
+    def touch(self, *numbers):
+        # Marks pull requests as updated just now, after every other one
+        with self.lock:
+            for number in numbers:
+                self.touched[number] = len(self.touched) + 1
+
+    def updated_at(self, number):
+        if number in self.touched:
+            last = 1577836800 + self.config["pull_requests"] * 7200
+            return last + self.touched[number] * 60
+        return 1577836800 + number * 7200
+
+    def listing_order(self, by_update=False, descending=False):
+        # Pull request numbers oldest first, by creation or by update
+        numbers = range(1, self.config["pull_requests"] + 1)
+        if by_update and self.touched:
+            touched = sorted(self.touched, key=self.touched.get)
+            numbers = [
+                number for number in numbers if number not in self.touched
+            ] + touched
+        return numbers[::-1] if descending else numbers
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def profile(self, login):
+        with self.lock:
+            if login not in self._profiles:
+                self._profiles[login] = synthetic_profile(login)
+            return self._profiles[login]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+async def collect_async(client, users, backend, writers):
+    async with client:
+        return await collection.collect_data_for_repository_async(
+            "benchmark",
+            "repository",
+            users,
+            client=client,
+            backend=backend,
+            writers=writers,
+            compact=True,
+        )
+
+
+def run_collection(url, backend, detail_workers, async_concurrency=None):
+    # Runs in a fresh process so the peak RSS belongs to this scale alone
+    if async_concurrency:
+        client = collection.AsyncGitHubClient(
+            api_url=f"{url}/api",
+            web_url=url,
+            tokens=[],
+            max_concurrency=async_concurrency,
+        )
+    else:
+        client = collection.GitHubClient(
+            api_url=f"{url}/api", web_url=url, tokens=[], pool_size=detail_workers + 2
+        )
+    users = collection.UserRegistry(client)
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            writers = collection.open_csv_writers(directory)
+            if async_concurrency:
+                repo = asyncio.run(collect_async(client, users, backend, writers))
+            else:
+                repo = collection.collect_data_for_repository(
+                    "benchmark",
+                    "repository",
+                    users,
+                    max_workers=detail_workers,
+                    client=client,
+                    backend=backend,
+                    writers=writers,
+                    compact=True,
+                )
+                client.close()
+            collection.close_csv_writers(writers)
+            collect_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            repo.get_summary()
+            collection.analytics.daily_counts(repo)
+            collection.analytics.correlation([repo])
+            collection.prepare_chart_data([repo])
+            analysis_time = time.perf_counter() - start
+
+    stats = client.stats()
+    return {
+        "pull_requests": len(repo.pull_requests),
+        "requests": stats["requests"],
+        "collect_time": collect_time,
+        "analysis_time": analysis_time,
+        "rate_limit_wait_time": stats["rate_limit_wait_time"],
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def benchmark_collection(
+    scales=(100, 10000, 100000),
+    backend="rest",
+    detail_workers=8,
+    latency=0.0,
+    rate_limit=10**9,
+    rate_limit_window=3600,
+    users=50,
+    output=None,
+    async_concurrency=None,
+):
+    concurrency = (
+        f"async, {async_concurrency} in flight"
+        if async_concurrency
+        else f"detail workers: {detail_workers}"
+    )
+    print(f"Backend: {backend}, {concurrency}, latency: {latency * 1000:.0f} ms")
+    print(
+        f"{'PRs':>8} {'requests':>9} {'wall time':>10} {'req/s':>8} "
+        f"{'analysis':>9} {'quota wait':>11} {'peak RSS':>10}"
+    )
+
+    results = []
+    for scale in scales:
+        server = MockGitHubServer(
+            pull_requests=scale,
+            users=users,
+            latency=latency,
+            rate_limit=rate_limit,
+            rate_limit_window=rate_limit_window,
+        ).start()
+        try:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(
+                    run_collection,
+                    server.url,
+                    backend,
+                    detail_workers,
+                    async_concurrency,
+                ).result()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        result["scale"] = scale
+        result["requests_per_second"] = result["requests"] / result["collect_time"]
+        results.append(result)
+        print(
+            f"{scale:>8} {result['requests']:>9} {result['collect_time']:>9.2f}s "
+            f"{result['requests_per_second']:>8.0f} {result['analysis_time']:>8.2f}s "
+            f"{result['rate_limit_wait_time']:>10.2f}s "
+            f"{result['peak_rss'] / 2**20:>7.0f} MiB"
+        )
+
+    if output:
+        with open(output, "w", encoding="utf-8") as results_file:
+            json.dump(
+                {
+                    "backend": backend,
+                    "detail_workers": detail_workers,
+                    "async_concurrency": async_concurrency,
+                    "latency": latency,
+                    "results": results,
+                },
+                results_file,
+                indent=2,
+            )
+    return results
+
+
+# Heavy stacks that must only load on first use, not with the scraper classes
+LAZY_MODULES = [
+    "pandas",
+    "numpy",
+    "matplotlib",
+    "seaborn",
+    "aiohttp",
+    "pyarrow",
+    "redis",
+]
+
+
+def measure_import(module="collection"):
+    # A fresh interpreter per run, so nothing is already in sys.modules
+    check = (
+        f"import sys, time; start = time.perf_counter(); import {module}; "
+        "elapsed = time.perf_counter() - start; "
+        f"print(elapsed, *[name for name in {LAZY_MODULES!r} if name in sys.modules])"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", check],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    return float(output[0]), output[1:]
+
+
+def benchmark_imports(runs=5, budget=None):
+    timings = []
+    loaded = set()
+    for _ in range(runs):
+        elapsed, modules = measure_import()
+        timings.append(elapsed)
+        loaded.update(modules)
+
+    median = statistics.median(timings)
+    print(
+        f"import collection: {median * 1000:.0f} ms median, "
+        f"{min(timings) * 1000:.0f} ms best of {runs}"
+    )
+    if loaded:
+        print(f"Error: Loaded eagerly: {', '.join(sorted(loaded))}")
+    if budget is not None and median * 1000 > budget:
+        print(f"Error: Import time is over the budget of {budget:.0f} ms.")
+    return not loaded and (budget is None or median * 1000 <= budget)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GitHub Data Scraper benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    profiles = subparsers.add_parser(
+        "profiles", help="Parse time and memory of user profile pages"
+    )
+    profiles.add_argument(
+        "--fixtures",
+        default=PROFILE_FIXTURES,
+        help="Directory of saved profile .html pages (default: tests/fixtures/profiles)",
+    )
+    profiles.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Measure the generated profile the mock server sends instead",
+    )
+    profiles.add_argument("--iterations", type=int, default=20)
+
+    imports = subparsers.add_parser(
+        "imports", help="Import time of collection.py and which stacks it loads"
+    )
+    imports.add_argument("--runs", type=int, default=5)
+    imports.add_argument(
+        "--budget",
+        type=float,
+        default=300,
+        help="Fail when the median import time exceeds this many ms (default: 300)",
+    )
+
+    collect = subparsers.add_parser(
+        "collection",
+        help="End-to-end collection and analysis against a local mock API",
+    )
+    collect.add_argument(
+        "--scales",
+        type=lambda value: [int(scale) for scale in value.split(",")],
+        default=[100, 10000, 100000],
+        help="Comma-separated pull request counts (default: 100,10000,100000)",
+    )
+    collect.add_argument("--backend", choices=["rest", "graphql"], default="rest")
+    collect.add_argument("--detail-workers", type=int, default=8)
+    collect.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every response"
+    )
+    collect.add_argument(
+        "--rate-limit",
+        type=int,
+        default=10**9,
+        help="API requests allowed per rate-limit window",
+    )
+    collect.add_argument("--rate-limit-window", type=float, default=3600)
+    collect.add_argument("--users", type=int, default=50, help="Distinct PR authors")
+    collect.add_argument("--output", help="Write the results as JSON to this file")
+    collect.add_argument(
+        "--async-concurrency",
+        type=int,
+        help="Use the asyncio client with this many requests in flight",
+    )
+
+    args = parser.parse_args()
+    if args.benchmark == "profiles":
+        benchmark_profiles(None if args.synthetic else args.fixtures, args.iterations)
+    elif args.benchmark == "imports":
+        if not benchmark_imports(args.runs, args.budget):
+            sys.exit(1)
+    elif args.benchmark == "collection":
+        benchmark_collection(
+            args.scales,
+            backend=args.backend,
+            detail_workers=args.detail_workers,
+            latency=args.latency,
+            rate_limit=args.rate_limit,
+            rate_limit_window=args.rate_limit_window,
+            users=args.users,
+            output=args.output,
+            async_concurrency=args.async_concurrency,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,1192 @@
+import argparse
+import asyncio
+import importlib.util
 import os
+import sys
 import time
+import random
+import re
+import json
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+import itertools
+from itertools import chain, islice
+import weakref
+import zlib
+from array import array
 import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from datetime import datetime, timedelta, timezone
 import csv
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 
-users = []
+class Metrics:
+    # Counters and latency histograms for a collection run, exportable as a
+    # JSON summary or in the Prometheus text format
+    buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def _key(self, name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    "counts": [0] * (len(self.buckets) + 1),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            histogram["counts"][bisect_left(self.buckets, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def to_dict(self):
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "average": histogram["sum"] / histogram["count"],
+                    "buckets": dict(
+                        zip(
+                            [str(bound) for bound in self.buckets] + ["+Inf"],
+                            histogram["counts"],
+                        )
+                    ),
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def print_summary(self):
+        # Total time per histogram across labels: network (HTTP requests),
+        # quota (rate-limit waits) and CPU (parsing, CSV writes)
+        totals = {}
+        with self._lock:
+            for (name, _), histogram in self.histograms.items():
+                count, seconds = totals.get(name, (0, 0.0))
+                totals[name] = (count + histogram["count"], seconds + histogram["sum"])
+        for name, (count, seconds) in sorted(totals.items()):
+            print(f"{name}: {count} observations, {seconds:.2f}s total")
+
+    def write_json(self, file_name):
+        with open(file_name, "w", encoding="utf-8") as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=2)
+
+    def to_prometheus(self):
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (
+                f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                for key, value in pairs
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram["counts"]):
+                    cumulative += count
+                    lines.append(
+                        f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+                lines.append(
+                    f"{name}_count{format_labels(labels)} {histogram['count']}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, file_name):
+        # Written atomically so a node_exporter textfile collector never
+        # reads a half-written file
+        temp_name = f"{file_name}.tmp"
+        with open(temp_name, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        os.replace(temp_name, file_name)
+
+
+metrics = Metrics()
+
+
+class RateLimiter:
+    def __init__(self, tokens, max_retries=5, base_backoff=1.0, max_backoff=60.0):
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        # One bucket per token for each rate-limit resource GitHub reports
+        # ("core" for REST, "graphql" for GraphQL points). "remaining" is None
+        # until GitHub tells us the real budget, and "reset" is the epoch time
+        # the bucket refills.
+        self.tokens = list(tokens or [None])
+        self.buckets = {}
+        self._lock = threading.Lock()
+        self.wait_count = 0
+        # Wall-clock seconds during which at least one request was held back;
+        # waits of concurrent threads overlap and are only counted once
+        self.wait_time = 0.0
+        self._waiting_until = 0.0
+        self.retries = 0
+
+    def _resource_buckets(self, resource):
+        # Called with the lock held
+        buckets = self.buckets.get(resource)
+        if buckets is None:
+            buckets = self.buckets[resource] = {
+                token: {"remaining": None, "reset": 0.0} for token in self.tokens
+            }
+        return buckets
+
+    def reserve(self, resource="core"):
+        # Returns (True, token) when a token has budget left for resource,
+        # otherwise (False, seconds to wait); the caller decides how to wait
+        with self._lock:
+            buckets = self._resource_buckets(resource)
+            now = time.time()
+            available = []
+            for token, bucket in buckets.items():
+                if bucket["reset"] <= now and bucket["remaining"] == 0:
+                    bucket["remaining"] = None
+                if bucket["remaining"] is None or bucket["remaining"] > 0:
+                    available.append(token)
+
+            if available:
+                # Spread load onto the token with the largest known budget
+                token = max(
+                    available,
+                    key=lambda t: (
+                        float("inf")
+                        if buckets[t]["remaining"] is None
+                        else buckets[t]["remaining"]
+                    ),
+                )
+                if buckets[token]["remaining"] is not None:
+                    buckets[token]["remaining"] -= 1
+                return True, token
+
+            # Every token is exhausted; wait until the first one refills
+            wait = max(min(b["reset"] for b in buckets.values()) - now, 0)
+            wait += random.uniform(0, 1)
+            self._record_wait(now, wait)
+        metrics.observe("github_rate_limit_wait_seconds", wait)
+        return False, wait
+
+    def acquire(self, resource="core"):
+        while True:
+            acquired, value = self.reserve(resource)
+            if acquired:
+                return value
+            time.sleep(value)
+
+    async def acquire_async(self, resource="core"):
+        while True:
+            acquired, value = self.reserve(resource)
+            if acquired:
+                return value
+            await asyncio.sleep(value)
+
+    def update(self, token, response, resource="core"):
+        # GitHub names the budget a response was charged to
+        resource = response.headers.get("X-RateLimit-Resource", resource)
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None or token not in self.tokens:
+            return
+
+        try:
+            remaining = int(remaining)
+            reset = float(reset)
+        except ValueError:
+            return
+
+        with self._lock:
+            bucket = self._resource_buckets(resource)[token]
+            # Within the same window, other in-flight requests may already
+            # have spent part of the budget reported by this response
+            if bucket["reset"] == reset and bucket["remaining"] is not None:
+                remaining = min(remaining, bucket["remaining"])
+            bucket["remaining"] = remaining
+            bucket["reset"] = reset
+
+    def is_rate_limited(self, response):
+        if response.status_code == 429:
+            return True
+        if response.status_code != 403:
+            return False
+        return (
+            response.headers.get("X-RateLimit-Remaining") == "0"
+            or "Retry-After" in response.headers
+            or "rate limit" in response.text.lower()
+        )
+
+    def backoff(self, token, response, attempt, resource="core"):
+        now = time.time()
+        retry_after = response.headers.get("Retry-After")
+        reset = response.headers.get("X-RateLimit-Reset")
+
+        if retry_after is not None and retry_after.isdigit():
+            wait = int(retry_after)
+        elif response.headers.get("X-RateLimit-Remaining") == "0" and reset:
+            wait = max(float(reset) - now, 0)
+        else:
+            wait = min(self.base_backoff * 2**attempt, self.max_backoff)
+        wait += random.uniform(0, min(wait, self.max_backoff) / 4 + 0.1)
+
+        with self._lock:
+            self.retries += 1
+            metrics.increment(
+                "github_rate_limited_responses_total",
+                status=str(response.status_code),
+            )
+            if token in self.tokens:
+                # Block this token; acquire() moves traffic to the others
+                bucket = self._resource_buckets(resource)[token]
+                bucket["remaining"] = 0
+                bucket["reset"] = now + wait
+            else:
+                self._record_wait(now, wait)
+        return wait
+
+    def _record_wait(self, now, wait):
+        # Called with the lock held. Waits are recorded about in the order
+        # they start, so only the part past the end of the earlier ones is new
+        self.wait_count += 1
+        end = now + wait
+        self.wait_time += max(end - max(now, self._waiting_until), 0)
+        self._waiting_until = max(self._waiting_until, end)
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path="http_cache.sqlite",
+        ttl=3600,
+        max_entries=100000,
+        eviction_interval=1000,
+        access_batch_size=1000,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Eviction runs once every eviction_interval inserts, so the cache
+        # can briefly hold up to that many entries over max_entries
+        self.eviction_interval = eviction_interval
+        self.access_batch_size = access_batch_size
+
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                headers TEXT,
+                body BLOB,
+                stored_at REAL,
+                accessed_at REAL
+            )
+            """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+            "ON responses (accessed_at)"
+        )
+        self.connection.commit()
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        # Access times of hits are buffered and written in batches
+        self._accessed = {}
+        self._inserts = 0
+
+    def _flush_accessed(self):
+        # Called with the lock held
+        if not self._accessed:
+            return
+        self.connection.executemany(
+            "UPDATE responses SET accessed_at = ? WHERE url = ?",
+            [(accessed_at, url) for url, accessed_at in self._accessed.items()],
+        )
+        self.connection.commit()
+        self._accessed = {}
+
+    def _evict(self):
+        # Least recently used entries go first once the cache is full
+        self._flush_accessed()
+        self.connection.execute(
+            "DELETE FROM responses WHERE url IN ("
+            "SELECT url FROM responses ORDER BY accessed_at DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self.connection.commit()
+        self._inserts = 0
+
+    def get(self, url):
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified, headers, body, stored_at "
+                "FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._accessed[url] = time.time()
+            if len(self._accessed) >= self.access_batch_size:
+                self._flush_accessed()
+
+        etag, last_modified, headers, body, stored_at = row
+        headers = json.loads(headers)
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "headers": headers,
+            "body": zlib.decompress(body),
+            "fresh": time.time() - stored_at < self.max_age(headers),
+        }
+
+    def max_age(self, headers):
+        # Entries stay fresh for as long as the response's own Cache-Control
+        # allows (max-age=60 on GitHub's API), capped at ttl. Responses
+        # without a max-age are always revalidated.
+        cache_control = requests.structures.CaseInsensitiveDict(headers).get(
+            "Cache-Control", ""
+        )
+        if "no-cache" in cache_control or "no-store" in cache_control:
+            return 0
+        match = re.search(r"max-age=(\d+)", cache_control)
+        return min(int(match[1]), self.ttl) if match else 0
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, response):
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    json.dumps(dict(response.headers)),
+                    zlib.compress(response.content),
+                    now,
+                    now,
+                ),
+            )
+            # A buffered access time is older than this write
+            self._accessed.pop(url, None)
+            self.connection.commit()
+            self._inserts += 1
+            if self._inserts >= self.eviction_interval:
+                self._evict()
+
+    def touch(self, url):
+        with self._lock:
+            self.connection.execute(
+                "UPDATE responses SET stored_at = ? WHERE url = ?",
+                (time.time(), url),
+            )
+            self.connection.commit()
+
+    def to_response(self, url, entry):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = entry["body"]
+        response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+        # The body is stored decoded, so drop any transfer encoding header
+        response.headers.pop("Content-Encoding", None)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.from_cache = True
+        response.latency = 0.0
+        return response
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self.connection.close()
+
+
+# Listings gain entries without their URL changing, so a cached page is never
+# trusted without asking GitHub first; a 304 costs no rate limit
+REVALIDATED_ENDPOINTS = {
+    "pull_request_list",
+    "pull_request_commits",
+    "organization_repositories",
+}
+
+ENDPOINT_PATTERNS = [
+    (re.compile(r"/graphql"), "graphql"),
+    (re.compile(r"/repos/[^/]+/[^/]+"), "repository"),
+    (re.compile(r"/repos/[^/]+/[^/]+/pulls"), "pull_request_list"),
+    (re.compile(r"/repos/[^/]+/[^/]+/pulls/\d+"), "pull_request_detail"),
+    (re.compile(r"/repos/[^/]+/[^/]+/pulls/\d+/commits"), "pull_request_commits"),
+    (re.compile(r"/users/[^/]+"), "user"),
+    (re.compile(r"/orgs/[^/]+/repos"), "organization_repositories"),
+]
+
+
+class ResponseArchive:
+    # Every raw response the collector sees, appended to gzip-compressed JSONL
+    # segments with a SQLite index of where each URL's latest response lives.
+    # Each record is its own gzip member, so a segment still reads as one
+    # .jsonl.gz file, and replay can seek straight to a single response.
+    def __init__(self, directory="archive", replay=False, segment_size=64 * 2**20):
+        self.directory = directory
+        self.replaying = replay
+        self.segment_size = segment_size
+        self.replayed = 0
+        self.missing = 0
+        self.recorded = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"), check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                segment INTEGER,
+                offset INTEGER,
+                length INTEGER,
+                status INTEGER,
+                recorded_at REAL
+            )
+            """)
+        self.connection.commit()
+
+        self._segment = None
+        self._segment_number = 0
+        self._pending = 0
+        if not replay:
+            segments = self.segments()
+            self._segment_number = segments[-1] if segments else 1
+            self._index_tail(self._segment_number)
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"responses-{number:06d}.jsonl.gz")
+
+    def segments(self):
+        return sorted(
+            int(match[1])
+            for match in map(
+                re.compile(r"responses-(\d+)\.jsonl\.gz$").search,
+                os.listdir(self.directory),
+            )
+            if match
+        )
+
+    @staticmethod
+    def key(method, url, params=None, body=None):
+        # POST bodies (GraphQL queries and variables) are part of the key
+        key = f"{method} {requests.Request(method, url, params=params).prepare().url}"
+        if body is not None:
+            key += " " + json.dumps(body, sort_keys=True)
+        return key
+
+    def _members(self, number, start=0):
+        # Yields (offset, length, record) for every gzip member from start
+        path = self._segment_path(number)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as segment:
+            data = memoryview(segment.read())
+        offset = start
+        while offset < len(data):
+            decompressor = zlib.decompressobj(31)
+            try:
+                line = decompressor.decompress(data[offset:])
+            except zlib.error:
+                # A record cut short by a crash ends the segment
+                return
+            if not decompressor.eof:
+                return
+            length = len(data) - offset - len(decompressor.unused_data)
+            yield offset, length, json.loads(line)
+            offset += length
+
+    def _index_tail(self, number):
+        # Records appended after the last index commit (e.g. before a crash)
+        # are indexed again when recording resumes
+        row = self.connection.execute(
+            "SELECT COALESCE(MAX(offset + length), 0) FROM responses WHERE segment = ?",
+            (number,),
+        ).fetchone()
+        members = list(self._members(number, row[0]))
+        self._index(number, members)
+
+        # Drop a record that was cut short so new ones stay readable after it
+        end = members[-1][0] + members[-1][1] if members else row[0]
+        path = self._segment_path(number)
+        if os.path.exists(path) and os.path.getsize(path) > end:
+            os.truncate(path, end)
+
+    def _index(self, number, members):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    record["key"],
+                    record["url"],
+                    number,
+                    offset,
+                    length,
+                    record["status"],
+                    record["recorded_at"],
+                )
+                for offset, length, record in members
+            ),
+        )
+        self.connection.commit()
+
+    def reindex(self):
+        # Rebuild the whole index from the segments
+        with self._lock:
+            self.connection.execute("DELETE FROM responses")
+            for number in self.segments():
+                self._index(number, self._members(number))
+
+    def record(self, method, url, params, body, response):
+        headers = dict(response.headers)
+        # The body is stored decoded
+        headers.pop("Content-Encoding", None)
+        headers.pop("Content-Length", None)
+        record = {
+            "key": self.key(method, url, params, body),
+            "url": response.url or url,
+            "status": response.status_code,
+            "headers": headers,
+            "content": response.content.decode("utf-8", "surrogateescape"),
+            "recorded_at": time.time(),
+        }
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        member = (
+            compressor.compress(json.dumps(record).encode("utf-8") + b"\n")
+            + compressor.flush()
+        )
+
+        with self._lock:
+            if self._segment is None:
+                self._segment = open(self._segment_path(self._segment_number), "ab")
+            elif self._segment.tell() >= self.segment_size:
+                # Only the last segment can ever have an unindexed tail
+                self._commit()
+                self._segment.close()
+                self._segment_number += 1
+                self._segment = open(self._segment_path(self._segment_number), "ab")
+            offset = self._segment.tell()
+            self._segment.write(member)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record["key"],
+                    record["url"],
+                    self._segment_number,
+                    offset,
+                    len(member),
+                    record["status"],
+                    record["recorded_at"],
+                ),
+            )
+            self.recorded += 1
+            self._pending += 1
+            # Segment data always reaches disk before the index points at it
+            if self._pending >= 1000:
+                self._commit()
+
+    def _commit(self):
+        if self._segment is not None:
+            self._segment.flush()
+        self.connection.commit()
+        self._pending = 0
+
+    def _read(self, number, offset, length):
+        with open(self._segment_path(number), "rb") as segment:
+            segment.seek(offset)
+            return json.loads(zlib.decompress(segment.read(length), 31))
+
+    def replay(self, method, url, params=None, body=None):
+        key = self.key(method, url, params, body)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT segment, offset, length FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            with self._lock:
+                self.missing += 1
+            metrics.increment("archive_responses_total", result="missing")
+            print(f"Error: No archived response for {key}")
+            response = requests.Response()
+            response.status_code = 404
+            response.url = url
+            response._content = b'{"message": "Not in archive"}'
+            response.latency = 0.0
+            return response
+
+        with self._lock:
+            self.replayed += 1
+        metrics.increment("archive_responses_total", result="replayed")
+        return self.to_response(self._read(*row))
+
+    @staticmethod
+    def to_response(record):
+        response = requests.Response()
+        response.status_code = record["status"]
+        response.url = record["url"]
+        response._content = record["content"].encode("utf-8", "surrogateescape")
+        response.headers = requests.structures.CaseInsensitiveDict(record["headers"])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.from_archive = True
+        response.latency = 0.0
+        return response
+
+    def iter_records(self):
+        # Every archived response in the order it was recorded, for bulk
+        # reprocessing straight from the segments
+        for number in self.segments():
+            for _, _, record in self._members(number):
+                yield record
+
+    def repositories(self):
+        # owner/name of every repository whose info was archived
+        names = []
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT url FROM responses WHERE key LIKE 'GET %/repos/%' AND status = 200"
+            ).fetchall()
+        for (url,) in rows:
+            match = re.search(r"/repos/([^/?]+)/([^/?]+)$", url)
+            if match:
+                names.append(f"{match[1]}/{match[2]}")
+        return sorted(set(names))
+
+    def close(self):
+        # Safe to call from every client sharing the archive
+        with self._lock:
+            if self.connection is None:
+                return
+            self._commit()
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            self.connection.close()
+            self.connection = None
+
+
+class GitHubClient:
+    def __init__(
+        self,
+        token=None,
+        pool_size=10,
+        api_url="https://api.github.com",
+        web_url="https://github.com",
+        tokens=None,
+        max_retries=5,
+        cache=None,
+        archive=None,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.web_url = web_url.rstrip("/")
+        self.pool_size = pool_size
+
+        # One pooled session shared by every call site, so TCP and TLS
+        # connections are kept alive and reused across requests
+        self._create_session(pool_size)
+
+        # API-only headers; tokens are never sent to the HTML profile pages
+        self.api_headers = {"Accept": "application/vnd.github+json"}
+        if tokens is None:
+            token = token or os.environ.get("GITHUB_TOKEN")
+            tokens = os.environ.get("GITHUB_TOKENS", "").split(",") + [token]
+        tokens = list(dict.fromkeys(t.strip() for t in tokens if t and t.strip()))
+        self.rate_limiter = RateLimiter(tokens, max_retries=max_retries)
+        self.cache = cache
+        self.archive = archive
+
+        self._lock = threading.Lock()
+        self.requests_count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def _create_session(self, pool_size):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.adapters = [adapter]
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+
+    def _cache_lookup(self, method, url, params, headers):
+        # Returns (cache_key, entry, cached response or None, headers)
+        if self.cache is None or method != "GET":
+            return None, None, None, headers
+
+        cache_key = requests.Request("GET", url, params=params).prepare().url
+        entry = self.cache.get(cache_key)
+        if entry is None:
+            metrics.increment("github_cache_requests_total", result="miss")
+            return cache_key, None, None, headers
+        if entry["fresh"] and self.endpoint_type(url) not in REVALIDATED_ENDPOINTS:
+            with self._lock:
+                self.cache.hits += 1
+            metrics.increment("github_cache_requests_total", result="hit")
+            return cache_key, entry, self.cache.to_response(cache_key, entry), headers
+        # Stale entries are revalidated; a 304 costs no rate limit
+        headers = {**headers, **self.cache.conditional_headers(entry)}
+        return cache_key, entry, None, headers
+
+    def _request_headers(self, is_api, token, headers):
+        if not is_api:
+            return headers
+        request_headers = {**self.api_headers, **headers}
+        if token:
+            request_headers["Authorization"] = f"Bearer {token}"
+        return request_headers
+
+    def _record(self, response, latency, endpoint, is_api, token, resource):
+        # Expose the latency of this request on the response itself
+        response.latency = latency
+        with self._lock:
+            self.requests_count += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        metrics.observe("github_http_request_seconds", latency, endpoint=endpoint)
+        metrics.increment(
+            "github_http_requests_total",
+            endpoint=endpoint,
+            status=str(response.status_code),
+        )
+
+        # Each response updates the budget it was charged to
+        if is_api:
+            self.rate_limiter.update(token, response, resource)
+
+    def request(self, method, url, **kwargs):
+        # Replay serves every response from the archive without touching the
+        # network; record mode archives every response that is returned
+        archive = self.archive
+        if archive is not None and archive.replaying:
+            return archive.replay(method, url, kwargs.get("params"), kwargs.get("json"))
+        response = self._request(method, url, **kwargs)
+        if archive is not None:
+            archive.record(
+                method, url, kwargs.get("params"), kwargs.get("json"), response
+            )
+        return response
+
+    def _request(self, method, url, **kwargs):
+        is_api = url.startswith(self.api_url)
+        limiter = self.rate_limiter
+        cache_key, entry, cached, headers = self._cache_lookup(
+            method, url, kwargs.get("params"), kwargs.pop("headers", {})
+        )
+        if cached is not None:
+            return cached
+
+        endpoint = self.endpoint_type(url)
+        # GraphQL spends its own points budget, not the REST core one
+        resource = "graphql" if endpoint == "graphql" else "core"
+        for attempt in range(limiter.max_retries + 1):
+            if attempt:
+                metrics.increment("github_retries_total", endpoint=endpoint)
+            # Pace API calls from the rate-limit headers GitHub sends back
+            token = limiter.acquire(resource) if is_api else None
+
+            start = time.perf_counter()
+            response = self.session.request(
+                method,
+                url,
+                headers=self._request_headers(is_api, token, headers),
+                **kwargs,
+            )
+            self._record(
+                response,
+                time.perf_counter() - start,
+                endpoint,
+                is_api,
+                token,
+                resource,
+            )
+
+            if attempt == limiter.max_retries or not limiter.is_rate_limited(response):
+                return self._cache_response(cache_key, entry, response)
+
+            # Only back off when GitHub actually pushes back
+            wait = limiter.backoff(
+                token if is_api else "web", response, attempt, resource
+            )
+            if not is_api:
+                metrics.observe("github_rate_limit_wait_seconds", wait)
+                time.sleep(wait)
+        return response
+
+    def _cache_response(self, cache_key, entry, response):
+        if cache_key is None:
+            return response
+        if response.status_code == 304 and entry is not None:
+            metrics.increment("github_cache_requests_total", result="revalidated")
+            self.cache.touch(cache_key)
+            with self._lock:
+                self.cache.revalidated += 1
+            return self.cache.to_response(cache_key, entry)
+        if response.status_code == 200:
+            self.cache.store(cache_key, response)
+        return response
+
+    def endpoint_type(self, url):
+        # Coarse endpoint names keep the metric label set small
+        if not url.startswith(self.api_url):
+            return "profile_page"
+        path = url[len(self.api_url) :].split("?", 1)[0]
+        for pattern, endpoint in ENDPOINT_PATTERNS:
+            if pattern.fullmatch(path):
+                return endpoint
+        return "other"
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def api_get(self, path, **kwargs):
+        return self.get(f"{self.api_url}{path}", **kwargs)
+
+    def graphql(self, query, variables=None):
+        return self.request(
+            "POST",
+            f"{self.api_url}/graphql",
+            json={"query": query, "variables": variables or {}},
+        )
+
+    def new_connections(self):
+        # urllib3 counts every connection it opens per host pool
+        count = 0
+        for adapter in self.adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    count += pool.num_connections
+        return count
+
+    def stats(self):
+        with self._lock:
+            requests_count = self.requests_count
+            total_latency = self.total_latency
+            max_latency = self.max_latency
+        new_connections = self.new_connections()
+        return {
+            "requests": requests_count,
+            "new_connections": new_connections,
+            "reused_connections": max(requests_count - new_connections, 0),
+            "total_latency": total_latency,
+            "average_latency": (
+                total_latency / requests_count if requests_count else 0.0
+            ),
+            "max_latency": max_latency,
+            "rate_limit_waits": self.rate_limiter.wait_count,
+            "rate_limit_wait_time": self.rate_limiter.wait_time,
+            "retries": self.rate_limiter.retries,
+            "cache_hits": self.cache.hits if self.cache else 0,
+            "cache_revalidated": self.cache.revalidated if self.cache else 0,
+            "cache_misses": self.cache.misses if self.cache else 0,
+        }
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.archive is not None:
+            self.archive.close()
+
+
+default_client = GitHubClient()
+
+
+class AsyncGitHubClient(GitHubClient):
+    # The same client on aiohttp: one shared session for every coroutine,
+    # with at most max_concurrency requests in flight. Rate limiting,
+    # caching and metrics are shared with the blocking client, and responses
+    # are handed back as requests.Response objects so parsing code is too.
+    def __init__(
+        self,
+        token=None,
+        max_concurrency=100,
+        api_url="https://api.github.com",
+        web_url="https://github.com",
+        tokens=None,
+        max_retries=5,
+        cache=None,
+        archive=None,
+    ):
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            raise ImportError("The async API requires the aiohttp package.") from None
+        super().__init__(
+            token=token,
+            pool_size=max_concurrency,
+            api_url=api_url,
+            web_url=web_url,
+            tokens=tokens,
+            max_retries=max_retries,
+            cache=cache,
+            archive=archive,
+        )
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.connections_opened = 0
+
+    def _create_session(self, pool_size):
+        # aiohttp sessions belong to an event loop, so the session is opened
+        # on first use inside the running loop
+        self.session = None
+
+    async def _get_session(self):
+        import aiohttp
+
+        if self.session is None:
+
+            async def on_connection_create_end(session, context, params):
+                self.connections_opened += 1
+
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(on_connection_create_end)
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                headers={"Accept-Encoding": "gzip, deflate"},
+                trace_configs=[trace_config],
+            )
+        return self.session
+
+    async def _send(self, method, url, headers, params=None, json=None):
+        session = await self._get_session()
+        async with self.semaphore:
+            async with session.request(
+                method, url, headers=headers, params=params, json=json
+            ) as aio_response:
+                body = await aio_response.read()
+
+        response = requests.Response()
+        response.status_code = aio_response.status
+        response.url = str(aio_response.url)
+        response._content = body
+        response.headers = requests.structures.CaseInsensitiveDict(aio_response.headers)
+        # aiohttp already decompressed the body
+        response.headers.pop("Content-Encoding", None)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    async def request(self, method, url, params=None, json=None, headers=None):
+        archive = self.archive
+        if archive is not None and archive.replaying:
+            return archive.replay(method, url, params, json)
+        response = await self._request(method, url, params, json, headers)
+        if archive is not None:
+            archive.record(method, url, params, json, response)
+        return response
+
+    async def _request(self, method, url, params=None, json=None, headers=None):
+        is_api = url.startswith(self.api_url)
+        limiter = self.rate_limiter
+        cache_key, entry, cached, headers = self._cache_lookup(
+            method, url, params, headers or {}
+        )
+        if cached is not None:
+            return cached
+
+        endpoint = self.endpoint_type(url)
+        # GraphQL spends its own points budget, not the REST core one
+        resource = "graphql" if endpoint == "graphql" else "core"
+        for attempt in range(limiter.max_retries + 1):
+            if attempt:
+                metrics.increment("github_retries_total", endpoint=endpoint)
+            token = await limiter.acquire_async(resource) if is_api else None
+
+            start = time.perf_counter()
+            response = await self._send(
+                method,
+                url,
+                self._request_headers(is_api, token, headers),
+                params=params,
+                json=json,
+            )
+            self._record(
+                response,
+                time.perf_counter() - start,
+                endpoint,
+                is_api,
+                token,
+                resource,
+            )
+
+            if attempt == limiter.max_retries or not limiter.is_rate_limited(response):
+                return self._cache_response(cache_key, entry, response)
+
+            wait = limiter.backoff(
+                token if is_api else "web", response, attempt, resource
+            )
+            if not is_api:
+                metrics.observe("github_rate_limit_wait_seconds", wait)
+                await asyncio.sleep(wait)
+        return response
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def api_get(self, path, **kwargs):
+        return await self.get(f"{self.api_url}{path}", **kwargs)
+
+    async def graphql(self, query, variables=None):
+        return await self.request(
+            "POST",
+            f"{self.api_url}/graphql",
+            json={"query": query, "variables": variables or {}},
+        )
+
+    def new_connections(self):
+        return self.connections_opened
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.cache is not None:
+            self.cache.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+PULL_REQUESTS_QUERY = """
+query(
+  $owner: String!
+  $name: String!
+  $pageSize: Int!
+  $cursor: String
+  $states: [PullRequestState!]
+) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(
+      first: $pageSize
+      after: $cursor
+      states: $states
+      orderBy: {field: UPDATED_AT, direction: DESC}
+    ) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      nodes {
+        number
+        title
+        body
+        state
+        createdAt
+        closedAt
+        updatedAt
+        mergedAt
+        author {
+          login
+        }
+        headRefOid
+        baseRefOid
+        baseRepository {
+          nameWithOwner
+        }
+        commits {
+          totalCount
+        }
+        additions
+        deletions
+        changedFiles
+      }
+    }
+  }
+}
+"""
 
 
 class GitHubRepository:
+    csv_fields = [
+        "owner",
+        "name",
+        "description",
+        "homepage",
+        "license",
+        "forks",
+        "watchers",
+        "date_of_collection",
+    ]
+
     def __init__(
         self,
         owner,
@@ -23,7 +1197,10 @@ class GitHubRepository:
         forks,
         watchers,
         date_of_collection=None,
+        client=None,
+        compact=False,
     ):
+        self.client = client or default_client
         self.owner = owner
         self.name = name
         self.description = description
@@ -37,60 +1214,362 @@ class GitHubRepository:
             else datetime.now()
         )
 
-        self.pull_requests = []
+        # Compact repositories keep their pull requests in a columnar store
+        self.pull_requests = PullRequestStore() if compact else []
+        self.listing_error = None
+        # Bumped whenever pull requests are replaced, so cached analytics
+        # know to recompute
+        self.revision = 0
 
-    def fetch_pull_requests(self):
-        # GitHub API endpoint for pull requests
-        api_url = f"https://api.github.com/repos/{self.owner}/{self.name}/pulls"
+    @classmethod
+    def from_api(
+        cls, owner, name, repo_info_data, date_of_collection, client=None, compact=False
+    ):
+        # Extract additional information
+        description = repo_info_data.get("description", "")
+        homepage = repo_info_data.get("homepage", "")
+
+        # Check if "license" key exists
+        if "license" in repo_info_data and repo_info_data["license"] is not None:
+            license = repo_info_data["license"].get("name", "")
+        else:
+            license = "No License"  # Set a default value or handle it accordingly
+
+        return cls(
+            owner,
+            name,
+            description,
+            homepage,
+            license,
+            repo_info_data.get("forks", 0),
+            repo_info_data.get("watchers", 0),
+            date_of_collection=date_of_collection,
+            client=client,
+            compact=compact,
+        )
 
-        # Make a GET request to the GitHub API with headers
-        response = requests.get(api_url)
+    def _listing_request(self, state, per_page, sort, direction, start_url):
+        # GitHub API endpoint for pull requests
+        api_url = f"{self.client.api_url}/repos/{self.owner}/{self.name}/pulls"
+        params = {"state": state, "per_page": per_page}
+        if sort:
+            params["sort"] = sort
+        if direction:
+            params["direction"] = direction
 
-        if response.status_code == 200:
-            # Parse the JSON response
-            pull_requests_data = response.json()
+        # Resuming picks the listing up at a saved next-page URL
+        if start_url:
+            return start_url, None
+        return api_url, params
 
-            # Create GitHubPullRequest objects and add them to the list
-            for pr_data in pull_requests_data:
-                pr = GitHubPullRequest(pr_data)
-                self.pull_requests.append(pr)
-        else:
+    def _parse_pull_request_page(self, response, since):
+        # Returns (page, next URL), or None when the listing failed
+        if response.status_code != 200:
+            self.listing_error = f"Status code: {response.status_code}"
             print(
                 f"Error: Unable to fetch pull requests. Status code: {response.status_code}"
             )
+            return None
 
-    def get_summary(self):
-        if not self.pull_requests:
-            return "No pull requests available for summary."
+        page = []
+        for pr_data in response.json():
+            pr = GitHubPullRequest(pr_data, client=self.client)
+            # With sort=updated&direction=desc everything past the
+            # watermark has already been collected
+            if since and pr.updated_at and pr.updated_at < since:
+                return page, None
+            page.append(pr)
+
+        # The next URL already carries the query string
+        return page, response.links.get("next", {}).get("url")
 
-        oldest_pr_date = min(
-            pr.created_at for pr in self.pull_requests if pr.created_at
+    def iter_pull_requests(
+        self,
+        state="all",
+        per_page=100,
+        sort=None,
+        direction=None,
+        since=None,
+        start_url=None,
+        on_page=None,
+    ):
+        api_url, params = self._listing_request(
+            state, per_page, sort, direction, start_url
+        )
+
+        # Follow the Link: rel="next" header page by page, yielding pull
+        # requests as each page arrives instead of holding the whole listing
+        self.listing_error = None
+        while api_url:
+            response = self.client.get(api_url, params=params)
+            parsed = self._parse_pull_request_page(response, since)
+            if parsed is None:
+                return
+            page, api_url = parsed
+            params = None
+
+            # Record the page before handing it out, so anything downstream
+            # of it is already known to a journal
+            if on_page is not None:
+                on_page(page, api_url)
+            yield from page
+
+    async def iter_pull_requests_async(
+        self,
+        state="all",
+        per_page=100,
+        sort=None,
+        direction=None,
+        since=None,
+        start_url=None,
+        on_page=None,
+    ):
+        api_url, params = self._listing_request(
+            state, per_page, sort, direction, start_url
         )
-        open_prs = sum(1 for pr in self.pull_requests if pr.state == "open")
-        closed_prs = sum(1 for pr in self.pull_requests if pr.state == "closed")
-        unique_users = len(set(pr.user for pr in self.pull_requests))
 
-        summary = (
+        self.listing_error = None
+        while api_url:
+            response = await self.client.get(api_url, params=params)
+            parsed = self._parse_pull_request_page(response, since)
+            if parsed is None:
+                return
+            page, api_url = parsed
+            params = None
+
+            if on_page is not None:
+                on_page(page, api_url)
+            for pr in page:
+                yield pr
+
+    def _graphql_variables(self, state, per_page, start_cursor):
+        # REST states mapped onto GraphQL ones; merged PRs are "closed" in REST
+        states = {"open": ["OPEN"], "closed": ["CLOSED", "MERGED"]}.get(state)
+        return {
+            "owner": self.owner,
+            "name": self.name,
+            "pageSize": per_page,
+            "cursor": start_cursor,
+            "states": states,
+        }
+
+    def _parse_graphql_page(self, response, since):
+        # Returns (page, next cursor), or None when the listing failed
+        if response.status_code != 200:
+            self.listing_error = f"Status code: {response.status_code}"
+            print(
+                f"Error: Unable to fetch pull requests. Status code: {response.status_code}"
+            )
+            return None
+
+        result = response.json()
+        if result.get("errors") or not (result.get("data") or {}).get("repository"):
+            self.listing_error = str(result.get("errors"))
+            print(f"Error: Unable to fetch pull requests. {self.listing_error}")
+            return None
+
+        pull_requests = result["data"]["repository"]["pullRequests"]
+        page = []
+        for node in pull_requests["nodes"]:
+            pr = GitHubPullRequest.from_graphql(node, client=self.client)
+            if since and pr.updated_at and pr.updated_at < since:
+                return page, None
+            page.append(pr)
+
+        cursor = None
+        if pull_requests["pageInfo"]["hasNextPage"]:
+            cursor = pull_requests["pageInfo"]["endCursor"]
+        return page, cursor
+
+    def iter_pull_requests_graphql(
+        self, state="all", per_page=100, since=None, start_cursor=None, on_page=None
+    ):
+        variables = self._graphql_variables(state, per_page, start_cursor)
+
+        # One query returns a page of pull requests together with the
+        # commit and diff counts the REST API needs a call per PR for
+        self.listing_error = None
+        while True:
+            response = self.client.graphql(PULL_REQUESTS_QUERY, variables)
+            parsed = self._parse_graphql_page(response, since)
+            if parsed is None:
+                return
+            page, cursor = parsed
+
+            if on_page is not None:
+                on_page(page, cursor)
+            yield from page
+            if cursor is None:
+                return
+            variables["cursor"] = cursor
+
+    async def iter_pull_requests_graphql_async(
+        self, state="all", per_page=100, since=None, start_cursor=None, on_page=None
+    ):
+        variables = self._graphql_variables(state, per_page, start_cursor)
+
+        self.listing_error = None
+        while True:
+            response = await self.client.graphql(PULL_REQUESTS_QUERY, variables)
+            parsed = self._parse_graphql_page(response, since)
+            if parsed is None:
+                return
+            page, cursor = parsed
+
+            if on_page is not None:
+                on_page(page, cursor)
+            for pr in page:
+                yield pr
+            if cursor is None:
+                return
+            variables["cursor"] = cursor
+
+    def fetch_pull_requests(self, state="all"):
+        # Create GitHubPullRequest objects and add them to the list
+        for pr in self.iter_pull_requests(state=state):
+            self.pull_requests.append(pr)
+        self.revision += 1
+
+    async def fetch_pull_requests_async(self, state="all"):
+        async for pr in self.iter_pull_requests_async(state=state):
+            self.pull_requests.append(pr)
+        self.revision += 1
+
+    def pull_request_positions(self):
+        # Index of every pull request by number
+        if isinstance(self.pull_requests, PullRequestStore):
+            numbers = self.pull_requests.column("number")
+        else:
+            numbers = (pr.number for pr in self.pull_requests)
+        return {number: i for i, number in enumerate(numbers)}
+
+    def merge_pull_requests(self, pull_requests, positions=None):
+        # Replace pull requests we already have and append new ones. A
+        # generator is consumed as it goes, so a columnar store grows page by
+        # page without the new pull requests ever being held together.
+        # Callers merging many batches pass the same positions every time,
+        # which are kept up to date, instead of having them rebuilt.
+        if positions is None:
+            positions = self.pull_request_positions()
+        for pr in pull_requests:
+            if pr.number in positions:
+                self.pull_requests[positions[pr.number]] = pr
+            else:
+                positions[pr.number] = len(self.pull_requests)
+                self.pull_requests.append(pr)
+        self.revision += 1
+
+    def close(self):
+        # Releases the spill file of a columnar store
+        if isinstance(self.pull_requests, PullRequestStore):
+            self.pull_requests.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_summary(self, store=None):
+        if store is not None:
+            # Answered from the store's indexes without loading any PRs
+            summary = store.repository_summary(f"{self.owner}/{self.name}")
+            if not summary["open"] and not summary["closed"]:
+                return "No pull requests available for summary."
+        elif not self.pull_requests:
+            return "No pull requests available for summary."
+        else:
+            summary = analytics.summary(self)
+        summary_text = (
             f"Summary for {self.owner}/{self.name}:\n"
-            f"Number of open pull requests: {open_prs}\n"
-            f"Number of closed pull requests: {closed_prs}\n"
-            f"Number of unique users: {unique_users}\n"
-            f"Date of the oldest pull request: {oldest_pr_date}\n"
+            f"Number of open pull requests: {summary['open']}\n"
+            f"Number of closed pull requests: {summary['closed']}\n"
+            f"Number of unique users: {summary['unique_users']}\n"
+            f"Date of the oldest pull request: {summary['oldest_pr_date']}\n"
         )
-        return summary
+        if store is not None:
+            # Trends come from the weekly rollups
+            trend = store.trend(f"{self.owner}/{self.name}")
+            for name, label in (
+                ("current", "Last 4 weeks"),
+                ("previous", "4 weeks before"),
+            ):
+                totals = trend[name]
+                summary_text += (
+                    f"{label} (since {totals['since']}): "
+                    f"{totals['opened']} opened, {totals['closed']} closed, "
+                    f"{totals['merged']} merged, "
+                    f"{totals['active_users']} active users\n"
+                )
+        return summary_text
+
+    def to_row(self):
+        return [getattr(self, field) for field in self.csv_fields]
 
     def to_csv(self):
         return f"{self.owner},{self.name},{self.description},{self.homepage},{self.license},{self.forks},{self.watchers},{self.date_of_collection}"
 
 
+# GitHub lists at most this many commits for a pull request
+PULL_REQUEST_COMMITS_LIMIT = 250
+
+_details_versions = itertools.count(1)
+
+
 class GitHubPullRequest:
-    def __init__(self, data):
+    csv_fields = [
+        "repo_name",
+        "title",
+        "number",
+        "body",
+        "state",
+        "created_at",
+        "closed_at",
+        "user",
+        "commits",
+        "additions",
+        "deletions",
+        "changed_files",
+        "updated_at",
+        "merged_at",
+    ]
+
+    # No per-instance __dict__; large repositories hold many of these
+    # Changes whenever any pull request's details are filled in place, which
+    # leaves the list holding it untouched
+    details_version = 0
+
+    __slots__ = [
+        "client",
+        "title",
+        "number",
+        "body",
+        "state",
+        "created_at",
+        "closed_at",
+        "updated_at",
+        "merged_at",
+        "user",
+        "commits",
+        "additions",
+        "deletions",
+        "changed_files",
+        "repo_name",
+        "authors",
+        "head_sha",
+        "base_sha",
+    ]
+
+    def __init__(self, data, client=None):
+        self.client = client or default_client
         self.title = data.get("title", "")
         self.number = data.get("number", 0)
         self.body = data.get("body", "")
         self.state = data.get("state", "")
         self.created_at = data.get("created_at", "")
         self.closed_at = data.get("closed_at", "")
+        self.updated_at = data.get("updated_at", "")
+        self.merged_at = data.get("merged_at", "")
         self.user = data.get("user", {}).get("login", "")
         self.commits = 0
         self.additions = 0
@@ -98,13 +1577,87 @@ class GitHubPullRequest:
         self.changed_files = 0
         self.repo_name = data.get("base", {}).get("repo", {}).get("full_name", "")
         self.authors = {}
+        # Only needed to page through the commits of very large PRs
+        self.head_sha = data.get("head", {}).get("sha")
+        self.base_sha = data.get("base", {}).get("sha")
 
-    def fetch_pull_request_details(self):
-        api_url = f"https://api.github.com/repos/{self.repo_name}/pulls/{self.number}"
+    @classmethod
+    def from_record(cls, record, client=None):
+        # Rebuild a pull request from a flat row with the csv_fields columns
+        pr = cls(
+            {
+                "title": record["title"],
+                "number": int(record["number"]),
+                "body": record["body"],
+                "state": record["state"],
+                "created_at": record["created_at"],
+                "closed_at": record["closed_at"],
+                "updated_at": record["updated_at"],
+                # Records saved before merges were tracked have no merged_at
+                "merged_at": record.get("merged_at"),
+                "user": {"login": record["user"]},
+                "head": {"sha": record.get("head_sha")},
+                "base": {
+                    "repo": {"full_name": record["repo_name"]},
+                    "sha": record.get("base_sha"),
+                },
+            },
+            client=client,
+        )
+        pr.commits = int(record["commits"])
+        pr.additions = int(record["additions"])
+        pr.deletions = int(record["deletions"])
+        pr.changed_files = int(record["changed_files"])
+        # Only journal and work queue records carry the commit authors
+        pr.authors = dict(record.get("authors") or {})
+        return pr
+
+    @classmethod
+    def from_graphql(cls, node, client=None):
+        # Build the same object the REST flow produces, details included
+        pr = cls(
+            {
+                "title": node.get("title", ""),
+                "number": node.get("number", 0),
+                "body": node.get("body", ""),
+                "state": "open" if node.get("state") == "OPEN" else "closed",
+                "created_at": node.get("createdAt", ""),
+                "closed_at": node.get("closedAt"),
+                "updated_at": node.get("updatedAt", ""),
+                "merged_at": node.get("mergedAt"),
+                "user": {"login": (node.get("author") or {}).get("login", "")},
+                "head": {"sha": node.get("headRefOid")},
+                "base": {
+                    "sha": node.get("baseRefOid"),
+                    "repo": {
+                        "full_name": (node.get("baseRepository") or {}).get(
+                            "nameWithOwner", ""
+                        )
+                    },
+                },
+            },
+            client=client,
+        )
+        pr.commits = (node.get("commits") or {}).get("totalCount", 0)
+        pr.additions = node.get("additions", 0)
+        pr.deletions = node.get("deletions", 0)
+        pr.changed_files = node.get("changedFiles", 0)
+        return pr
+
+    def fetch_pull_request_details(self):
+        api_url = f"/repos/{self.repo_name}/pulls/{self.number}"
 
         # Make a GET request to the GitHub API
-        response = requests.get(api_url)
+        response = self.client.api_get(api_url)
+        return self._apply_details(response)
+
+    async def fetch_pull_request_details_async(self):
+        response = await self.client.api_get(
+            f"/repos/{self.repo_name}/pulls/{self.number}"
+        )
+        return self._apply_details(response)
 
+    def _apply_details(self, response):
         if response.status_code == 200:
             # Parse the JSON response
             pr_details = response.json()
@@ -114,10 +1667,71 @@ class GitHubPullRequest:
             self.additions = pr_details.get("additions", 0)
             self.deletions = pr_details.get("deletions", 0)
             self.changed_files = pr_details.get("changed_files", 0)
+            GitHubPullRequest.details_version = next(_details_versions)
+            return True
         else:
             print(
                 f"Error: Unable to fetch pull request details. Status code: {response.status_code}"
             )
+            return False
+
+    def _commits_request(self, per_page):
+        # Returns (url, params, key of the commit list in the response).
+        # The PR commits endpoint stops at 250 commits, so larger PRs page
+        # through the comparison of their base and head commits instead.
+        if (
+            self.commits > PULL_REQUEST_COMMITS_LIMIT
+            and self.base_sha
+            and self.head_sha
+        ):
+            return (
+                f"{self.client.api_url}/repos/{self.repo_name}/compare/"
+                f"{self.base_sha}...{self.head_sha}",
+                {"per_page": per_page},
+                "commits",
+            )
+        return (
+            f"{self.client.api_url}/repos/{self.repo_name}/pulls/{self.number}/commits",
+            {"per_page": per_page},
+            None,
+        )
+
+    def _add_commit_authors(self, response, key):
+        if response.status_code != 200:
+            print(
+                f"Error: Unable to fetch pull request commits. Status code: {response.status_code}"
+            )
+            return False
+        commits = response.json()
+        for commit in commits[key] if key else commits:
+            # Commits without a linked GitHub account have no profile to scrape
+            login = (commit.get("author") or {}).get("login")
+            if login:
+                self.update_author_stats(login)
+        return True
+
+    def fetch_commit_authors(self, per_page=100):
+        # Commit counts per author login, following Link: rel="next"
+        self.authors = {}
+        url, params, key = self._commits_request(per_page)
+        while url:
+            response = self.client.get(url, params=params)
+            if not self._add_commit_authors(response, key):
+                return False
+            url = response.links.get("next", {}).get("url")
+            params = None
+        return True
+
+    async def fetch_commit_authors_async(self, per_page=100):
+        self.authors = {}
+        url, params, key = self._commits_request(per_page)
+        while url:
+            response = await self.client.get(url, params=params)
+            if not self._add_commit_authors(response, key):
+                return False
+            url = response.links.get("next", {}).get("url")
+            params = None
+        return True
 
     def update_author_stats(self, username):
         if username not in self.authors:
@@ -125,6 +1739,9 @@ class GitHubPullRequest:
         else:
             self.authors[username] += 1
 
+    def to_row(self):
+        return [getattr(self, field) for field in self.csv_fields]
+
     def to_csv(self):
         return (
             f"{self.repo_name},{self.title},{self.number},{self.body},{self.state},"
@@ -133,289 +1750,3057 @@ class GitHubPullRequest:
         )
 
 
-class GitHubUser:
-    def __init__(self, username):
-        self.username = username
-        self.pull_requests_count = 0
-        self.repositories_count = 0
-        self.followers_count = 0
-        self.following_count = 0
-        self.contributions_last_year = 0
+# Timestamps are unsigned 32-bit epoch seconds; 0 marks a missing value
+MISSING_TIMESTAMP = 0
+
+
+def _timestamp_to_epoch(value):
+    if not value:
+        return MISSING_TIMESTAMP
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+def _epoch_to_timestamp(value):
+    if value == MISSING_TIMESTAMP:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class PullRequestView:
+    # Read-only, GitHubPullRequest-shaped window onto one row of a store
+    __slots__ = ["_store", "_index"]
+
+    csv_fields = GitHubPullRequest.csv_fields
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._store.get_field(self._index, name)
+
+    def to_row(self):
+        return [getattr(self, field) for field in self.csv_fields]
+
+
+class PullRequestStore:
+    # Columnar pull request storage: counts and timestamps live in typed
+    # arrays, states, logins and repository names are interned to small
+    # integer codes, titles share one UTF-8 buffer and bodies are spilled
+    # to a temporary file and only read back when accessed. Call close(), or
+    # close the owning repository, to release the file.
+    _numeric_fields = ["number", "commits", "additions", "deletions", "changed_files"]
+    _timestamp_fields = ["created_at", "closed_at", "updated_at", "merged_at"]
+    _interned_fields = ["state", "user", "repo_name"]
+    # Replaced titles and bodies leave unused bytes behind; past this many,
+    # and once they are half the buffer, the buffer is rewritten
+    _compact_threshold = 2**20
+
+    def __init__(self, pull_requests=()):
+        self._columns = {
+            field: array("I") for field in self._numeric_fields + self._timestamp_fields
+        }
+        # A handful of states fit in a byte; logins and repositories do not
+        self._codes = {
+            field: array("B" if field == "state" else "I")
+            for field in self._interned_fields
+        }
+        self._values = {field: [] for field in self._interned_fields}
+        self._lookup = {field: {} for field in self._interned_fields}
+
+        self._titles = bytearray()
+        self._title_offsets = array("q")
+        self._title_lengths = array("I")
+        self._title_waste = 0
+
+        # The spill file is only created once a body is stored
+        self._bodies = None
+        self._body_offsets = array("q")
+        self._body_lengths = array("i")
+        self._body_end = 0
+        self._body_waste = 0
+
+        # Authors are rare and small, so only non-empty dicts are kept
+        self._authors = {}
+        self._lock = threading.Lock()
+
+        self.extend(pull_requests)
+
+    def _intern(self, field, value):
+        lookup = self._lookup[field]
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(self._values[field])
+            self._values[field].append(value)
+        return code
+
+    def _encode(self, pr):
+        title = (pr.title or "").encode("utf-8")
+        body = None if pr.body is None else pr.body.encode("utf-8")
+        return (
+            [getattr(pr, field) or 0 for field in self._numeric_fields],
+            [
+                _timestamp_to_epoch(getattr(pr, field))
+                for field in self._timestamp_fields
+            ],
+            [
+                self._intern(field, getattr(pr, field))
+                for field in self._interned_fields
+            ],
+            title,
+            body,
+        )
+
+    def _write_body(self, body):
+        if body is None:
+            return 0, -1
+        if self._bodies is None:
+            self._bodies = tempfile.TemporaryFile()
+        offset = self._body_end
+        self._bodies.seek(offset)
+        self._bodies.write(body)
+        self._body_end += len(body)
+        return offset, len(body)
+
+    def append(self, pr):
+        with self._lock:
+            numbers, timestamps, codes, title, body = self._encode(pr)
+            for field, value in zip(self._numeric_fields, numbers):
+                self._columns[field].append(value)
+            for field, value in zip(self._timestamp_fields, timestamps):
+                self._columns[field].append(value)
+            for field, code in zip(self._interned_fields, codes):
+                self._codes[field].append(code)
+
+            self._title_offsets.append(len(self._titles))
+            self._title_lengths.append(len(title))
+            self._titles.extend(title)
+
+            offset, length = self._write_body(body)
+            self._body_offsets.append(offset)
+            self._body_lengths.append(length)
+
+            if pr.authors:
+                self._authors[len(self._title_offsets) - 1] = dict(pr.authors)
+
+    def extend(self, pull_requests):
+        for pr in pull_requests:
+            self.append(pr)
+
+    def _replace_title(self, index, title):
+        # A title that fits its old slot is written over it
+        offset = self._title_offsets[index]
+        length = self._title_lengths[index]
+        if len(title) <= length:
+            self._titles[offset : offset + len(title)] = title
+            self._title_waste += length - len(title)
+        else:
+            self._title_offsets[index] = len(self._titles)
+            self._titles.extend(title)
+            self._title_waste += length
+        self._title_lengths[index] = len(title)
+
+        if self._title_waste > self._compact_threshold and self._title_waste * 2 > len(
+            self._titles
+        ):
+            titles = bytearray()
+            for i, (offset, length) in enumerate(
+                zip(self._title_offsets, self._title_lengths)
+            ):
+                self._title_offsets[i] = len(titles)
+                titles.extend(self._titles[offset : offset + length])
+            self._titles = titles
+            self._title_waste = 0
+
+    def _replace_body(self, index, body):
+        # Same for bodies, in the spill file
+        length = max(self._body_lengths[index], 0)
+        if body is not None and len(body) <= length:
+            self._bodies.seek(self._body_offsets[index])
+            self._bodies.write(body)
+            self._body_waste += length - len(body)
+            self._body_lengths[index] = len(body)
+        else:
+            self._body_waste += length
+            offset, length = self._write_body(body)
+            self._body_offsets[index] = offset
+            self._body_lengths[index] = length
+
+        if (
+            self._body_waste > self._compact_threshold
+            and self._body_waste * 2 > self._body_end
+        ):
+            bodies = tempfile.TemporaryFile()
+            for i, (offset, length) in enumerate(
+                zip(self._body_offsets, self._body_lengths)
+            ):
+                if length < 0:
+                    continue
+                self._bodies.seek(offset)
+                self._body_offsets[i] = bodies.tell()
+                bodies.write(self._bodies.read(length))
+            self._bodies.close()
+            self._bodies = bodies
+            self._body_end = bodies.tell()
+            self._body_waste = 0
+
+    def __setitem__(self, index, pr):
+        # Replacing a row rewrites its columns; its title and body reuse their
+        # old space when they fit, and the buffers are compacted once too
+        # much of them is unused
+        with self._lock:
+            index = range(len(self))[index]
+            numbers, timestamps, codes, title, body = self._encode(pr)
+            for field, value in zip(self._numeric_fields, numbers):
+                self._columns[field][index] = value
+            for field, value in zip(self._timestamp_fields, timestamps):
+                self._columns[field][index] = value
+            for field, code in zip(self._interned_fields, codes):
+                self._codes[field][index] = code
+
+            self._replace_title(index, title)
+            self._replace_body(index, body)
+
+            self._authors.pop(index, None)
+            if pr.authors:
+                self._authors[index] = dict(pr.authors)
+
+    def get_field(self, index, field):
+        if field in self._columns:
+            value = self._columns[field][index]
+            if field in self._timestamp_fields:
+                return _epoch_to_timestamp(value)
+            return value
+        if field in self._codes:
+            return self._values[field][self._codes[field][index]]
+        if field == "title":
+            offset = self._title_offsets[index]
+            return self._titles[offset : offset + self._title_lengths[index]].decode(
+                "utf-8"
+            )
+        if field == "body":
+            length = self._body_lengths[index]
+            if length < 0:
+                return None
+            with self._lock:
+                self._bodies.seek(self._body_offsets[index])
+                return self._bodies.read(length).decode("utf-8")
+        if field == "authors":
+            return self._authors.get(index, {})
+        raise AttributeError(field)
+
+    def interned(self, field):
+        # Integer codes plus the distinct values they index into
+        return self._codes[field], self._values[field]
+
+    def column(self, field):
+        # Raw typed column, for vectorized analysis without building views
+        if field in self._columns:
+            return self._columns[field]
+        if field in self._codes:
+            values = self._values[field]
+            return [values[code] for code in self._codes[field]]
+        raise KeyError(field)
+
+    def __len__(self):
+        return len(self._title_offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [PullRequestView(self, i) for i in range(len(self))[index]]
+        return PullRequestView(self, range(len(self))[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield PullRequestView(self, index)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def memory_usage(self):
+        # Bytes held in memory by the columns and the title buffer
+        total = len(self._titles)
+        arrays = list(self._columns.values()) + list(self._codes.values())
+        arrays += [
+            self._title_offsets,
+            self._title_lengths,
+            self._body_offsets,
+            self._body_lengths,
+        ]
+        for column in arrays:
+            total += column.itemsize * len(column)
+        return total
+
+    def close(self):
+        if self._bodies is not None:
+            self._bodies.close()
+
+
+class RepositoryAnalytics:
+    # Per-repository pull request DataFrames and the results derived from
+    # them, memoized until the repository's pull requests change
+    count_fields = ["number", "commits", "additions", "deletions", "changed_files"]
+    timestamp_fields = ["created_at", "closed_at"]
+    label_fields = ["repo_name", "state", "user"]
+
+    def __init__(self):
+        self._repositories = weakref.WeakKeyDictionary()
+        self._combined = {}
+        self._lock = threading.Lock()
+
+    def _key(self, repo):
+        # Hydrating the pull requests of a list in place changes neither its
+        # length nor the repository's revision
+        return (
+            id(repo.pull_requests),
+            len(repo.pull_requests),
+            repo.revision,
+            GitHubPullRequest.details_version,
+        )
+
+    def _build_frame(self, pull_requests):
+        import numpy as np
+        import pandas as pd
+
+        if isinstance(pull_requests, PullRequestStore):
+            # Columnar stores convert without touching individual rows
+            data = {}
+            for field in self.label_fields:
+                codes, values = pull_requests.interned(field)
+                codes = np.frombuffer(codes, dtype=codes.typecode)
+                if None in values:
+                    data[field] = [values[code] for code in codes]
+                else:
+                    data[field] = pd.Categorical.from_codes(codes, categories=values)
+            for field in self.count_fields:
+                column = pull_requests.column(field)
+                data[field] = np.frombuffer(column, dtype=column.typecode).astype(
+                    "int64"
+                )
+            for field in self.timestamp_fields:
+                column = pull_requests.column(field)
+                seconds = np.frombuffer(column, dtype=column.typecode).astype("int64")
+                data[field] = pd.to_datetime(
+                    np.where(seconds == MISSING_TIMESTAMP, np.nan, seconds),
+                    unit="s",
+                    utc=True,
+                )
+            return pd.DataFrame(data)
+
+        fields = self.label_fields + self.count_fields + self.timestamp_fields
+        frame = pd.DataFrame(
+            [[getattr(pr, field) for field in fields] for pr in pull_requests],
+            columns=fields,
+        )
+        for field in self.count_fields:
+            frame[field] = frame[field].fillna(0).astype("int64")
+        for field in self.timestamp_fields:
+            frame[field] = pd.to_datetime(frame[field].replace("", None), utc=True)
+        return frame
+
+    def _entry(self, repo):
+        key = self._key(repo)
+        with self._lock:
+            entry = self._repositories.get(repo)
+            if entry is None or entry["key"] != key:
+                entry = {
+                    "key": key,
+                    "frame": self._build_frame(repo.pull_requests),
+                    "results": {},
+                }
+                self._repositories[repo] = entry
+            return entry
+
+    def _memoize(self, repo, name, compute):
+        entry = self._entry(repo)
+        if name not in entry["results"]:
+            entry["results"][name] = compute(entry["frame"])
+        return entry["results"][name]
+
+    def frame(self, repo):
+        return self._entry(repo)["frame"]
+
+    def summary(self, repo):
+        def compute(frame):
+            import pandas as pd
+
+            oldest = frame["created_at"].min()
+            return {
+                "open": int((frame["state"] == "open").sum()),
+                "closed": int((frame["state"] == "closed").sum()),
+                "unique_users": int(frame["user"].nunique()),
+                "oldest_pr_date": (
+                    None if pd.isna(oldest) else oldest.strftime("%Y-%m-%dT%H:%M:%SZ")
+                ),
+            }
+
+        return self._memoize(repo, "summary", compute)
+
+    def daily_counts(self, repo):
+        def compute(frame):
+            return frame.groupby([frame["created_at"].dt.date, "state"], observed=True)[
+                "number"
+            ].count()
+
+        return self._memoize(repo, "daily_counts", compute)
+
+    def _memoize_combined(self, repositories, name, compute):
+        key = tuple((id(repo), self._key(repo)) for repo in repositories)
+        cached = self._combined.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, compute(self.combined_frame(repositories)))
+            self._combined[name] = cached
+        return cached[1]
+
+    def combined_frame(self, repositories):
+        import pandas as pd
+
+        key = tuple((id(repo), self._key(repo)) for repo in repositories)
+        cached = self._combined.get("frame")
+        if cached is None or cached[0] != key:
+            frames = [self.frame(repo) for repo in repositories]
+            if frames:
+                frame = pd.concat(frames, ignore_index=True)
+                for field in self.label_fields:
+                    frame[field] = frame[field].astype(object)
+            else:
+                frame = self._build_frame([])
+            cached = (key, frame)
+            self._combined["frame"] = cached
+        return cached[1]
+
+    def correlation(self, repositories):
+        def compute(frame):
+            return frame[self.count_fields].corr()
+
+        return self._memoize_combined(repositories, "correlation", compute)
+
+
+analytics = RepositoryAnalytics()
+
+
+# BeautifulSoup imports lxml itself when it parses; here we only check for it
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+# Class attributes are matched as raw strings while straining, so match the
+# class name anywhere in a multi-class value
+CONTRIBUTIONS_STRAINER = SoupStrainer(
+    "div", class_=re.compile(r"(^|\s)js-yearly-contributions(\s|$)")
+)
+PROFILE_STRAINER = SoupStrainer(
+    ["div", "a"],
+    class_=re.compile(r"(^|\s)(js-yearly-contributions|Link--secondary)(\s|$)"),
+)
+
+
+class GitHubUser:
+    csv_fields = [
+        "username",
+        "pull_requests_count",
+        "repositories_count",
+        "followers_count",
+        "following_count",
+        "contributions_last_year",
+    ]
+
+    def __init__(self, username, client=None):
+        self.client = client or default_client
+        self.username = username
+        self.pull_requests_count = 0
+        self.repositories_count = 0
+        self.followers_count = 0
+        self.following_count = 0
+        self.contributions_last_year = 0
+
+    def scrape_user_profile(self, use_api=True):
+        # Follower, following and repository counts come from the REST API
+        # when possible, so the HTML page is only needed for contributions
+        counts_from_api = False
+        if use_api:
+            response = self.client.api_get(f"/users/{self.username}")
+            counts_from_api = self._apply_user_data(response)
+
+        profile_url = f"{self.client.web_url}/{self.username}"
+
+        # Make a GET request to the user profile page
+        response = self.client.get(profile_url)
+        self._apply_profile_page(response, counts_from_api)
+
+    async def scrape_user_profile_async(self, use_api=True):
+        counts_from_api = False
+        if use_api:
+            response = await self.client.api_get(f"/users/{self.username}")
+            counts_from_api = self._apply_user_data(response)
+
+        response = await self.client.get(f"{self.client.web_url}/{self.username}")
+        self._apply_profile_page(response, counts_from_api)
+
+    def _apply_user_data(self, response):
+        if response.status_code != 200:
+            return False
+        user_data = response.json()
+        self.followers_count = user_data.get("followers", 0)
+        self.following_count = user_data.get("following", 0)
+        self.repositories_count = user_data.get("public_repos", 0)
+        return True
+
+    def _apply_profile_page(self, response, counts_from_api):
+        if response.status_code == 200:
+            with metrics.timer("profile_parse_seconds"):
+                self.parse_profile_html(
+                    response.content, contributions_only=counts_from_api
+                )
+        else:
+            print(
+                f"Error: Unable to fetch user profile. Status code: {response.status_code}"
+            )
+
+    def parse_profile_html(self, content, contributions_only=False, parser=None):
+        # Only build the subtrees we read values from, with lxml if present
+        strainer = CONTRIBUTIONS_STRAINER if contributions_only else PROFILE_STRAINER
+        soup = BeautifulSoup(content, parser or HTML_PARSER, parse_only=strainer)
+
+        # Extract relevant information from the user profile
+        try:
+            # Extracting the contributions in the last year from the user profile
+            contributions_last_year_tag = soup.find(
+                "div", class_="js-yearly-contributions"
+            )
+            self.contributions_last_year = int(
+                contributions_last_year_tag["data-count"]
+            )
+        except (TypeError, KeyError, ValueError):
+            print("Error: Unable to fetch contributions_last_year.")
+            self.contributions_last_year = 0
+
+        if contributions_only:
+            return
+
+        try:
+            # Extracting the followers count from the user profile
+            followers_tag = soup.find("a", class_="Link--secondary")
+            self.followers_count = int(followers_tag.span.get_text(strip=True))
+        except (TypeError, ValueError, AttributeError):
+            print("Error: Unable to fetch followers count.")
+            self.followers_count = 0
+
+        try:
+            # Extracting the following count from the user profile
+            following_tag = soup.find_all("a", class_="Link--secondary")[1]
+            self.following_count = int(following_tag.span.get_text(strip=True))
+        except (TypeError, ValueError, AttributeError, IndexError):
+            print("Error: Unable to fetch following count.")
+            self.following_count = 0
+
+    def to_row(self):
+        return [getattr(self, field) for field in self.csv_fields]
+
+    def to_csv(self):
+        return (
+            f"{self.username},{self.pull_requests_count},{self.repositories_count},"
+            f"{self.followers_count},{self.following_count},{self.contributions_last_year}"
+        )
+
+
+class UserRegistry:
+    def __init__(self, client=None, journal=None):
+        self.client = client or default_client
+        self.journal = journal
+        self._users = {}
+        self._scraped = set()
+        self._lock = threading.Lock()
+        self._scrape_locks = {}
+        self._async_scrape_locks = {}
+
+    def get_or_create(self, username):
+        with self._lock:
+            user = self._users.get(username)
+            if user is None:
+                user = GitHubUser(username, client=self.client)
+                self._users[username] = user
+                if self.journal is not None:
+                    # A resumed job restores the profile and the counts
+                    # from repositories it already finished
+                    if self.journal.restore_user(user):
+                        self._scraped.add(username)
+            return user
+
+    def get(self, username):
+        return self._users.get(username)
+
+    def scrape(self, username):
+        # Every login is scraped at most once per run, however many pull
+        # requests it shows up in
+        user = self.get_or_create(username)
+        with self._lock:
+            scrape_lock = self._scrape_locks.setdefault(username, threading.Lock())
+        with scrape_lock:
+            if username not in self._scraped:
+                user.scrape_user_profile()
+                self._scraped.add(username)
+                if self.journal is not None:
+                    self.journal.record_user(user)
+        return user
+
+    def add_pull_requests(self, username, count):
+        # Counts from repositories collected in parallel land on one user
+        user = self.scrape(username)
+        with self._lock:
+            user.pull_requests_count += count
+        return user
+
+    async def scrape_async(self, username):
+        # Coroutines asking for the same login wait for the first scrape
+        user = self.get_or_create(username)
+        with self._lock:
+            scrape_lock = self._async_scrape_locks.setdefault(username, asyncio.Lock())
+        async with scrape_lock:
+            if username not in self._scraped:
+                await user.scrape_user_profile_async()
+                self._scraped.add(username)
+                if self.journal is not None:
+                    self.journal.record_user(user)
+        return user
+
+    async def add_pull_requests_async(self, username, count):
+        user = await self.scrape_async(username)
+        with self._lock:
+            user.pull_requests_count += count
+        return user
+
+    def add(self, user):
+        with self._lock:
+            self._users[user.username] = user
+        return user
+
+    def __contains__(self, username):
+        return username in self._users
+
+    def __iter__(self):
+        return iter(list(self._users.values()))
+
+    def __len__(self):
+        return len(self._users)
+
+
+def hydrate_pull_requests(
+    pull_requests,
+    max_workers=8,
+    on_success=None,
+    details=True,
+    authors=True,
+    max_pending=None,
+    errors=None,
+):
+    # Hydrate pull requests concurrently, their details and the authors of
+    # their commits, and yield each one in input order as soon as it and
+    # every PR before it are done. pull_requests may be a generator still
+    # listing pages; at most max_pending PRs are in flight or waiting to be
+    # yielded, so memory stays flat however long the listing is. Failures
+    # are appended to errors as (number, error) and the PR is still yielded.
+    errors = [] if errors is None else errors
+    max_pending = max_pending or max_workers * 8
+
+    def fetch(pr):
+        try:
+            if (not details or pr.fetch_pull_request_details()) and (
+                not authors or pr.fetch_commit_authors()
+            ):
+                if on_success is not None:
+                    on_success(pr)
+                return pr, None
+            return pr, "request failed"
+        except (requests.RequestException, ValueError, KeyError) as e:
+            # A malformed response fails this PR, not the whole run
+            return pr, str(e)
+
+    def finish(result):
+        pr, error = result
+        if error is not None:
+            print(
+                f"Error: Unable to fetch details for pull request #{pr.number}: {error}"
+            )
+            errors.append((pr.number, error))
+        return pr
+
+    if max_workers <= 1:
+        for pr in pull_requests:
+            yield finish(fetch(pr))
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window = deque()
+        for pr in pull_requests:
+            window.append(executor.submit(fetch, pr))
+            # A full window waits for its oldest PR; finished ones at the
+            # front are handed on right away
+            while len(window) >= max_pending or (window and window[0].done()):
+                yield finish(window.popleft().result())
+        while window:
+            yield finish(window.popleft().result())
+
+
+def fetch_all_pull_request_details(
+    pull_requests,
+    max_workers=8,
+    on_success=None,
+    details=True,
+    authors=True,
+    max_pending=None,
+):
+    # Hydrate every pull request in place and return the errors, per PR in
+    # the same order as the input
+    errors = []
+    for _ in hydrate_pull_requests(
+        pull_requests,
+        max_workers=max_workers,
+        on_success=on_success,
+        details=details,
+        authors=authors,
+        max_pending=max_pending,
+        errors=errors,
+    ):
+        pass
+    return errors
+
+
+async def hydrate_pull_requests_async(
+    pull_requests,
+    on_success=None,
+    max_pending=1000,
+    details=True,
+    authors=True,
+    errors=None,
+):
+    # The async counterpart of hydrate_pull_requests. pull_requests may be an
+    # async iterator still listing pages; at most max_pending fetches are
+    # scheduled or waiting to be yielded, and the client's semaphore bounds
+    # how many are actually on the wire.
+    import aiohttp
+
+    errors = [] if errors is None else errors
+
+    async def fetch(pr):
+        try:
+            if (not details or await pr.fetch_pull_request_details_async()) and (
+                not authors or await pr.fetch_commit_authors_async()
+            ):
+                if on_success is not None:
+                    on_success(pr)
+                return None
+            return "request failed"
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+            return str(e) or type(e).__name__
+
+    async def finish(pr, task):
+        error = await task
+        if error:
+            print(
+                f"Error: Unable to fetch details for pull request #{pr.number}: {error}"
+            )
+            errors.append((pr.number, error))
+        return pr
+
+    if not hasattr(pull_requests, "__aiter__"):
+        pull_requests = _iterate_async(pull_requests)
+
+    window = deque()
+    try:
+        async for pr in pull_requests:
+            window.append((pr, asyncio.ensure_future(fetch(pr))))
+            while len(window) >= max_pending or (window and window[0][1].done()):
+                yield await finish(*window.popleft())
+        while window:
+            yield await finish(*window.popleft())
+    finally:
+        # A consumer that stops early, or an error, leaves fetches behind
+        for _, task in window:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in window), return_exceptions=True)
+
+
+async def fetch_all_pull_request_details_async(
+    pull_requests, on_success=None, max_pending=1000, details=True, authors=True
+):
+    # The async counterpart of fetch_all_pull_request_details
+    errors = []
+    async for _ in hydrate_pull_requests_async(
+        pull_requests,
+        on_success=on_success,
+        max_pending=max_pending,
+        details=details,
+        authors=authors,
+        errors=errors,
+    ):
+        pass
+    return errors
+
+
+async def _iterate_async(iterable):
+    for item in iterable:
+        yield item
+
+
+def save_as_csv(file_name, obj):
+    file_exists = os.path.isfile(file_name)
+
+    with open(file_name, "a", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+
+        if not file_exists:
+            writer.writerow(obj.csv_fields)
+
+        writer.writerow(obj.to_row())
+
+
+class CSVWriter:
+    def __init__(self, file_name, fields, batch_size=1000, key=None):
+        self.file_name = file_name
+        self.fields = list(fields)
+        self.batch_size = batch_size
+        self.temp_name = f"{file_name}.tmp"
+        self.rows_written = 0
+
+        # With key fields, rows are upserted on them: a row written again
+        # replaces the one already in the file instead of being added twice
+        self.key = None if key is None else [self.fields.index(field) for field in key]
+        self._written = {}
+        self._rows = []
+        self._lock = threading.Lock()
+
+        existing_header = None
+        if os.path.isfile(file_name):
+            with open(file_name, newline="", encoding="utf-8") as csv_file:
+                existing_header = next(csv.reader(csv_file), None)
+
+        # Rows go to a temporary file that replaces the real one on close.
+        # Existing data with the same schema is carried over; a file with a
+        # different header is rotated to .bak instead of being mixed in.
+        self.rotate_existing = existing_header not in (None, self.fields)
+        self.carry_existing = existing_header == self.fields
+        if self.carry_existing and self.key is None:
+            shutil.copyfile(file_name, self.temp_name)
+            self._file = open(self.temp_name, "a", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+        else:
+            self._file = open(self.temp_name, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.fields)
+
+    def write(self, obj):
+        self.write_row(obj.to_row())
+
+    def write_row(self, row):
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_size:
+                self._flush()
+
+    def write_all(self, objs):
+        for obj in objs:
+            self.write(obj)
+
+    def _row_key(self, row):
+        # Rows read back from a file hold strings, so keys are compared as such
+        return tuple(str(row[index]) for index in self.key)
+
+    def _flush(self):
+        if self.key is not None:
+            for row in self._rows:
+                key = self._row_key(row)
+                self._written[key] = self._written.get(key, 0) + 1
+        with metrics.timer("csv_write_seconds", file=os.path.basename(self.file_name)):
+            self._writer.writerows(self._rows)
+            self._file.flush()
+        metrics.increment(
+            "csv_rows_written_total",
+            len(self._rows),
+            file=os.path.basename(self.file_name),
+        )
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.close()
+            if self.key is not None:
+                self._upsert_rows()
+            if self.rotate_existing:
+                os.replace(self.file_name, f"{self.file_name}.bak")
+            os.replace(self.temp_name, self.file_name)
+
+    def _upsert_rows(self):
+        # Existing rows that were not written again keep their place, ahead
+        # of this run's rows; a key written several times keeps its last row
+        if not self.carry_existing and all(
+            count == 1 for count in self._written.values()
+        ):
+            return
+        merged_name = f"{self.file_name}.merge"
+        with open(merged_name, "w", newline="", encoding="utf-8") as merged_file:
+            writer = csv.writer(merged_file)
+            writer.writerow(self.fields)
+            if self.carry_existing:
+                with open(self.file_name, newline="", encoding="utf-8") as csv_file:
+                    reader = csv.reader(csv_file)
+                    next(reader, None)
+                    writer.writerows(
+                        row for row in reader if self._row_key(row) not in self._written
+                    )
+            with open(self.temp_name, newline="", encoding="utf-8") as csv_file:
+                reader = csv.reader(csv_file)
+                next(reader, None)
+                for row in reader:
+                    key = self._row_key(row)
+                    self._written[key] -= 1
+                    if not self._written[key]:
+                        writer.writerow(row)
+        os.replace(merged_name, self.temp_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+PULL_REQUEST_AUTHOR_FIELDS = ["repo_name", "number", "authors"]
+
+
+def open_csv_writers(directory=".", batch_size=1000):
+    return {
+        "repositories": CSVWriter(
+            os.path.join(directory, "repositories.csv"),
+            GitHubRepository.csv_fields,
+            batch_size,
+            key=["owner", "name"],
+        ),
+        "pull_requests": CSVWriter(
+            os.path.join(directory, "pull_requests.csv"),
+            GitHubPullRequest.csv_fields,
+            batch_size,
+            key=["repo_name", "number"],
+        ),
+        "users": CSVWriter(
+            os.path.join(directory, "users.csv"),
+            GitHubUser.csv_fields,
+            batch_size,
+            key=["username"],
+        ),
+        # The commit authors of each pull request, which user totals are
+        # summed from
+        "pull_request_authors": CSVWriter(
+            os.path.join(directory, "pull_request_authors.csv"),
+            PULL_REQUEST_AUTHOR_FIELDS,
+            batch_size,
+            key=["repo_name", "number"],
+        ),
+    }
+
+
+def close_csv_writers(writers):
+    for writer in writers.values():
+        writer.close()
+    if "pull_request_authors" in writers:
+        _update_user_totals(
+            writers["users"].file_name, writers["pull_request_authors"].file_name
+        )
+
+
+def _update_user_totals(users_file, authors_file):
+    # users.csv holds totals over every repository in its directory, not
+    # only the ones this run collected or the pull requests that changed.
+    # Users without recorded authors (older output) keep their count.
+    if not os.path.isfile(users_file) or not os.path.isfile(authors_file):
+        return
+    totals = {}
+    with open(authors_file, newline="", encoding="utf-8") as csv_file:
+        for record in csv.DictReader(csv_file):
+            for username, count in json.loads(record["authors"] or "{}").items():
+                totals[username] = totals.get(username, 0) + count
+
+    with open(users_file, newline="", encoding="utf-8") as csv_file:
+        rows = list(csv.reader(csv_file))
+    if not rows or rows[0] != GitHubUser.csv_fields:
+        return
+    count_index = GitHubUser.csv_fields.index("pull_requests_count")
+    for row in rows[1:]:
+        if row[0] in totals:
+            row[count_index] = totals[row[0]]
+    temp_name = f"{users_file}.tmp"
+    with open(temp_name, "w", newline="", encoding="utf-8") as csv_file:
+        csv.writer(csv_file).writerows(rows)
+    os.replace(temp_name, users_file)
+
+
+def load_watermarks(file_name="collection_state.json"):
+    if not os.path.isfile(file_name):
+        return {}
+    with open(file_name, encoding="utf-8") as state_file:
+        return json.load(state_file)
+
+
+def save_watermarks(watermarks, file_name="collection_state.json"):
+    # Write to a temporary file first so a crash never leaves a torn state file
+    temp_name = f"{file_name}.tmp"
+    with open(temp_name, "w", encoding="utf-8") as state_file:
+        json.dump(watermarks, state_file, indent=2, sort_keys=True)
+    os.replace(temp_name, file_name)
+
+
+def _journal_record(pr):
+    return {
+        **dict(zip(pr.csv_fields, pr.to_row())),
+        "authors": pr.authors,
+        "head_sha": pr.head_sha,
+        "base_sha": pr.base_sha,
+    }
+
+
+class CollectionJournal:
+    # Progress of a collection job in SQLite: repository info, listed pull
+    # request pages, hydrated pull requests, scraped profiles and finished
+    # repositories. Re-running a job with the same journal skips all of it.
+    def __init__(self, path="collection_journal.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS repositories (
+                full_name TEXT PRIMARY KEY,
+                info TEXT,
+                date_of_collection TEXT,
+                next_page TEXT,
+                listing_complete INTEGER DEFAULT 0,
+                done INTEGER DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS pull_requests (
+                full_name TEXT,
+                number INTEGER,
+                record TEXT,
+                hydrated INTEGER DEFAULT 0,
+                PRIMARY KEY (full_name, number)
+            );
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                profile TEXT
+            );
+            CREATE TABLE IF NOT EXISTS repository_users (
+                full_name TEXT,
+                username TEXT,
+                pull_requests_count INTEGER,
+                PRIMARY KEY (full_name, username)
+            );
+            """)
+        self.connection.commit()
+
+    def _execute(self, statement, parameters=(), many=False):
+        with self._lock:
+            if many:
+                self.connection.executemany(statement, parameters)
+            else:
+                self.connection.execute(statement, parameters)
+            self.connection.commit()
+
+    def _query(self, statement, parameters=()):
+        with self._lock:
+            return self.connection.execute(statement, parameters).fetchall()
+
+    def repository_state(self, full_name):
+        rows = self._query(
+            "SELECT info, date_of_collection, next_page, listing_complete, done "
+            "FROM repositories WHERE full_name = ?",
+            (full_name,),
+        )
+        if not rows:
+            return None
+        info, date_of_collection, next_page, listing_complete, done = rows[0]
+        return {
+            "info": json.loads(info),
+            "date_of_collection": date_of_collection,
+            "next_page": next_page,
+            "listing_complete": bool(listing_complete),
+            "done": bool(done),
+        }
+
+    def start_repository(self, full_name, info, date_of_collection):
+        self._execute(
+            "INSERT OR REPLACE INTO repositories (full_name, info, date_of_collection) "
+            "VALUES (?, ?, ?)",
+            (full_name, json.dumps(info), date_of_collection),
+        )
+
+    def record_page(self, full_name, pull_requests, next_page, hydrated=False):
+        # The page's pull requests and the cursor after it land together
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO pull_requests VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        full_name,
+                        pr.number,
+                        json.dumps(_journal_record(pr)),
+                        int(hydrated),
+                    )
+                    for pr in pull_requests
+                ],
+            )
+            self.connection.execute(
+                "UPDATE repositories SET next_page = ?, listing_complete = ? "
+                "WHERE full_name = ?",
+                (next_page, int(next_page is None), full_name),
+            )
+            self.connection.commit()
+
+    def record_details(self, full_name, pr):
+        self._execute(
+            "UPDATE pull_requests SET record = ?, hydrated = 1 "
+            "WHERE full_name = ? AND number = ?",
+            (json.dumps(_journal_record(pr)), full_name, pr.number),
+        )
+
+    def pull_requests(self, full_name, client=None, hydrated=None, batch_size=1000):
+        # Yields (pull request, hydrated) in listing order, reading a batch
+        # of rows at a time; hydrated=True or False keeps only those
+        condition = "" if hydrated is None else f" AND hydrated = {int(hydrated)}"
+        last = 0
+        while True:
+            rows = self._query(
+                "SELECT rowid, record, hydrated FROM pull_requests "
+                f"WHERE full_name = ? AND rowid > ?{condition} "
+                "ORDER BY rowid LIMIT ?",
+                (full_name, last, batch_size),
+            )
+            for last, record, h in rows:
+                yield GitHubPullRequest.from_record(
+                    json.loads(record), client=client
+                ), bool(h)
+            if len(rows) < batch_size:
+                return
+
+    def record_user(self, user):
+        profile = {
+            field: getattr(user, field)
+            for field in GitHubUser.csv_fields
+            if field not in ("username", "pull_requests_count")
+        }
+        self._execute(
+            "INSERT OR REPLACE INTO users VALUES (?, ?)",
+            (user.username, json.dumps(profile)),
+        )
+
+    def restore_user(self, user):
+        rows = self._query(
+            "SELECT profile FROM users WHERE username = ?", (user.username,)
+        )
+        count = self._query(
+            "SELECT COALESCE(SUM(repository_users.pull_requests_count), 0) "
+            "FROM repository_users JOIN repositories USING (full_name) "
+            "WHERE username = ? AND done = 1",
+            (user.username,),
+        )[0][0]
+        user.pull_requests_count = count
+        if not rows:
+            return False
+        for field, value in json.loads(rows[0][0]).items():
+            setattr(user, field, value)
+        return True
+
+    def repository_users(self, full_name):
+        return [
+            username
+            for (username,) in self._query(
+                "SELECT username FROM repository_users WHERE full_name = ?",
+                (full_name,),
+            )
+        ]
+
+    def finish_repository(self, full_name, user_counts):
+        # Per-repository user counts are only committed with the repository,
+        # so a crashed repository never contributes partial counts
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO repository_users VALUES (?, ?, ?)",
+                [
+                    (full_name, username, count)
+                    for username, count in user_counts.items()
+                ],
+            )
+            self.connection.execute(
+                "UPDATE repositories SET done = 1 WHERE full_name = ?", (full_name,)
+            )
+            self.connection.commit()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+ROLLUP_FIELDS = [
+    "opened",
+    "closed",
+    "merged",
+    "additions",
+    "deletions",
+    "changed_files",
+]
+
+
+@lru_cache(maxsize=4096)
+def _week_start(day):
+    # Weeks start on Monday, like ISO weeks
+    date = datetime.strptime(day, "%Y-%m-%d")
+    return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+
+
+class DataStore:
+    # Collected repositories, pull requests and users in indexed SQLite
+    # tables. Questions across repositories ("closed PRs by X since Y") are
+    # answered from an index instead of a scan of every pull request list.
+    def __init__(self, path="github_data.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS repositories (
+                full_name TEXT PRIMARY KEY,
+                owner TEXT,
+                name TEXT,
+                description TEXT,
+                homepage TEXT,
+                license TEXT,
+                forks INTEGER,
+                watchers INTEGER,
+                date_of_collection TEXT
+            );
+            CREATE TABLE IF NOT EXISTS pull_requests (
+                repo_name TEXT,
+                number INTEGER,
+                title TEXT,
+                body TEXT,
+                state TEXT,
+                created_at TEXT,
+                closed_at TEXT,
+                updated_at TEXT,
+                user TEXT,
+                commits INTEGER,
+                additions INTEGER,
+                deletions INTEGER,
+                changed_files INTEGER,
+                merged_at TEXT,
+                PRIMARY KEY (repo_name, number)
+            );
+            CREATE INDEX IF NOT EXISTS pull_requests_repo_state
+                ON pull_requests (repo_name, state, created_at);
+            CREATE INDEX IF NOT EXISTS pull_requests_user_state
+                ON pull_requests (user, state, created_at);
+            CREATE INDEX IF NOT EXISTS pull_requests_state_created
+                ON pull_requests (state, created_at);
+            CREATE INDEX IF NOT EXISTS pull_requests_created
+                ON pull_requests (created_at);
+            CREATE INDEX IF NOT EXISTS pull_requests_closed
+                ON pull_requests (closed_at);
+            CREATE TABLE IF NOT EXISTS pull_request_authors (
+                repo_name TEXT,
+                number INTEGER,
+                username TEXT,
+                commits INTEGER,
+                PRIMARY KEY (repo_name, number, username)
+            );
+            CREATE INDEX IF NOT EXISTS pull_request_authors_username
+                ON pull_request_authors (username);
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                pull_requests_count INTEGER,
+                repositories_count INTEGER,
+                followers_count INTEGER,
+                following_count INTEGER,
+                contributions_last_year INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS rollups (
+                repo_name TEXT,
+                period TEXT,
+                start TEXT,
+                opened INTEGER DEFAULT 0,
+                closed INTEGER DEFAULT 0,
+                merged INTEGER DEFAULT 0,
+                additions INTEGER DEFAULT 0,
+                deletions INTEGER DEFAULT 0,
+                changed_files INTEGER DEFAULT 0,
+                active_users INTEGER DEFAULT 0,
+                PRIMARY KEY (repo_name, period, start)
+            );
+            CREATE INDEX IF NOT EXISTS rollups_period ON rollups (period, start);
+            CREATE TABLE IF NOT EXISTS rollup_users (
+                repo_name TEXT,
+                period TEXT,
+                start TEXT,
+                user TEXT,
+                events INTEGER,
+                PRIMARY KEY (repo_name, period, start, user)
+            );
+            """)
+        # Stores created before merges were tracked
+        columns = {
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(pull_requests)")
+        }
+        if "merged_at" not in columns:
+            self.connection.execute(
+                "ALTER TABLE pull_requests ADD COLUMN merged_at TEXT"
+            )
+        self.connection.commit()
+
+        # Stores created before rollups existed are backfilled once
+        if self._query("SELECT 1 FROM pull_requests LIMIT 1") and not self._query(
+            "SELECT 1 FROM rollups LIMIT 1"
+        ):
+            self.rebuild_rollups()
+
+    def _upsert(self, table, fields, keys, rows, batch_size=10000, on_batch=None):
+        # Bulk upsert in batches, one transaction per batch. on_batch runs
+        # first, inside the same transaction.
+        updates = ", ".join(
+            f"{field} = excluded.{field}" for field in fields if field not in keys
+        )
+        statement = (
+            f"INSERT INTO {table} ({', '.join(fields)}) "
+            f"VALUES ({', '.join('?' * len(fields))}) "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}"
+        )
+        rows = iter(rows)
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                return
+            with self._lock:
+                if on_batch is not None:
+                    on_batch(batch)
+                self.connection.executemany(statement, batch)
+                self.connection.commit()
+
+    def _query(self, statement, parameters=()):
+        with self._lock:
+            return self.connection.execute(statement, parameters).fetchall()
+
+    def upsert_repository(self, repo):
+        self._upsert(
+            "repositories",
+            ["full_name"] + GitHubRepository.csv_fields,
+            ["full_name"],
+            [
+                [f"{repo.owner}/{repo.name}"]
+                + repo.to_row()[:-1]
+                + [repo.date_of_collection.strftime("%Y-%m-%d %H:%M:%S")]
+            ],
+        )
+
+    def upsert_pull_requests(self, pull_requests, batch_size=10000):
+        # Commit authors are replaced in the same transaction as their pull
+        # requests, so user totals can be summed from them at any time
+        pull_requests = iter(pull_requests)
+        while True:
+            batch = list(islice(pull_requests, batch_size))
+            if not batch:
+                return
+
+            def on_batch(rows, batch=batch):
+                self._update_rollups(rows)
+                self._replace_authors(batch)
+
+            self._upsert(
+                "pull_requests",
+                GitHubPullRequest.csv_fields,
+                ["repo_name", "number"],
+                [pr.to_row() for pr in batch],
+                batch_size=batch_size,
+                on_batch=on_batch,
+            )
+
+    def _replace_authors(self, pull_requests):
+        # Runs under the lock, in the transaction that writes pull_requests
+        self.connection.executemany(
+            "DELETE FROM pull_request_authors WHERE repo_name = ? AND number = ?",
+            [(pr.repo_name, pr.number) for pr in pull_requests],
+        )
+        self.connection.executemany(
+            "INSERT INTO pull_request_authors VALUES (?, ?, ?, ?)",
+            [
+                (pr.repo_name, pr.number, username, count)
+                for pr in pull_requests
+                for username, count in pr.authors.items()
+            ],
+        )
+
+    def user_totals(self, usernames):
+        # Commits each user authored over every stored pull request, from
+        # the username index; users without any recorded authors are left out
+        usernames = list(usernames)
+        totals = {}
+        for start in range(0, len(usernames), 500):
+            chunk = usernames[start : start + 500]
+            totals.update(
+                self._query(
+                    "SELECT username, SUM(commits) FROM pull_request_authors "
+                    f"WHERE username IN ({', '.join('?' * len(chunk))}) "
+                    "GROUP BY username",
+                    chunk,
+                )
+            )
+        return totals
+
+    @staticmethod
+    def _add_rollup_changes(changes, user_changes, record, sign):
+        # A pull request counts towards the day and week it was opened in
+        # (with its size), and the ones it was closed and merged in. Its
+        # author is active in each of those.
+        repo_name = record["repo_name"]
+        events = [
+            ("opened", record["created_at"]),
+            ("closed", record["closed_at"]),
+            ("merged", record["merged_at"]),
+        ]
+        for event, timestamp in events:
+            if not timestamp:
+                continue
+            day = timestamp[:10]
+            week = _week_start(day)
+            for period, start in (("day", day), ("week", week)):
+                change = changes.setdefault(
+                    (repo_name, period, start), dict.fromkeys(ROLLUP_FIELDS, 0)
+                )
+                change[event] += sign
+                if event == "opened":
+                    for field in ("additions", "deletions", "changed_files"):
+                        change[field] += sign * int(record[field] or 0)
+                key = (repo_name, period, start, record["user"])
+                user_changes[key] = user_changes.get(key, 0) + sign
+
+    def _update_rollups(self, rows):
+        # Runs under the lock, in the transaction that writes rows: what the
+        # previous version of each pull request contributed is taken back
+        # and the new version's added, so only the days and weeks they touch
+        # change
+        fields = GitHubPullRequest.csv_fields
+        records = {}
+        for row in rows:
+            record = dict(zip(fields, row))
+            records[(record["repo_name"], record["number"])] = record
+
+        changes = {}
+        user_changes = {}
+        for (repo_name, number), record in records.items():
+            previous = self.connection.execute(
+                f"SELECT {', '.join(fields)} FROM pull_requests "
+                "WHERE repo_name = ? AND number = ?",
+                (repo_name, number),
+            ).fetchone()
+            if previous is not None:
+                self._add_rollup_changes(
+                    changes, user_changes, dict(zip(fields, previous)), -1
+                )
+            self._add_rollup_changes(changes, user_changes, record, 1)
+        self._apply_rollup_changes(changes, user_changes)
+
+    def _apply_rollup_changes(self, changes, user_changes):
+        # Distinct active users are kept as per-user event counts; a bucket's
+        # active_users only moves when a user's count leaves or reaches zero
+        for (repo_name, period, start, user), change in user_changes.items():
+            if not change:
+                continue
+            row = self.connection.execute(
+                "SELECT events FROM rollup_users "
+                "WHERE repo_name = ? AND period = ? AND start = ? AND user = ?",
+                (repo_name, period, start, user),
+            ).fetchone()
+            events = row[0] if row else 0
+            if events + change > 0:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO rollup_users VALUES (?, ?, ?, ?, ?)",
+                    (repo_name, period, start, user, events + change),
+                )
+            else:
+                self.connection.execute(
+                    "DELETE FROM rollup_users "
+                    "WHERE repo_name = ? AND period = ? AND start = ? AND user = ?",
+                    (repo_name, period, start, user),
+                )
+            active = (events + change > 0) - (events > 0)
+            if active:
+                bucket = changes.setdefault(
+                    (repo_name, period, start), dict.fromkeys(ROLLUP_FIELDS, 0)
+                )
+                bucket["active_users"] = bucket.get("active_users", 0) + active
+
+        fields = ROLLUP_FIELDS + ["active_users"]
+        self.connection.executemany(
+            f"INSERT INTO rollups (repo_name, period, start, {', '.join(fields)}) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(fields))}) "
+            "ON CONFLICT (repo_name, period, start) DO UPDATE SET "
+            + ", ".join(f"{field} = {field} + excluded.{field}" for field in fields),
+            [
+                key + tuple(change.get(field, 0) for field in fields)
+                for key, change in changes.items()
+                if any(change.values())
+            ],
+        )
+
+    def rebuild_rollups(self, batch_size=10000):
+        # Recomputes every rollup from the stored pull requests
+        fields = GitHubPullRequest.csv_fields
+        with self._lock:
+            self.connection.execute("DELETE FROM rollups")
+            self.connection.execute("DELETE FROM rollup_users")
+            cursor = self.connection.execute(
+                f"SELECT {', '.join(fields)} FROM pull_requests"
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                changes = {}
+                user_changes = {}
+                for row in rows:
+                    self._add_rollup_changes(
+                        changes, user_changes, dict(zip(fields, row)), 1
+                    )
+                self._apply_rollup_changes(changes, user_changes)
+            self.connection.commit()
+
+    def upsert_users(self, users):
+        # A run only sees some repositories, or only the pull requests that
+        # changed, so stored counts are totals over everything in the store.
+        # Users from stores written before authors were kept keep the count
+        # of the run.
+        users = list(users)
+        totals = self.user_totals(user.username for user in users)
+        rows = []
+        for user in users:
+            row = user.to_row()
+            row[GitHubUser.csv_fields.index("pull_requests_count")] = totals.get(
+                user.username, user.pull_requests_count
+            )
+            rows.append(row)
+        self._upsert("users", GitHubUser.csv_fields, ["username"], rows)
+
+    def add_repository(self, repo):
+        self.upsert_repository(repo)
+        self.upsert_pull_requests(repo.pull_requests)
+
+    def _pull_request_filter(
+        self,
+        repo_name=None,
+        state=None,
+        user=None,
+        since=None,
+        until=None,
+        closed_since=None,
+        closed_until=None,
+    ):
+        # Timestamps are ISO 8601 text in UTC, so they compare as strings
+        conditions = []
+        parameters = []
+        for column, operator, value in (
+            ("repo_name", "=", repo_name),
+            ("state", "=", state),
+            ("user", "=", user),
+            ("created_at", ">=", since),
+            ("created_at", "<", until),
+            ("closed_at", ">=", closed_since),
+            ("closed_at", "<", closed_until),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                parameters.append(value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, parameters
+
+    def query_pull_requests(
+        self,
+        repo_name=None,
+        state=None,
+        user=None,
+        since=None,
+        until=None,
+        closed_since=None,
+        closed_until=None,
+        order_by="created_at",
+        descending=False,
+        limit=None,
+        client=None,
+    ):
+        if order_by not in GitHubPullRequest.csv_fields:
+            raise ValueError(f"Unknown pull request field: {order_by}")
+        where, parameters = self._pull_request_filter(
+            repo_name, state, user, since, until, closed_since, closed_until
+        )
+        statement = (
+            f"SELECT {', '.join(GitHubPullRequest.csv_fields)} FROM pull_requests"
+            f"{where} ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        )
+        if limit is not None:
+            statement += " LIMIT ?"
+            parameters.append(limit)
+        return [
+            GitHubPullRequest.from_record(
+                dict(zip(GitHubPullRequest.csv_fields, row)), client=client
+            )
+            for row in self._query(statement, parameters)
+        ]
+
+    def count_pull_requests(self, **filters):
+        where, parameters = self._pull_request_filter(**filters)
+        return self._query(f"SELECT COUNT(*) FROM pull_requests{where}", parameters)[0][
+            0
+        ]
+
+    def rollups(self, repo_names=None, period="day", since=None, until=None):
+        # Daily or weekly rows of opened, closed and merged counts, the size
+        # of the pull requests opened, and distinct active users, summed over
+        # repo_names (every repository when None). since and until are
+        # YYYY-MM-DD bounds on the day or week start.
+        conditions = ["period = ?"]
+        parameters = [period]
+        if repo_names is not None:
+            conditions.append(f"repo_name IN ({', '.join('?' * len(repo_names))})")
+            parameters += list(repo_names)
+        if since is not None:
+            conditions.append("start >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("start <= ?")
+            parameters.append(until)
+        where = " AND ".join(conditions)
+
+        fields = ROLLUP_FIELDS + ["active_users"]
+        rows = self._query(
+            f"SELECT start, {', '.join(f'SUM({field})' for field in fields)} "
+            f"FROM rollups WHERE {where} GROUP BY start ORDER BY start",
+            parameters,
+        )
+        rollups = [dict(zip(["start"] + fields, row)) for row in rows]
+        if repo_names is None or len(repo_names) > 1:
+            # A user active in two repositories is still one user
+            active_users = dict(
+                self._query(
+                    f"SELECT start, COUNT(DISTINCT user) FROM rollup_users "
+                    f"WHERE {where} GROUP BY start",
+                    parameters,
+                )
+            )
+            for rollup in rollups:
+                rollup["active_users"] = active_users.get(rollup["start"], 0)
+        return rollups
+
+    def trend(self, full_name, weeks=4):
+        # Totals of the last `weeks` weeks up to the collection date, next to
+        # the same number of weeks before them
+        rows = self._query(
+            "SELECT date_of_collection FROM repositories WHERE full_name = ?",
+            (full_name,),
+        )
+        end = _week_start(
+            rows[0][0][:10] if rows else datetime.now().strftime("%Y-%m-%d")
+        )
+        end_date = datetime.strptime(end, "%Y-%m-%d")
+        current = (end_date - timedelta(weeks=weeks - 1)).strftime("%Y-%m-%d")
+        previous = (end_date - timedelta(weeks=2 * weeks - 1)).strftime("%Y-%m-%d")
+
+        totals = {}
+        for name, since, until in (
+            ("current", current, end),
+            (
+                "previous",
+                previous,
+                (end_date - timedelta(weeks=weeks)).strftime("%Y-%m-%d"),
+            ),
+        ):
+            opened, closed, merged = self._query(
+                "SELECT COALESCE(SUM(opened), 0), COALESCE(SUM(closed), 0), "
+                "COALESCE(SUM(merged), 0) FROM rollups WHERE repo_name = ? "
+                "AND period = 'week' AND start BETWEEN ? AND ?",
+                (full_name, since, until),
+            )[0]
+            active_users = self._query(
+                "SELECT COUNT(DISTINCT user) FROM rollup_users WHERE repo_name = ? "
+                "AND period = 'week' AND start BETWEEN ? AND ?",
+                (full_name, since, until),
+            )[0][0]
+            totals[name] = {
+                "since": since,
+                "opened": opened,
+                "closed": closed,
+                "merged": merged,
+                "active_users": active_users,
+            }
+        return totals
+
+    def state_counts(self, repo_names=None):
+        statement = "SELECT state, COUNT(*) FROM pull_requests"
+        parameters = []
+        if repo_names is not None:
+            statement += f" WHERE repo_name IN ({', '.join('?' * len(repo_names))})"
+            parameters = list(repo_names)
+        return dict(self._query(f"{statement} GROUP BY state", parameters))
+
+    def repository_names(self):
+        return [
+            full_name
+            for (full_name,) in self._query(
+                "SELECT full_name FROM repositories ORDER BY full_name"
+            )
+        ]
+
+    def repository_summary(self, full_name):
+        # The same figures as RepositoryAnalytics.summary, from the
+        # (repo_name, state, created_at) index
+        counts = dict(
+            self._query(
+                "SELECT state, COUNT(*) FROM pull_requests WHERE repo_name = ? "
+                "GROUP BY state",
+                (full_name,),
+            )
+        )
+        unique_users, oldest = self._query(
+            "SELECT COUNT(DISTINCT user), MIN(created_at) FROM pull_requests "
+            "WHERE repo_name = ?",
+            (full_name,),
+        )[0]
+        return {
+            "open": counts.get("open", 0),
+            "closed": counts.get("closed", 0),
+            "unique_users": unique_users,
+            "oldest_pr_date": oldest,
+        }
+
+    def correlation(self, repo_names=None):
+        # Only the count columns are read, straight into a frame
+        import pandas as pd
+
+        fields = RepositoryAnalytics.count_fields
+        statement = f"SELECT {', '.join(fields)} FROM pull_requests"
+        parameters = []
+        if repo_names is not None:
+            statement += f" WHERE repo_name IN ({', '.join('?' * len(repo_names))})"
+            parameters = list(repo_names)
+        with self._lock:
+            frame = pd.read_sql_query(statement, self.connection, params=parameters)
+        return frame.astype(float).corr()
+
+    def _load_repository(self, row, client, compact):
+        owner, name, *fields, date_of_collection = row
+        repo = GitHubRepository(
+            owner,
+            name,
+            *fields,
+            date_of_collection=date_of_collection,
+            client=client,
+            compact=compact,
+        )
+        full_name = f"{owner}/{name}"
+        authors = {}
+        for number, username, count in self._query(
+            "SELECT number, username, commits FROM pull_request_authors "
+            "WHERE repo_name = ?",
+            (full_name,),
+        ):
+            authors.setdefault(number, {})[username] = count
+        pull_requests = self.query_pull_requests(
+            repo_name=full_name, order_by="number", client=client
+        )
+        for pr in pull_requests:
+            pr.authors = authors.get(pr.number, {})
+        repo.merge_pull_requests(pull_requests)
+        return repo
+
+    def load_repositories(self, client=None, compact=False):
+        rows = self._query(
+            f"SELECT {', '.join(GitHubRepository.csv_fields)} FROM repositories "
+            "ORDER BY full_name"
+        )
+        return [self._load_repository(row, client, compact) for row in rows]
+
+    def load_repository(self, full_name, client=None, compact=False):
+        # None when the repository was never stored
+        rows = self._query(
+            f"SELECT {', '.join(GitHubRepository.csv_fields)} FROM repositories "
+            "WHERE full_name = ?",
+            (full_name,),
+        )
+        if not rows:
+            return None
+        return self._load_repository(rows[0], client, compact)
+
+    def load_users(self, client=None):
+        users = []
+        for row in self._query(
+            f"SELECT {', '.join(GitHubUser.csv_fields)} FROM users ORDER BY username"
+        ):
+            user = GitHubUser(row[0], client=client)
+            for field, value in zip(GitHubUser.csv_fields[1:], row[1:]):
+                setattr(user, field, value)
+            users.append(user)
+        return users
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class WorkQueue:
+    # Collection tasks shared by worker processes, possibly on other hosts.
+    # A leased task stays invisible to other workers until its visibility
+    # timeout runs out and is then handed out again, so the tasks of a
+    # crashed worker are retried. Every lease carries its own token, and a
+    # worker whose lease ran out can no longer complete or fail the task.
+    # Each task has a unique key, so submitting the same work twice is a
+    # no-op. Tasks fail for good after max_attempts leases.
+    def __init__(self, max_attempts=5, visibility_timeout=600):
+        self.max_attempts = max_attempts
+        self.visibility_timeout = visibility_timeout
+
+    def retry_delay(self, attempts):
+        return min(2**attempts, 60)
+
+    def unfinished(self):
+        counts = self.counts()
+        return counts["pending"] + counts["leased"]
+
+
+class SQLiteWorkQueue(WorkQueue):
+    # The local backend: one SQLite file shared by the worker processes of a
+    # host, or by hosts on a shared filesystem
+    def __init__(
+        self, path="work_queue.sqlite", max_attempts=5, visibility_timeout=600
+    ):
+        super().__init__(max_attempts, visibility_timeout)
+        self.path = path
+        self._lock = threading.Lock()
+        # Transactions are opened explicitly, so a lease takes the write lock
+        # before it looks for a task
+        self.connection = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE,
+                kind TEXT,
+                payload TEXT,
+                status TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                lease TEXT,
+                worker TEXT,
+                visible_at REAL DEFAULT 0,
+                result TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, visible_at);
+            CREATE INDEX IF NOT EXISTS tasks_kind ON tasks (kind, status);
+            """)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def submit(self, kind, payload, key=None):
+        # Returns False when a task with this key was already submitted
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO tasks (key, kind, payload) VALUES (?, ?, ?)",
+                (key, kind, json.dumps(payload)),
+            )
+        return cursor.rowcount == 1
+
+    def lease(self, worker, visibility_timeout=None):
+        now = time.time()
+        expires = now + (visibility_timeout or self.visibility_timeout)
+        with self._transaction() as connection:
+            while True:
+                row = connection.execute(
+                    "SELECT id, kind, payload, attempts FROM tasks "
+                    "WHERE status IN ('pending', 'leased') AND visible_at <= ? "
+                    "ORDER BY id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    return None
+                task_id, kind, payload, attempts = row
+                if attempts >= self.max_attempts:
+                    # Its last lease ran out without an answer
+                    connection.execute(
+                        "UPDATE tasks SET status = 'failed', "
+                        "error = 'visibility timeout expired' WHERE id = ?",
+                        (task_id,),
+                    )
+                    continue
+                lease = os.urandom(8).hex()
+                connection.execute(
+                    "UPDATE tasks SET status = 'leased', attempts = ?, lease = ?, "
+                    "worker = ?, visible_at = ? WHERE id = ?",
+                    (attempts + 1, lease, worker, expires, task_id),
+                )
+                return {
+                    "id": task_id,
+                    "kind": kind,
+                    "payload": json.loads(payload),
+                    "attempts": attempts + 1,
+                    "lease": lease,
+                }
+
+    def extend(self, task, visibility_timeout=None):
+        # Returns False when the lease was lost to another worker
+        expires = time.time() + (visibility_timeout or self.visibility_timeout)
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET visible_at = ? "
+                "WHERE id = ? AND lease = ? AND status = 'leased'",
+                (expires, task["id"], task["lease"]),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, task, result=None):
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET status = 'done', result = ?, error = NULL "
+                "WHERE id = ? AND lease = ? AND status = 'leased'",
+                (json.dumps(result), task["id"], task["lease"]),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, task, error):
+        # The task is retried after a backoff until it runs out of attempts
+        failed = task["attempts"] >= self.max_attempts
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET status = ?, error = ?, visible_at = ? "
+                "WHERE id = ? AND lease = ? AND status = 'leased'",
+                (
+                    "failed" if failed else "pending",
+                    error,
+                    time.time() + self.retry_delay(task["attempts"]),
+                    task["id"],
+                    task["lease"],
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def counts(self):
+        counts = dict.fromkeys(["pending", "leased", "done", "failed"], 0)
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT status, COUNT(*) FROM tasks GROUP BY status"
+            ).fetchall()
+        counts.update(rows)
+        return counts
+
+    def results(self, kind):
+        # (payload, result) of every finished task of one kind
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT payload, result FROM tasks WHERE kind = ? AND status = 'done' "
+                "ORDER BY id",
+                (kind,),
+            ).fetchall()
+        for payload, result in rows:
+            yield json.loads(payload), json.loads(result)
+
+    def failures(self):
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT kind, payload, error FROM tasks WHERE status = 'failed' "
+                "ORDER BY id"
+            ).fetchall()
+        return [(kind, json.loads(payload), error) for kind, payload, error in rows]
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+REDIS_SUBMIT_SCRIPT = """
+local prefix, key, kind, payload = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+if key ~= '' and redis.call('SADD', prefix .. ':keys', key) == 0 then
+  return 0
+end
+local id = redis.call('INCR', prefix .. ':next_id')
+redis.call('HSET', prefix .. ':task:' .. id, 'kind', kind, 'payload', payload,
+           'status', 'pending', 'attempts', 0)
+redis.call('SADD', prefix .. ':kind:' .. kind, id)
+redis.call('ZADD', prefix .. ':ready', 0, id)
+return id
+"""
+
+REDIS_LEASE_SCRIPT = """
+local prefix, now, expires, lease, worker, max_attempts =
+  ARGV[1], tonumber(ARGV[2]), ARGV[3], ARGV[4], ARGV[5], tonumber(ARGV[6])
+-- Tasks whose lease ran out become visible again
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', prefix .. ':leased', '-inf', now)) do
+  redis.call('ZREM', prefix .. ':leased', id)
+  redis.call('ZADD', prefix .. ':ready', now, id)
+end
+while true do
+  local id = redis.call('ZRANGEBYSCORE', prefix .. ':ready', '-inf', now, 'LIMIT', 0, 1)[1]
+  if not id then
+    return false
+  end
+  redis.call('ZREM', prefix .. ':ready', id)
+  local task = prefix .. ':task:' .. id
+  local attempts = tonumber(redis.call('HGET', task, 'attempts'))
+  if attempts >= max_attempts then
+    redis.call('HSET', task, 'status', 'failed', 'error', 'visibility timeout expired')
+    redis.call('SADD', prefix .. ':failed', id)
+  else
+    redis.call('HSET', task, 'status', 'leased', 'attempts', attempts + 1,
+               'lease', lease, 'worker', worker)
+    redis.call('ZADD', prefix .. ':leased', expires, id)
+    return {id, redis.call('HGET', task, 'kind'), redis.call('HGET', task, 'payload'),
+            attempts + 1}
+  end
+end
+"""
+
+REDIS_FINISH_SCRIPT = """
+-- Completes, retries or fails a task, but only for the current lease holder
+local prefix, id, lease, status, field, value, visible_at =
+  ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5], ARGV[6], ARGV[7]
+local task = prefix .. ':task:' .. id
+if redis.call('HGET', task, 'lease') ~= lease
+    or redis.call('HGET', task, 'status') ~= 'leased' then
+  return 0
+end
+if status == 'leased' then
+  redis.call('ZADD', prefix .. ':leased', 'XX', visible_at, id)
+  return 1
+end
+redis.call('ZREM', prefix .. ':leased', id)
+redis.call('HSET', task, 'status', status, field, value)
+if status == 'pending' then
+  redis.call('ZADD', prefix .. ':ready', visible_at, id)
+else
+  redis.call('SADD', prefix .. ':' .. status, id)
+end
+return 1
+"""
+
+
+class RedisWorkQueue(WorkQueue):
+    # The same queue on Redis, for workers spread over several hosts. Every
+    # state change runs as one script, so it is atomic across workers.
+    def __init__(
+        self,
+        url="redis://localhost:6379/0",
+        name="github-collection",
+        max_attempts=5,
+        visibility_timeout=600,
+    ):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError(
+                "The Redis work queue requires the redis package."
+            ) from None
+        super().__init__(max_attempts, visibility_timeout)
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = name
+        self._submit_script = self.redis.register_script(REDIS_SUBMIT_SCRIPT)
+        self._lease_script = self.redis.register_script(REDIS_LEASE_SCRIPT)
+        self._finish_script = self.redis.register_script(REDIS_FINISH_SCRIPT)
+
+    def submit(self, kind, payload, key=None):
+        task_id = self._submit_script(
+            args=[self.prefix, key or "", kind, json.dumps(payload)]
+        )
+        return bool(task_id)
+
+    def lease(self, worker, visibility_timeout=None):
+        now = time.time()
+        lease = os.urandom(8).hex()
+        row = self._lease_script(
+            args=[
+                self.prefix,
+                now,
+                now + (visibility_timeout or self.visibility_timeout),
+                lease,
+                worker,
+                self.max_attempts,
+            ]
+        )
+        if not row:
+            return None
+        task_id, kind, payload, attempts = row
+        return {
+            "id": int(task_id),
+            "kind": kind,
+            "payload": json.loads(payload),
+            "attempts": int(attempts),
+            "lease": lease,
+        }
+
+    def _finish(self, task, status, field="", value="", visible_at=0):
+        return bool(
+            self._finish_script(
+                args=[
+                    self.prefix,
+                    task["id"],
+                    task["lease"],
+                    status,
+                    field,
+                    value,
+                    visible_at,
+                ]
+            )
+        )
+
+    def extend(self, task, visibility_timeout=None):
+        expires = time.time() + (visibility_timeout or self.visibility_timeout)
+        return self._finish(task, "leased", visible_at=expires)
+
+    def complete(self, task, result=None):
+        return self._finish(task, "done", "result", json.dumps(result))
+
+    def fail(self, task, error):
+        if task["attempts"] >= self.max_attempts:
+            return self._finish(task, "failed", "error", error)
+        visible_at = time.time() + self.retry_delay(task["attempts"])
+        return self._finish(task, "pending", "error", error, visible_at)
+
+    def counts(self):
+        pipeline = self.redis.pipeline()
+        pipeline.zcard(f"{self.prefix}:ready")
+        pipeline.zcard(f"{self.prefix}:leased")
+        pipeline.scard(f"{self.prefix}:done")
+        pipeline.scard(f"{self.prefix}:failed")
+        return dict(zip(["pending", "leased", "done", "failed"], pipeline.execute()))
+
+    def _tasks(self, ids, *fields):
+        ids = sorted(int(task_id) for task_id in ids)
+        for start in range(0, len(ids), 1000):
+            pipeline = self.redis.pipeline()
+            for task_id in ids[start : start + 1000]:
+                pipeline.hmget(f"{self.prefix}:task:{task_id}", *fields)
+            yield from pipeline.execute()
+
+    def results(self, kind):
+        ids = self.redis.sinter(f"{self.prefix}:kind:{kind}", f"{self.prefix}:done")
+        for payload, result in self._tasks(ids, "payload", "result"):
+            yield json.loads(payload), json.loads(result)
+
+    def failures(self):
+        return [
+            (kind, json.loads(payload), error)
+            for kind, payload, error in self._tasks(
+                self.redis.smembers(f"{self.prefix}:failed"), "kind", "payload", "error"
+            )
+        ]
+
+    def close(self):
+        self.redis.close()
+
+
+def open_work_queue(location, max_attempts=5, visibility_timeout=600):
+    # redis:// URLs select the Redis backend; anything else is a SQLite file
+    if location.startswith(("redis://", "rediss://", "unix://")):
+        return RedisWorkQueue(
+            location, max_attempts=max_attempts, visibility_timeout=visibility_timeout
+        )
+    return SQLiteWorkQueue(
+        location, max_attempts=max_attempts, visibility_timeout=visibility_timeout
+    )
+
+
+def _restore_collected_repository(
+    owner, repo_name, users, state, journal, client, compact, existing_repo=None
+):
+    # Finished repositories are rebuilt from the journal without any request
+    full_name = f"{owner}/{repo_name}"
+    repo = GitHubRepository.from_api(
+        owner,
+        repo_name,
+        state["info"],
+        state["date_of_collection"],
+        client=client,
+        compact=compact,
+    )
+    if existing_repo is not None:
+        repo.pull_requests = existing_repo.pull_requests
+    repo.merge_pull_requests(
+        pr for pr, _ in journal.pull_requests(full_name, client=client)
+    )
+    for username in journal.repository_users(full_name):
+        users.get_or_create(username)
+    print(f"Skipping {full_name}: already collected in this job.")
+    return repo
+
+
+def _repository_info(response, full_name, date_of_collection, journal):
+    if response.status_code != 200:
+        print(
+            f"Error: Unable to fetch repository information. Status code: {response.status_code}"
+        )
+        return None
+
+    # Parse the JSON response for repository information
+    repo_info_data = response.json()
+    if journal is not None:
+        journal.start_repository(full_name, repo_info_data, date_of_collection)
+    return repo_info_data
+
+
+def _resume_listing(full_name, state, backend, journal, client):
+    # Returns (hydrated, pending, listing options); the options are None when
+    # an interrupted listing already reached its last page. Hydrated pull
+    # requests are read from the journal lazily, as they are merged.
+    hydrated_pull_requests = ()
+    pending_pull_requests = ()
+    listing_options = {}
+    if state is not None:
+        hydrated_pull_requests = (
+            pr
+            for pr, _ in journal.pull_requests(full_name, client=client, hydrated=True)
+        )
+        pending_pull_requests = (
+            pr
+            for pr, _ in journal.pull_requests(full_name, client=client, hydrated=False)
+        )
+        if state["listing_complete"]:
+            listing_options = None
+        elif backend == "graphql":
+            listing_options["start_cursor"] = state["next_page"]
+        else:
+            listing_options["start_url"] = state["next_page"]
+    if journal is not None and listing_options is not None:
+        # Pages are recorded unhydrated even from GraphQL: a PR only counts
+        # as hydrated once its commit authors are in as well
+        listing_options["on_page"] = lambda page, next_page: journal.record_page(
+            full_name, page, next_page
+        )
+    return hydrated_pull_requests, pending_pull_requests, listing_options
+
+
+def _repository_user_counts(repo, authors):
+    # Counts over every pull request the repository now holds, those carried
+    # over from earlier runs included, for the authors seen in this run
+    counts = _count_authors(repo.pull_requests)
+    return {author: counts.get(author, 0) for author in authors}
+
+
+def _count_authors(pull_requests, user_counts=None):
+    user_counts = {} if user_counts is None else user_counts
+    for pr in pull_requests:
+        for author in pr.authors:
+            user_counts[author] = user_counts.get(author, 0) + pr.authors[author]
+    return user_counts
+
+
+class _PullRequestOutput:
+    # Hands each hydrated pull request to the CSV writer and the store as it
+    # comes in, keeping only the running totals the rest of the collection
+    # needs: author counts, the newest update and how many were written.
+    # Without shared writers the collector owns a set for this repository.
+    def __init__(self, writers=None, store=None, batch_size=1000):
+        self.own_writers = writers is None
+        self.writers = open_csv_writers() if writers is None else writers
+        self.store = store
+        self.batch_size = batch_size
+        self.user_counts = {}
+        self.updated_at = None
+        self.count = 0
+        self._batch = []
+
+    def add(self, pr):
+        self.writers["pull_requests"].write(pr)
+        if "pull_request_authors" in self.writers:
+            self.writers["pull_request_authors"].write_row(
+                [pr.repo_name, pr.number, json.dumps(pr.authors)]
+            )
+        _count_authors([pr], self.user_counts)
+        if pr.updated_at and (
+            self.updated_at is None or pr.updated_at > self.updated_at
+        ):
+            self.updated_at = pr.updated_at
+        self.count += 1
+        if self.store is not None:
+            self._batch.append(pr)
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+        return pr
+
+    def add_all(self, pull_requests):
+        for pr in pull_requests:
+            yield self.add(pr)
+
+    def flush(self):
+        if self._batch:
+            self.store.upsert_pull_requests(self._batch)
+            self._batch = []
+
+    def close(self):
+        if self.store is not None:
+            self.flush()
+        if self.own_writers:
+            close_csv_writers(self.writers)
+
+
+def _finish_collection(
+    repo,
+    output,
+    errors,
+    repo_users,
+    date_of_collection,
+    watermarks,
+    journal,
+    store,
+):
+    full_name = f"{repo.owner}/{repo.name}"
+
+    # Only advance the watermark when the listing finished and every
+    # changed PR was hydrated, so failed ones are picked up next run
+    if watermarks is not None and not errors and not repo.listing_error:
+        if output.updated_at:
+            watermarks[full_name] = output.updated_at
+
+    phase_start = time.perf_counter()
+    writers = output.writers
+
+    for user in repo_users.values():
+        if (
+            isinstance(user.following_count, (int, float))
+            and isinstance(user.followers_count, (int, float))
+            and isinstance(user.pull_requests_count, (int, float))
+            and isinstance(user.contributions_last_year, (int, float))
+        ):
+            print(
+                f"User: {user.username}, Following: {user.following_count}, "
+                f"Followers: {user.followers_count}, "
+                f"PullRequests: {user.pull_requests_count}, "
+                f"ContributionsLastYear: {user.contributions_last_year}"
+            )
+
+            writers["users"].write(user)
+
+    writers["repositories"].write(repo)
+    output.close()
+    if store is not None:
+        store.upsert_repository(repo)
+        store.upsert_users(repo_users.values())
+    metrics.observe(
+        "collection_phase_seconds", time.perf_counter() - phase_start, phase="output"
+    )
+
+    # A repository with failed pieces stays open so a rerun retries them
+    if journal is not None and not errors and not repo.listing_error:
+        journal.finish_repository(full_name, output.user_counts)
+
+    # Print additional details
+    print(f"\nDetails for {repo.owner}/{repo.name}:")
+    print(f"Description: {repo.description}")
+    print(f"Homepage: {repo.homepage}")
+    print(f"License: {repo.license}")
+    print(f"Forks: {repo.forks}")
+    print(f"Watchers: {repo.watchers}")
+    print(f"Data collection date: {date_of_collection}")
+    if watermarks is not None:
+        print(f"Updated pull requests: {output.count}")
+
+    print("\nData collection complete.")
+
+    return repo
+
+
+def collect_data_for_repository(
+    owner,
+    repo_name,
+    users,
+    date_of_collection=None,
+    max_workers=8,
+    client=None,
+    watermarks=None,
+    existing_repo=None,
+    backend="rest",
+    writers=None,
+    compact=False,
+    journal=None,
+    store=None,
+):
+    client = client or default_client
+
+    # In incremental mode (watermarks given) only pull requests updated since
+    # the last run are listed and hydrated, then merged into existing_repo
+    full_name = f"{owner}/{repo_name}"
+    since = watermarks.get(full_name) if watermarks is not None else None
+
+    # With a journal, finished repositories are rebuilt without any request
+    # and interrupted ones resume from the last recorded page
+    state = journal.repository_state(full_name) if journal is not None else None
+    if state is not None and state["done"]:
+        return _restore_collected_repository(
+            owner, repo_name, users, state, journal, client, compact, existing_repo
+        )
+
+    if state is not None:
+        repo_info_data = state["info"]
+        date_of_collection = state["date_of_collection"]
+    else:
+        # Capture the current date and time if not provided
+        date_of_collection = date_of_collection or datetime.now().strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+
+        # GitHub API endpoint for repository information
+        repo_info_url = f"/repos/{owner}/{repo_name}"
+        with metrics.timer("collection_phase_seconds", phase="repository_info"):
+            repo_info_response = client.api_get(repo_info_url)
+        repo_info_data = _repository_info(
+            repo_info_response, full_name, date_of_collection, journal
+        )
+        if repo_info_data is None:
+            return None
+
+    # Collect data for the specified repository
+    repo = GitHubRepository.from_api(
+        owner,
+        repo_name,
+        repo_info_data,
+        date_of_collection,
+        client=client,
+        compact=compact,
+    )
+
+    if existing_repo is not None:
+        repo.pull_requests = existing_repo.pull_requests
+
+    hydrated_pull_requests, pending_pull_requests, listing_options = _resume_listing(
+        full_name, state, backend, journal, client
+    )
+
+    def stream_pull_requests():
+        # Pull requests listed before an interruption go first
+        yield from pending_pull_requests
+        if listing_options is None:
+            return
+        if backend == "graphql":
+            pull_requests = repo.iter_pull_requests_graphql(
+                since=since, **listing_options
+            )
+        elif watermarks is None:
+            pull_requests = repo.iter_pull_requests(**listing_options)
+        else:
+            pull_requests = repo.iter_pull_requests(
+                sort="updated", direction="desc", since=since, **listing_options
+            )
+        yield from pull_requests
+
+    # Each pull request is written out and merged as soon as it and the ones
+    # listed before it are hydrated, so only the window in flight is held on
+    # top of the repository itself. GraphQL pages already carry the details,
+    # so only the commit authors are fetched per PR.
+    phase_start = time.perf_counter()
+    output = _PullRequestOutput(writers, store)
+    errors = []
+    repo.merge_pull_requests(
+        output.add_all(
+            chain(
+                hydrated_pull_requests,
+                hydrate_pull_requests(
+                    stream_pull_requests(),
+                    max_workers=max_workers,
+                    on_success=(
+                        None
+                        if journal is None
+                        else lambda pr: journal.record_details(full_name, pr)
+                    ),
+                    details=backend != "graphql",
+                    errors=errors,
+                ),
+            )
+        )
+    )
+    metrics.observe(
+        "collection_phase_seconds",
+        time.perf_counter() - phase_start,
+        phase="pull_requests",
+    )
+    metrics.increment("collection_pull_requests_total", output.count, backend=backend)
+    metrics.increment("collection_detail_errors_total", len(errors))
+
+    # Users are looked up by login in the registry and each distinct author
+    # is scraped once, in parallel, then reported once per repository
+    output.user_counts = _repository_user_counts(repo, output.user_counts)
+    user_counts = output.user_counts
+    with metrics.timer("collection_phase_seconds", phase="users"):
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            scraped = executor.map(
+                users.add_pull_requests, user_counts, user_counts.values()
+            )
+            repo_users = dict(zip(user_counts, scraped))
+
+    return _finish_collection(
+        repo, output, errors, repo_users, date_of_collection, watermarks, journal, store
+    )
+
+
+async def collect_data_for_repository_async(
+    owner,
+    repo_name,
+    users,
+    date_of_collection=None,
+    client=None,
+    watermarks=None,
+    existing_repo=None,
+    backend="rest",
+    writers=None,
+    compact=False,
+    journal=None,
+    store=None,
+):
+    # The same collection as collect_data_for_repository on an
+    # AsyncGitHubClient; concurrency is bounded by the client's semaphore
+    # instead of a thread pool. users must be a UserRegistry on that client.
+    client = client or users.client
+    full_name = f"{owner}/{repo_name}"
+    since = watermarks.get(full_name) if watermarks is not None else None
+
+    state = journal.repository_state(full_name) if journal is not None else None
+    if state is not None and state["done"]:
+        return _restore_collected_repository(
+            owner, repo_name, users, state, journal, client, compact, existing_repo
+        )
+
+    if state is not None:
+        repo_info_data = state["info"]
+        date_of_collection = state["date_of_collection"]
+    else:
+        date_of_collection = date_of_collection or datetime.now().strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        with metrics.timer("collection_phase_seconds", phase="repository_info"):
+            repo_info_response = await client.api_get(f"/repos/{owner}/{repo_name}")
+        repo_info_data = _repository_info(
+            repo_info_response, full_name, date_of_collection, journal
+        )
+        if repo_info_data is None:
+            return None
+
+    repo = GitHubRepository.from_api(
+        owner,
+        repo_name,
+        repo_info_data,
+        date_of_collection,
+        client=client,
+        compact=compact,
+    )
+
+    if existing_repo is not None:
+        repo.pull_requests = existing_repo.pull_requests
+
+    hydrated_pull_requests, pending_pull_requests, listing_options = _resume_listing(
+        full_name, state, backend, journal, client
+    )
+
+    async def stream_pull_requests():
+        for pr in pending_pull_requests:
+            yield pr
+        if listing_options is None:
+            return
+        if backend == "graphql":
+            pull_requests = repo.iter_pull_requests_graphql_async(
+                since=since, **listing_options
+            )
+        elif watermarks is None:
+            pull_requests = repo.iter_pull_requests_async(**listing_options)
+        else:
+            pull_requests = repo.iter_pull_requests_async(
+                sort="updated", direction="desc", since=since, **listing_options
+            )
+        async for pr in pull_requests:
+            yield pr
+
+    phase_start = time.perf_counter()
+    output = _PullRequestOutput(writers, store)
+    positions = repo.pull_request_positions()
+    repo.merge_pull_requests(output.add_all(hydrated_pull_requests), positions)
+    errors = []
+    batch = []
+    async for pr in hydrate_pull_requests_async(
+        stream_pull_requests(),
+        on_success=(
+            None
+            if journal is None
+            else lambda pr: journal.record_details(full_name, pr)
+        ),
+        details=backend != "graphql",
+        errors=errors,
+    ):
+        batch.append(output.add(pr))
+        if len(batch) >= 1000:
+            repo.merge_pull_requests(batch, positions)
+            batch = []
+    repo.merge_pull_requests(batch, positions)
+    metrics.observe(
+        "collection_phase_seconds",
+        time.perf_counter() - phase_start,
+        phase="pull_requests",
+    )
+    metrics.increment("collection_pull_requests_total", output.count, backend=backend)
+    metrics.increment("collection_detail_errors_total", len(errors))
+
+    # Every new profile is scraped concurrently
+    output.user_counts = _repository_user_counts(repo, output.user_counts)
+    user_counts = output.user_counts
+    with metrics.timer("collection_phase_seconds", phase="users"):
+        scraped = await asyncio.gather(
+            *(
+                users.add_pull_requests_async(author, count)
+                for author, count in user_counts.items()
+            )
+        )
+    repo_users = dict(zip(user_counts, scraped))
+
+    return _finish_collection(
+        repo, output, errors, repo_users, date_of_collection, watermarks, journal, store
+    )
+
+
+def repositories_to_frame(repositories):
+    import pandas as pd
+
+    repositories_df = pd.DataFrame(
+        [repo.to_row() for repo in repositories], columns=GitHubRepository.csv_fields
+    )
+    return repositories_df.astype({"forks": "int64", "watchers": "int64"})
+
+
+def pull_requests_to_frame(pull_requests):
+    import pandas as pd
+
+    pull_requests_df = pd.DataFrame(
+        [pr.to_row() for pr in pull_requests], columns=GitHubPullRequest.csv_fields
+    )
+    # Typed columns: real timestamps and integer counts instead of strings
+    for column in ("created_at", "closed_at", "updated_at", "merged_at"):
+        pull_requests_df[column] = pd.to_datetime(
+            pull_requests_df[column].replace("", None), utc=True
+        )
+    return pull_requests_df.astype(
+        {
+            "number": "int64",
+            "commits": "int64",
+            "additions": "int64",
+            "deletions": "int64",
+            "changed_files": "int64",
+        }
+    )
+
+
+def users_to_frame(users):
+    import pandas as pd
+
+    users_df = pd.DataFrame(
+        [user.to_row() for user in users], columns=GitHubUser.csv_fields
+    )
+    return users_df.astype(
+        {field: "int64" for field in GitHubUser.csv_fields if field != "username"}
+    )
+
+
+def export_parquet(repositories, users, directory="data"):
+    import pandas as pd
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("Error: Saving to Parquet requires the pyarrow package.")
+        return False
+
+    # One pull request file per repository, so a re-collected repository
+    # only rewrites its own partition
+    pull_requests_directory = os.path.join(directory, "pull_requests")
+    os.makedirs(pull_requests_directory, exist_ok=True)
+
+    _upsert_parquet(
+        repositories_to_frame(repositories),
+        os.path.join(directory, "repositories.parquet"),
+        ["owner", "name"],
+    )
+    for repo in repositories:
+        pull_requests_df = pull_requests_to_frame(repo.pull_requests)
+        pull_requests_df["authors"] = [
+            json.dumps(pr.authors) for pr in repo.pull_requests
+        ]
+        _upsert_parquet(
+            pull_requests_df,
+            os.path.join(pull_requests_directory, f"{repo.owner}__{repo.name}.parquet"),
+            ["repo_name", "number"],
+        )
+
+    # User counts are totals over every partition, as in users.csv
+    totals = {}
+    for file_name in os.listdir(pull_requests_directory):
+        authors = pd.read_parquet(os.path.join(pull_requests_directory, file_name)).get(
+            "authors", []
+        )
+        for value in authors:
+            for username, count in json.loads(value or "{}").items():
+                totals[username] = totals.get(username, 0) + count
+    users_df = users_to_frame(users)
+    users_df["pull_requests_count"] = [
+        totals.get(username, count)
+        for username, count in zip(
+            users_df["username"], users_df["pull_requests_count"]
+        )
+    ]
+    _upsert_parquet(users_df, os.path.join(directory, "users.parquet"), ["username"])
+    return True
+
+
+def _upsert_parquet(frame, file_name, key):
+    # Rows already in the file are replaced by the ones in frame with the
+    # same key; the others are kept, so a partial run never drops data
+    import pandas as pd
+
+    if os.path.isfile(file_name):
+        existing = pd.read_parquet(file_name)
+        if set(key) <= set(existing.columns):
+            replaced = pd.MultiIndex.from_frame(existing[key]).isin(
+                pd.MultiIndex.from_frame(frame[key])
+            )
+            frame = pd.concat([existing[~replaced], frame], ignore_index=True)
+    frame.to_parquet(file_name, index=False)
+
+
+def _read_parquet_pull_requests(file_name, client=None):
+    import pandas as pd
 
-    def scrape_user_profile(self):
-        profile_url = f"https://github.com/{self.username}"
+    pull_requests_df = pd.read_parquet(file_name)
+    for column in ("created_at", "closed_at", "updated_at", "merged_at"):
+        if column in pull_requests_df:
+            # Missing timestamps come back as None, not NaN
+            formatted = pull_requests_df[column].map(_format_timestamp)
+            pull_requests_df[column] = formatted.astype(object).where(
+                formatted.notna(), None
+            )
+    if "authors" in pull_requests_df:
+        # Partitions written before authors were kept have none
+        pull_requests_df["authors"] = [
+            json.loads(value) if isinstance(value, str) else {}
+            for value in pull_requests_df["authors"]
+        ]
+    for record in pull_requests_df.to_dict("records"):
+        yield GitHubPullRequest.from_record(record, client=client)
 
-        # Make a GET request to the user profile page
-        response = requests.get(profile_url)
 
-        if response.status_code == 200:
-            # Use BeautifulSoup to parse the HTML content
-            soup = BeautifulSoup(response.content, "html.parser")
+def _format_timestamp(value):
+    import pandas as pd
 
-            # Extract relevant information from the user profile
-            try:
-                # Extracting the contributions in the last year from the user profile
-                contributions_last_year_tag = soup.find(
-                    "div", class_="js-yearly-contributions"
-                )
-                self.contributions_last_year = int(
-                    contributions_last_year_tag["data-count"]
-                )
-            except (TypeError, KeyError, ValueError):
-                print("Error: Unable to fetch contributions_last_year.")
-                self.contributions_last_year = 0
+    if pd.isna(value):
+        return None
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
 
-            try:
-                # Extracting the followers count from the user profile
-                followers_tag = soup.find("a", class_="Link--secondary")
-                self.followers_count = int(followers_tag.span.get_text(strip=True))
-            except (TypeError, ValueError):
-                print("Error: Unable to fetch followers count.")
-                self.followers_count = 0
 
-            try:
-                # Extracting the following count from the user profile
-                following_tag = soup.find_all("a", class_="Link--secondary")[1]
-                self.following_count = int(following_tag.span.get_text(strip=True))
-            except (TypeError, ValueError):
-                print("Error: Unable to fetch following count.")
-                self.following_count = 0
-        else:
-            print(
-                f"Error: Unable to fetch user profile. Status code: {response.status_code}"
-            )
+def load_parquet(directory="data", client=None):
+    import pandas as pd
 
-    def to_csv(self):
-        return (
-            f"{self.username},{self.pull_requests_count},{self.repositories_count},"
-            f"{self.followers_count},{self.following_count},{self.contributions_last_year}"
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("Error: Loading from Parquet requires the pyarrow package.")
+        return None, None
+
+    repositories_file = os.path.join(directory, "repositories.parquet")
+    if not os.path.isfile(repositories_file):
+        print(f"Error: No collected data found in {directory}.")
+        return None, None
+
+    repositories = []
+    for row in pd.read_parquet(repositories_file).to_dict("records"):
+        repo = GitHubRepository(
+            row["owner"],
+            row["name"],
+            row["description"],
+            row["homepage"],
+            row["license"],
+            row["forks"],
+            row["watchers"],
+            date_of_collection=str(row["date_of_collection"])[:19],
+            client=client,
         )
 
+        pull_requests_file = os.path.join(
+            directory, "pull_requests", f"{repo.owner}__{repo.name}.parquet"
+        )
+        if os.path.isfile(pull_requests_file):
+            repo.pull_requests.extend(
+                _read_parquet_pull_requests(pull_requests_file, client=client)
+            )
+        repositories.append(repo)
 
-def save_as_csv(file_name, obj):
-    file_exists = os.path.isfile(file_name)
+    users = []
+    users_file = os.path.join(directory, "users.parquet")
+    if os.path.isfile(users_file):
+        for record in pd.read_parquet(users_file).to_dict("records"):
+            user = GitHubUser(record["username"], client=client)
+            for field in GitHubUser.csv_fields[1:]:
+                setattr(user, field, int(record[field]))
+            users.append(user)
 
-    with open(file_name, "a", newline="", encoding="utf-8") as csv_file:
-        writer = csv.writer(csv_file)
+    return repositories, users
 
-        if not file_exists:
-            header = obj.to_csv().split(",")
-            writer.writerow(header)
 
-        data = obj.to_csv().split(",")
-        writer.writerow(data)
+def _downsample(frame, max_points):
+    import numpy as np
 
+    # Keep evenly spaced rows so the overall shape survives
+    if len(frame) <= max_points:
+        return frame
+    step = len(frame) / max_points
+    return frame.iloc[(np.arange(max_points) * step).astype(int)]
 
-def collect_data_for_repository(owner, repo_name, users, date_of_collection=None):
-    # Capture the current date and time if not provided
-    date_of_collection = date_of_collection or datetime.now().strftime(
-        "%Y-%m-%d %H:%M:%S"
-    )
 
-    # GitHub API endpoint for repository information
-    repo_info_url = f"https://api.github.com/repos/{owner}/{repo_name}"
-    repo_info_response = requests.get(repo_info_url)
+def prepare_chart_data(repositories, max_points=5000, store=None):
+    import numpy as np
+    import pandas as pd
 
-    if repo_info_response.status_code == 200:
-        # Parse the JSON response for repository information
-        repo_info_data = repo_info_response.json()
+    pull_requests_df = analytics.combined_frame(repositories)
+    if pull_requests_df.empty:
+        return None
 
-        # Extract additional information
-        description = repo_info_data.get("description", "")
-        homepage = repo_info_data.get("homepage", "")
+    pull_requests_df = pull_requests_df.rename(
+        columns={
+            "created_at": "Date",
+            "number": "Number",
+            "state": "State",
+            "changed_files": "Changed Files",
+            "commits": "Commits",
+        }
+    )
 
-        # Check if "license" key exists
-        if "license" in repo_info_data and repo_info_data["license"] is not None:
-            license = repo_info_data["license"].get("name", "")
-        else:
-            license = "No License"  # Set a default value or handle it accordingly
+    # Scatter, line and box data is downsampled and the histogram is
+    # binned up front, so rendering cost does not grow with the PR count
+    over_time = {
+        state: _downsample(state_df.sort_values("Date")[["Date", "Number"]], max_points)
+        for state, state_df in pull_requests_df.groupby("State")
+    }
+    counts, edges = np.histogram(pull_requests_df["Changed Files"], bins=20)
 
-        forks = repo_info_data.get("forks", 0)
-        watchers = repo_info_data.get("watchers", 0)
+    users_per_repository = (
+        pull_requests_df[["repo_name", "user"]]
+        .drop_duplicates()
+        .groupby("repo_name")["user"]
+        .count()
+        .rename_axis("Repository")
+    )
 
-        # Collect data for the specified repository
-        repo = GitHubRepository(
-            owner,
-            repo_name,
-            description,
-            homepage,
-            license,
-            forks,
-            watchers,
-            date_of_collection=date_of_collection,
+    if store is not None:
+        # Daily counts and state totals come from the store's rollups and
+        # indexes instead of a group-by over every pull request
+        repo_names = [f"{repo.owner}/{repo.name}" for repo in repositories]
+        rollups = [row for row in store.rollups(repo_names) if row["opened"]]
+        pull_requests_per_day = pd.Series(
+            [row["opened"] for row in rollups],
+            index=pd.Index(
+                [datetime.strptime(row["start"], "%Y-%m-%d").date() for row in rollups],
+                name="Date",
+            ),
+            name="Number",
         )
-        repo.fetch_pull_requests()
-
-        for pr in repo.pull_requests:
-            pr.fetch_pull_request_details()
-
-            for author in pr.authors:
-                username = author
-                user = next((u for u in users if u.username == username), None)
-
-                if not user:
-                    user = GitHubUser(username)
-                    users.append(user)
-
-                user.get_user_data()
-                user.pull_requests_count += pr.authors[author]
-
-                if (
-                    isinstance(user.following_count, (int, float))
-                    and isinstance(user.followers_count, (int, float))
-                    and isinstance(user.pull_requests_count, (int, float))
-                    and isinstance(user.contributions_last_year, (int, float))
-                ):
-                    print(
-                        f"User: {user.username}, Following: {user.following_count}, "
-                        f"Followers: {user.followers_count}, "
-                        f"PullRequests: {user.pull_requests_count}, "
-                        f"ContributionsLastYear: {user.contributions_last_year}"
-                    )
+        state_distribution = (
+            pd.Series(store.state_counts(repo_names), name="count")
+            .rename_axis("State")
+            .sort_values(ascending=False)
+        )
+    else:
+        # Summed from each repository's memoized daily counts
+        pull_requests_per_day = (
+            pd.concat([analytics.daily_counts(repo) for repo in repositories])
+            .groupby(level=0)
+            .sum()
+            .rename_axis("Date")
+            .rename("Number")
+        )
+        state_distribution = pull_requests_df["State"].value_counts()
+
+    return {
+        "pull_requests_over_time": over_time,
+        "pull_requests_per_day": pull_requests_per_day,
+        "state_distribution": state_distribution,
+        "size_distribution": (counts, edges),
+        "size_vs_commits": pull_requests_df[["Changed Files", "Commits"]]
+        .sample(
+            n=min(max_points, len(pull_requests_df)),
+            random_state=0,
+        )
+        .sort_index(),
+        "size_by_state": pull_requests_df[["State", "Changed Files"]]
+        .sample(
+            n=min(max_points, len(pull_requests_df)),
+            random_state=0,
+        )
+        .sort_index(),
+        "users_per_repository": users_per_repository,
+    }
 
-                    save_as_csv("users.csv", user)
 
-                    time.sleep(1)
+def draw_chart(name, data):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-        save_as_csv("repositories.csv", repo)
+    if name == "pull_requests_over_time":
+        # Line graph: Total number of pull requests per day
+        figure = plt.figure(figsize=(10, 6))
+        for state, state_df in data.items():
+            plt.plot(
+                state_df["Date"],
+                state_df["Number"],
+                marker="o",
+                linestyle="-",
+                label=state,
+            )
+        plt.title("Total Number of Pull Requests Over Time, Separated by State")
+        plt.xlabel("Date")
+        plt.ylabel("Number of Pull Requests")
+        plt.xticks(rotation=45)
+        plt.legend()
+        plt.tight_layout()
 
-        # Print additional details
-        print(f"\nDetails for {repo.owner}/{repo.name}:")
-        print(f"Description: {description}")
-        print(f"Homepage: {homepage}")
-        print(f"License: {license}")
-        print(f"Forks: {forks}")
-        print(f"Watchers: {watchers}")
-        print(f"Data collection date: {date_of_collection}")
+    elif name == "pull_requests_per_day":
+        # Line graph: Number of open and closed pull requests per day
+        figure = plt.figure(figsize=(10, 6))
+        data.plot(kind="line")
+        plt.title("Number of Open and Closed Pull Requests per Day")
+        plt.xlabel("Date")
+        plt.ylabel("Number of Pull Requests")
+        plt.legend(title="State")
 
-        print("\nData collection complete.")
+    elif name == "state_distribution":
+        figure = plt.figure(figsize=(8, 8))
+        plt.pie(data, labels=data.index, autopct="%1.1f%%", startangle=90)
+        plt.title("Distribution of Pull Request States")
 
-        return repo
+    elif name == "size_distribution":
+        # Histogram: Distribution of pull request sizes (number of changes)
+        counts, edges = data
+        figure = plt.figure(figsize=(10, 6))
+        plt.hist(
+            edges[:-1],
+            bins=edges,
+            weights=counts,
+            color="skyblue",
+            edgecolor="black",
+        )
+        plt.title("Distribution of Pull Request Sizes")
+        plt.xlabel("Number of Changed Files")
+        plt.ylabel("Frequency")
 
-    else:
-        print(
-            f"Error: Unable to fetch repository information. Status code: {repo_info_response.status_code}"
+    elif name == "size_vs_commits":
+        # Scatter plot: Pull request size vs. number of commits
+        figure = plt.figure(figsize=(10, 6))
+        plt.scatter(data["Changed Files"], data["Commits"], color="orange")
+        plt.title("Pull Request Size vs. Number of Commits")
+        plt.xlabel("Number of Changed Files")
+        plt.ylabel("Number of Commits")
+
+    elif name == "size_by_state":
+        # Box plot: Pull request size distribution by state
+        figure = plt.figure(figsize=(10, 6))
+        sns.boxplot(
+            x="State",
+            y="Changed Files",
+            hue="State",
+            data=data,
+            palette="viridis",
+            legend=False,
         )
-        return None
+        plt.title("Pull Request Size Distribution by State")
+        plt.xlabel("State")
+        plt.ylabel("Number of Changed Files")
 
+    elif name == "users_per_repository":
+        # Bar plot: Number of users per repository
+        figure = plt.figure(figsize=(10, 6))
+        data.plot(kind="bar")
+        plt.title("Number of Users per Repository")
+        plt.xlabel("Repository")
+        plt.ylabel("Number of Users")
 
-def create_and_store_visual_representation_data(repositories):
-    # Line graph: Total number of pull requests per day
-    pull_requests_data = {
-        "Date": [],
-        "Number": [],
-        "State": [],
-        "Changed Files": [],
-        "Commits": [],
-    }
+    else:
+        raise ValueError(f"Unknown chart: {name}")
 
-    for repo in repositories:
-        for pr in repo.pull_requests:
-            pull_requests_data["Date"].append(pr.created_at)
-            pull_requests_data["Number"].append(pr.number)
-            pull_requests_data["State"].append(pr.state)
-            pull_requests_data["Changed Files"].append(pr.changed_files)
-
-            # Add "Commits" information if available
-            if pr.commits is not None:
-                pull_requests_data["Commits"].append(pr.commits)
-            else:
-                pull_requests_data["Commits"].append(
-                    0
-                )  # You can replace 0 with another appropriate default value
+    return figure
+
+
+def render_chart(name, data, path):
+    # Runs in a worker process; select the off-screen backend before pyplot
+    # is first imported so no GUI toolkit is loaded
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
 
-    if not pull_requests_data["Number"]:
+    figure = draw_chart(name, data)
+    figure.savefig(path)
+    plt.close(figure)
+    return path
+
+
+def create_and_store_visual_representation_data(
+    repositories,
+    output_dir=None,
+    image_format="png",
+    workers=None,
+    max_points=5000,
+    store=None,
+):
+    import matplotlib.pyplot as plt
+
+    chart_data = prepare_chart_data(repositories, max_points=max_points, store=store)
+    if chart_data is None:
         print("No pull request information found. Exiting.")
-        return
+        return []
 
-    pull_requests_df = pd.DataFrame(pull_requests_data)
-    pull_requests_df["Date"] = pd.to_datetime(pull_requests_df["Date"])
-
-    plt.figure(figsize=(10, 6))
-    for state in pull_requests_df["State"].unique():
-        state_df = pull_requests_df[pull_requests_df["State"] == state]
-        plt.plot(
-            state_df["Date"], state_df["Number"], marker="o", linestyle="-", label=state
-        )
-
-    plt.title("Total Number of Pull Requests Over Time, Separated by State")
-    plt.xlabel("Date")
-    plt.ylabel("Number of Pull Requests")
-    plt.xticks(rotation=45)
-    plt.legend()
-    plt.tight_layout()
-    plt.show()
-    # Line graph: Number of open and closed pull requests per day
-    open_vs_closed_pull_requests_per_day = pull_requests_df.groupby(
-        [pull_requests_df["Date"].dt.date]
-    )["Number"].count()
-
-    plt.figure(figsize=(10, 6))
-    open_vs_closed_pull_requests_per_day.plot(kind="line")
-    plt.title("Number of Open and Closed Pull Requests per Day")
-    plt.xlabel("Date")
-    plt.ylabel("Number of Pull Requests")
-    plt.legend(title="State")
-    plt.show()
-
-    pull_request_states = pull_requests_df["State"].value_counts()
-    plt.figure(figsize=(8, 8))
-    plt.pie(
-        pull_request_states,
-        labels=pull_request_states.index,
-        autopct="%1.1f%%",
-        startangle=90,
-    )
-    plt.title("Distribution of Pull Request States")
-    plt.show()
-
-    # Histogram: Distribution of pull request sizes (number of changes)
-    plt.figure(figsize=(10, 6))
-    plt.hist(
-        pull_requests_df["Changed Files"], bins=20, color="skyblue", edgecolor="black"
-    )
-    plt.title("Distribution of Pull Request Sizes")
-    plt.xlabel("Number of Changed Files")
-    plt.ylabel("Frequency")
-    plt.show()
-
-    # Scatter plot: Pull request size vs. number of commits
-    plt.figure(figsize=(10, 6))
-    plt.scatter(
-        pull_requests_df["Changed Files"], pull_requests_df["Commits"], color="orange"
-    )
-    plt.title("Pull Request Size vs. Number of Commits")
-    plt.xlabel("Number of Changed Files")
-    plt.ylabel("Number of Commits")
-    plt.show()
-
-    # Box plot: Pull request size distribution by state
-    plt.figure(figsize=(10, 6))
-    sns.boxplot(x="State", y="Changed Files", data=pull_requests_df, palette="viridis")
-    plt.title("Pull Request Size Distribution by State")
-    plt.xlabel("State")
-    plt.ylabel("Number of Changed Files")
-    plt.show()
-
-    # Bar plot: Number of users per repository
-    users_per_repository = pd.DataFrame(
-        {
-            "Repository": [
-                pr.repo_name for repo in repositories for pr in repo.pull_requests
-            ],
-            "User": [pr.user for repo in repositories for pr in repo.pull_requests],
-        }
-    )
-    users_per_repository = (
-        users_per_repository.drop_duplicates().groupby("Repository")["User"].count()
-    )
+    if output_dir is None:
+        # Interactive mode: show each figure in turn
+        for name, data in chart_data.items():
+            draw_chart(name, data)
+            plt.show()
+        return []
+
+    # Headless mode: render every figure to a file in parallel processes
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [
+        (name, data, os.path.join(output_dir, f"{name}.{image_format}"))
+        for name, data in chart_data.items()
+    ]
+    if workers == 1:
+        paths = [render_chart(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            paths = list(executor.map(render_chart, *zip(*jobs)))
 
-    plt.figure(figsize=(10, 6))
-    users_per_repository.plot(kind="bar")
-    plt.title("Number of Users per Repository")
-    plt.xlabel("Repository")
-    plt.ylabel("Number of Users")
-    plt.show()
+    print(f"Saved {len(paths)} charts to {output_dir}.")
+    return paths
 
 
 def show_pull_requests(repositories):
@@ -482,7 +4867,32 @@ def show_menu():
     print("5. Calculate correlation for pull requests data")
     print("6. Create and store visual representation data for repositories")
     print("7. Calculate correlation for user data")
-    print("8. Quit")
+    print("8. Save collected data to Parquet")
+    print("9. Load collected data from Parquet")
+    print("10. Query pull requests across repositories")
+    print("11. Quit")
+
+
+def show_pull_request_query(store):
+    # Filters map onto the store's indexes; blank answers match anything
+    filters = {
+        "user": input("User (leave blank for any): ").strip() or None,
+        "state": input("State, open or closed (leave blank for any): ").strip().lower()
+        or None,
+        "since": input("Created since, YYYY-MM-DD (leave blank for any): ").strip()
+        or None,
+    }
+    total = store.count_pull_requests(**filters)
+    print(f"{total} matching pull requests.")
+    for pr in store.query_pull_requests(
+        **filters, order_by="created_at", descending=True, limit=20
+    ):
+        print(
+            f"{pr.repo_name}#{pr.number} [{pr.state}] {pr.created_at} "
+            f"by {pr.user}: {pr.title}"
+        )
+    if total > 20:
+        print("Showing the 20 most recent.")
 
 
 def show_repository_submenu(repo):
@@ -494,7 +4904,9 @@ def show_repository_submenu(repo):
 
 def main():
     repositories = []
-    users = []
+    client = GitHubClient(cache=ResponseCache())
+    users = UserRegistry(client)
+    store = DataStore()
 
     while True:
         show_menu()
@@ -504,11 +4916,48 @@ def main():
             while True:
                 owner = input("Enter the owner of the repository: ")
                 repo_name = input("Enter the name of the repository: ")
+                incremental = input(
+                    "Only fetch pull requests updated since the last run? (yes/no): "
+                ).lower()
+
+                existing_repo = next(
+                    (
+                        r
+                        for r in repositories
+                        if r.owner == owner and r.name == repo_name
+                    ),
+                    None,
+                )
+                watermarks = load_watermarks() if incremental == "yes" else None
+                if existing_repo is None and watermarks is not None:
+                    # Collected in an earlier session: start from the store
+                    existing_repo = store.load_repository(
+                        f"{owner}/{repo_name}", client=client
+                    )
+                backend = (
+                    input("Which API backend should be used? (rest/graphql): ")
+                    .strip()
+                    .lower()
+                )
 
                 # Collect data for the specified repository
-                repo = collect_data_for_repository(owner, repo_name, users)
+                repo = collect_data_for_repository(
+                    owner,
+                    repo_name,
+                    users,
+                    client=client,
+                    watermarks=watermarks,
+                    existing_repo=existing_repo,
+                    backend="graphql" if backend == "graphql" else "rest",
+                    store=store,
+                )
                 if repo is not None:  # Check if the repository is not None
-                    repositories.append(repo)
+                    if existing_repo in repositories:
+                        repositories[repositories.index(existing_repo)] = repo
+                    else:
+                        repositories.append(repo)
+                    if watermarks is not None:
+                        save_watermarks(watermarks)
                     print("Data collection complete.")
 
                 more_repositories = input(
@@ -542,7 +4991,7 @@ def main():
 
                 elif repo_submenu_choice == "2":
                     # Show summary for the selected repository
-                    summary = repositories[repo_index].get_summary()
+                    summary = repositories[repo_index].get_summary(store)
                     print(summary)
 
                 elif repo_submenu_choice != "3":
@@ -563,46 +5012,37 @@ def main():
 
             if 0 <= repo_index < len(repositories):
                 # Show summary for the selected repository
-                summary = repositories[repo_index].get_summary()
+                summary = repositories[repo_index].get_summary(store)
                 print(summary)
 
         elif choice == "5":
             # Calculate correlation for pull requests data
-            pull_requests_data = {
-                "Title": [],
-                "Number": [],
-                "Commits": [],
-                "Additions": [],
-                "Deletions": [],
-                "Changed Files": [],
+            correlation_matrix = store.correlation(
+                [f"{repo.owner}/{repo.name}" for repo in repositories]
+            )
+            labels = {
+                "number": "Number",
+                "commits": "Commits",
+                "additions": "Additions",
+                "deletions": "Deletions",
+                "changed_files": "Changed Files",
             }
-
-            for repo in repositories:
-                for pr in repo.pull_requests:
-                    pull_requests_data["Title"].append(pr.title)
-                    pull_requests_data["Number"].append(pr.number)
-                    pull_requests_data["Commits"].append(pr.commits)
-                    pull_requests_data["Additions"].append(pr.additions)
-                    pull_requests_data["Deletions"].append(pr.deletions)
-                    pull_requests_data["Changed Files"].append(pr.changed_files)
-
-            pull_requests_df = pd.DataFrame(pull_requests_data)
-            correlation_matrix = pull_requests_df.corr()
+            correlation_matrix = correlation_matrix.rename(index=labels, columns=labels)
             print("Correlation matrix for pull requests data:")
             print(correlation_matrix)
 
         elif choice == "6":
-            create_and_store_visual_representation_data(repositories)
+            save_charts = input(
+                "Save the charts to the charts directory instead of showing them? (yes/no): "
+            ).lower()
+            create_and_store_visual_representation_data(
+                repositories,
+                output_dir="charts" if save_charts == "yes" else None,
+                store=store,
+            )
 
         elif choice == "7":
             # Calculate correlation for user data
-            users_data = {
-                "Following": [],
-                "Followers": [],
-                "PullRequests": [],
-                "ContributionsLastYear": [],
-            }
-
             for user in users:
                 print(
                     f"User: {user.username}, Following: {user.following_count}, "
@@ -610,21 +5050,18 @@ def main():
                     f"PullRequests: {user.pull_requests_count}, "
                     f"ContributionsLastYear: {user.contributions_last_year}"
                 )
-                if (
-                    isinstance(user.following_count, (int, float))
-                    and isinstance(user.followers_count, (int, float))
-                    and isinstance(user.pull_requests_count, (int, float))
-                    and isinstance(user.contributions_last_year, (int, float))
-                ):
-                    users_data["Following"].append(user.following_count)
-                    users_data["Followers"].append(user.followers_count)
-                    users_data["PullRequests"].append(user.pull_requests_count)
-                    users_data["ContributionsLastYear"].append(
-                        user.contributions_last_year
-                    )
 
-            users_df = pd.DataFrame(users_data)
-            users_df = users_df.dropna().astype(float)
+            users_df = users_to_frame(users).rename(
+                columns={
+                    "following_count": "Following",
+                    "followers_count": "Followers",
+                    "pull_requests_count": "PullRequests",
+                    "contributions_last_year": "ContributionsLastYear",
+                }
+            )
+            users_df = users_df[
+                ["Following", "Followers", "PullRequests", "ContributionsLastYear"]
+            ].astype(float)
 
             correlation_matrix_users = users_df.corr()
 
@@ -632,6 +5069,28 @@ def main():
             print(correlation_matrix_users)
 
         elif choice == "8":
+            if export_parquet(repositories, users):
+                print("Collected data saved to the data directory.")
+
+        elif choice == "9":
+            loaded_repositories, loaded_users = load_parquet(client=client)
+            if loaded_repositories is not None:
+                repositories = loaded_repositories
+                for user in loaded_users:
+                    users.add(user)
+                for repo in repositories:
+                    store.add_repository(repo)
+                store.upsert_users(loaded_users)
+                print(f"Loaded {len(repositories)} repositories.")
+
+        elif choice == "10":
+            show_pull_request_query(store)
+
+        elif choice == "11":
+            for repo in repositories:
+                repo.close()
+            client.close()
+            store.close()
             print("Exiting the program.")
             break
 
@@ -639,5 +5098,766 @@ def main():
             print("Invalid choice. Please try again.")
 
 
+def read_repository_list(file_name):
+    # One owner/repo per line; blank lines and # comments are ignored
+    with open(file_name, encoding="utf-8") as repository_file:
+        return [
+            line.strip()
+            for line in repository_file
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
+
+def list_organization_repositories(org, client=None):
+    client = client or default_client
+    api_url = f"{client.api_url}/orgs/{org}/repos"
+    params = {"per_page": 100, "type": "all"}
+
+    while api_url:
+        response = client.get(api_url, params=params)
+        if response.status_code != 200:
+            print(
+                f"Error: Unable to list repositories for {org}. Status code: {response.status_code}"
+            )
+            return
+        for repo_data in response.json():
+            yield repo_data["full_name"]
+        api_url = response.links.get("next", {}).get("url")
+        params = None
+
+
+def load_previous_repositories(
+    repository_names,
+    store=None,
+    parquet_directory=None,
+    output_dir=".",
+    client=None,
+    compact=True,
+):
+    # The pull requests an incremental run merges the changed ones into,
+    # per repository: from the store when it has the repository, else from
+    # its Parquet partition, else from the previous CSV output. Repositories
+    # that were never collected are left out.
+    previous = {}
+    remaining = []
+    for full_name in repository_names:
+        repo = None
+        if store is not None:
+            repo = store.load_repository(full_name, client=client, compact=compact)
+        if repo is None and parquet_directory:
+            pull_requests_file = os.path.join(
+                parquet_directory,
+                "pull_requests",
+                f"{full_name.replace('/', '__')}.parquet",
+            )
+            if os.path.isfile(pull_requests_file):
+                repo = _previous_repository(full_name, client, compact)
+                repo.merge_pull_requests(
+                    _read_parquet_pull_requests(pull_requests_file, client=client)
+                )
+        if repo is None:
+            remaining.append(full_name)
+        else:
+            previous[full_name] = repo
+
+    # One pass over the CSV output for everything else; files from before
+    # writers upserted can hold a pull request twice, merging keeps one
+    pull_requests_file = os.path.join(output_dir, "pull_requests.csv")
+    if remaining and os.path.isfile(pull_requests_file):
+        remaining = set(remaining)
+        authors = {}
+        authors_file = os.path.join(output_dir, "pull_request_authors.csv")
+        if os.path.isfile(authors_file):
+            with open(authors_file, newline="", encoding="utf-8") as csv_file:
+                for record in csv.DictReader(csv_file):
+                    if record["repo_name"] in remaining:
+                        key = (record["repo_name"], int(record["number"]))
+                        authors[key] = json.loads(record["authors"] or "{}")
+
+        positions = {}
+        with open(pull_requests_file, newline="", encoding="utf-8") as csv_file:
+            reader = csv.DictReader(csv_file)
+            if "repo_name" not in (reader.fieldnames or []):
+                return previous
+            for record in reader:
+                full_name = record["repo_name"]
+                if full_name not in remaining:
+                    continue
+                if full_name not in previous:
+                    previous[full_name] = _previous_repository(
+                        full_name, client, compact
+                    )
+                    positions[full_name] = {}
+                pr = GitHubPullRequest.from_record(record, client=client)
+                pr.authors = authors.get((full_name, pr.number), {})
+                previous[full_name].merge_pull_requests([pr], positions[full_name])
+    return previous
+
+
+def _previous_repository(full_name, client, compact):
+    # Only the pull requests of a previous repository are carried over; its
+    # other fields are collected again
+    owner, _, repo_name = full_name.partition("/")
+    return GitHubRepository(
+        owner, repo_name, None, None, None, 0, 0, client=client, compact=compact
+    )
+
+
+def collect_repositories(
+    repository_names,
+    max_workers=4,
+    detail_workers=8,
+    client=None,
+    users=None,
+    backend="rest",
+    incremental=False,
+    output_dir=".",
+    compact=True,
+    journal=None,
+    store=None,
+    parquet_directory=None,
+):
+    client = client or default_client
+    users = users if users is not None else UserRegistry(client, journal)
+    watermarks = load_watermarks() if incremental else None
+    # Incremental runs only fetch what changed, so what was collected before
+    # is loaded first for the changes to be merged into
+    previous = (
+        load_previous_repositories(
+            repository_names, store, parquet_directory, output_dir, client, compact
+        )
+        if incremental
+        else {}
+    )
+
+    # All workers share one client, so one rate-limit budget, one user
+    # registry and one set of output files
+    os.makedirs(output_dir, exist_ok=True)
+    writers = open_csv_writers(output_dir)
+    total = len(repository_names)
+    completed = 0
+    failed = []
+    repositories = []
+    progress_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def collect(full_name):
+        nonlocal completed
+        owner, _, repo_name = full_name.partition("/")
+        try:
+            repo = collect_data_for_repository(
+                owner,
+                repo_name,
+                users,
+                max_workers=detail_workers,
+                client=client,
+                watermarks=watermarks,
+                existing_repo=previous.get(full_name),
+                backend=backend,
+                writers=writers,
+                compact=compact,
+                journal=journal,
+                store=store,
+            )
+        except requests.RequestException as e:
+            print(f"Error: Unable to collect {full_name}: {e}")
+            repo = None
+        if repo is None and full_name in previous:
+            # Nothing returned will hold the previous pull requests
+            previous[full_name].close()
+
+        with progress_lock:
+            completed += 1
+            if repo is None:
+                failed.append(full_name)
+            elapsed = time.perf_counter() - start
+            pull_requests = len(repo.pull_requests) if repo is not None else 0
+            print(
+                f"[{completed}/{total}] {full_name}: "
+                f"{'failed' if repo is None else f'{pull_requests} pull requests'} "
+                f"({elapsed:.1f}s elapsed)"
+            )
+        return repo
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for repo in executor.map(collect, repository_names):
+                if repo is not None:
+                    repositories.append(repo)
+    finally:
+        close_csv_writers(writers)
+        if watermarks is not None:
+            save_watermarks(watermarks)
+
+    print(
+        f"Collected {len(repositories)} of {total} repositories "
+        f"in {time.perf_counter() - start:.1f}s."
+    )
+    if failed:
+        print(f"Failed repositories: {', '.join(failed)}")
+    return repositories
+
+
+async def collect_repositories_async(
+    repository_names,
+    client,
+    users=None,
+    backend="rest",
+    incremental=False,
+    output_dir=".",
+    compact=True,
+    journal=None,
+    store=None,
+    parquet_directory=None,
+):
+    # Every repository is collected concurrently on one AsyncGitHubClient;
+    # its max_concurrency bounds the requests in flight across all of them
+    import aiohttp
+
+    users = users if users is not None else UserRegistry(client, journal)
+    watermarks = load_watermarks() if incremental else None
+    previous = (
+        load_previous_repositories(
+            repository_names, store, parquet_directory, output_dir, client, compact
+        )
+        if incremental
+        else {}
+    )
+
+    os.makedirs(output_dir, exist_ok=True)
+    writers = open_csv_writers(output_dir)
+    total = len(repository_names)
+    completed = 0
+    failed = []
+    start = time.perf_counter()
+
+    async def collect(full_name):
+        nonlocal completed
+        owner, _, repo_name = full_name.partition("/")
+        try:
+            repo = await collect_data_for_repository_async(
+                owner,
+                repo_name,
+                users,
+                client=client,
+                watermarks=watermarks,
+                existing_repo=previous.get(full_name),
+                backend=backend,
+                writers=writers,
+                compact=compact,
+                journal=journal,
+                store=store,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error: Unable to collect {full_name}: {e}")
+            repo = None
+        if repo is None and full_name in previous:
+            previous[full_name].close()
+
+        completed += 1
+        if repo is None:
+            failed.append(full_name)
+        elapsed = time.perf_counter() - start
+        pull_requests = len(repo.pull_requests) if repo is not None else 0
+        print(
+            f"[{completed}/{total}] {full_name}: "
+            f"{'failed' if repo is None else f'{pull_requests} pull requests'} "
+            f"({elapsed:.1f}s elapsed)"
+        )
+        return repo
+
+    try:
+        results = await asyncio.gather(*(collect(name) for name in repository_names))
+    finally:
+        close_csv_writers(writers)
+        if watermarks is not None:
+            save_watermarks(watermarks)
+
+    repositories = [repo for repo in results if repo is not None]
+    print(
+        f"Collected {len(repositories)} of {total} repositories "
+        f"in {time.perf_counter() - start:.1f}s."
+    )
+    if failed:
+        print(f"Failed repositories: {', '.join(failed)}")
+    return repositories
+
+
+def submit_repositories(queue, repository_names, backend="rest", batch_size=100):
+    # Each repository becomes a task; its listing then fans out into tasks
+    # for batches of pull requests and for every author's profile
+    submitted = 0
+    for full_name in repository_names:
+        submitted += queue.submit(
+            "repository",
+            {"repository": full_name, "backend": backend, "batch_size": batch_size},
+            key=f"repository:{full_name}",
+        )
+    return submitted
+
+
+def _run_repository_task(queue, task, client, detail_workers):
+    payload = task["payload"]
+    full_name = payload["repository"]
+    owner, _, repo_name = full_name.partition("/")
+    date_of_collection = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    repo_info_data = _repository_info(
+        client.api_get(f"/repos/{full_name}"), full_name, date_of_collection, None
+    )
+    if repo_info_data is None:
+        return None, "repository information unavailable"
+    repo = GitHubRepository.from_api(
+        owner, repo_name, repo_info_data, date_of_collection, client=client
+    )
+
+    def submit_batch(batch):
+        queue.submit(
+            "pull_requests",
+            {
+                "repository": full_name,
+                "backend": payload["backend"],
+                "pull_requests": [_journal_record(pr) for pr in batch],
+            },
+            key=f"pull_requests:{full_name}:{batch[0].number}-{batch[-1].number}",
+        )
+        # Long listings keep their lease alive page after page
+        return queue.extend(task)
+
+    if payload["backend"] == "graphql":
+        pull_requests = repo.iter_pull_requests_graphql()
+    else:
+        pull_requests = repo.iter_pull_requests()
+    batch = []
+    for pr in pull_requests:
+        batch.append(pr)
+        if len(batch) == payload["batch_size"]:
+            if not submit_batch(batch):
+                return None, "lease lost"
+            batch = []
+    if batch and not submit_batch(batch):
+        return None, "lease lost"
+    # A retried listing submits the same batches again, which are no-ops
+    if repo.listing_error:
+        return None, repo.listing_error
+    return {
+        "repository": full_name,
+        "info": repo_info_data,
+        "date_of_collection": date_of_collection,
+    }, None
+
+
+def _run_pull_requests_task(queue, task, client, detail_workers):
+    payload = task["payload"]
+    pull_requests = [
+        GitHubPullRequest.from_record(record, client=client)
+        for record in payload["pull_requests"]
+    ]
+    errors = fetch_all_pull_request_details(
+        pull_requests,
+        max_workers=detail_workers,
+        details=payload["backend"] != "graphql",
+    )
+    if errors:
+        return None, f"{len(errors)} of {len(pull_requests)} pull requests failed"
+    # Every author is scraped once, whichever batch sees them first
+    for username in _count_authors(pull_requests):
+        queue.submit("profile", {"username": username}, key=f"profile:{username}")
+    return {
+        "repository": payload["repository"],
+        "pull_requests": [_journal_record(pr) for pr in pull_requests],
+    }, None
+
+
+def _run_profile_task(queue, task, client, detail_workers):
+    user = GitHubUser(task["payload"]["username"], client=client)
+    user.scrape_user_profile()
+    return {
+        field: getattr(user, field)
+        for field in GitHubUser.csv_fields
+        if field not in ("username", "pull_requests_count")
+    }, None
+
+
+TASK_HANDLERS = {
+    "repository": _run_repository_task,
+    "pull_requests": _run_pull_requests_task,
+    "profile": _run_profile_task,
+}
+
+
+def run_worker(queue, client=None, worker=None, detail_workers=8, poll_interval=1.0):
+    # Leases and runs tasks until the queue is drained. Idle workers wait
+    # while others hold leases, since those tasks can still fan out or fail.
+    client = client or default_client
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    processed = 0
+    while True:
+        task = queue.lease(worker)
+        if task is None:
+            if not queue.unfinished():
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        handler = TASK_HANDLERS[task["kind"]]
+        with metrics.timer("work_queue_task_seconds", kind=task["kind"]):
+            try:
+                result, error = handler(queue, task, client, detail_workers)
+            except requests.RequestException as e:
+                result, error = None, str(e)
+        if error is None:
+            queue.complete(task, result)
+        else:
+            print(f"Error: {task['kind']} task {task['id']} failed: {error}")
+            queue.fail(task, error)
+        metrics.increment(
+            "work_queue_tasks_total",
+            kind=task["kind"],
+            result="done" if error is None else "failed",
+        )
+        processed += 1
+
+
+def _worker_process(location, tokens, detail_workers, cache, queue_options):
+    # Entry point of one local worker process, with its own client
+    queue = open_work_queue(location, **queue_options)
+    client = GitHubClient(
+        pool_size=max(detail_workers, 10),
+        tokens=tokens,
+        cache=ResponseCache() if cache else None,
+    )
+    try:
+        return run_worker(queue, client, detail_workers=detail_workers)
+    finally:
+        client.close()
+        queue.close()
+
+
+def run_workers(location, processes=4, detail_workers=8, cache=True, **queue_options):
+    # Each process gets its own share of the tokens, so N processes draw on
+    # N rate-limit budgets when there are enough tokens to go round
+    tokens = os.environ.get("GITHUB_TOKENS", "").split(",")
+    tokens.append(os.environ.get("GITHUB_TOKEN"))
+    tokens = list(dict.fromkeys(t.strip() for t in tokens if t and t.strip()))
+    if len(tokens) >= processes:
+        shares = [tokens[i::processes] for i in range(processes)]
+    else:
+        # Budgets have to be shared. Every process still gets every token,
+        # to fall back on, but starts on a different one, and each process
+        # only learns what the others spent from GitHub's headers.
+        print(
+            f"Only {len(tokens)} GitHub tokens for {processes} worker processes; "
+            "the processes will share rate-limit budgets."
+        )
+        shares = [
+            tokens[i % len(tokens) :] + tokens[: i % len(tokens)] if tokens else []
+            for i in range(processes)
+        ]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(
+                _worker_process,
+                location,
+                share,
+                detail_workers,
+                cache,
+                queue_options,
+            )
+            for share in shares
+        ]
+        return sum(future.result() for future in futures)
+
+
+def merge_work_queue(queue, output_dir=".", store=None, client=None, compact=True):
+    # Rebuilds the repositories and users from the finished tasks and writes
+    # one set of output files, as a batch run over the same repositories would
+    client = client or default_client
+    unfinished = queue.unfinished()
+    if unfinished:
+        print(f"Error: {unfinished} tasks are not finished yet; run the workers first.")
+        return None
+    for kind, payload, error in queue.failures():
+        print(f"Error: {kind} task {json.dumps(payload)[:100]} failed: {error}")
+
+    repositories = {}
+    for _, result in queue.results("repository"):
+        owner, _, repo_name = result["repository"].partition("/")
+        repositories[result["repository"]] = GitHubRepository.from_api(
+            owner,
+            repo_name,
+            result["info"],
+            result["date_of_collection"],
+            client=client,
+            compact=compact,
+        )
+    # Batches go straight into each repository's (columnar by default) pull
+    # requests. A listing retried after new pull requests came in can
+    # overlap earlier batches; merging keeps each pull request once.
+    positions = {full_name: {} for full_name in repositories}
+    for _, result in queue.results("pull_requests"):
+        repo = repositories.get(result["repository"])
+        if repo is None:
+            continue
+        repo.merge_pull_requests(
+            (
+                GitHubPullRequest.from_record(record, client=client)
+                for record in result["pull_requests"]
+            ),
+            positions[result["repository"]],
+        )
+    users = UserRegistry(client)
+    for payload, result in queue.results("profile"):
+        user = users.get_or_create(payload["username"])
+        for field, value in result.items():
+            setattr(user, field, value)
+
+    # User counts are totals over every repository, before anything is written
+    user_counts = {}
+    for full_name in repositories:
+        counts = _count_authors(repositories[full_name].pull_requests)
+        user_counts[full_name] = counts
+        for username, count in counts.items():
+            users.get_or_create(username).pull_requests_count += count
+
+    os.makedirs(output_dir, exist_ok=True)
+    writers = open_csv_writers(output_dir)
+    try:
+        for full_name, repo in repositories.items():
+            output = _PullRequestOutput(writers, store)
+            for pr in repo.pull_requests:
+                output.add(pr)
+            _finish_collection(
+                repo,
+                output,
+                [],
+                {username: users.get(username) for username in user_counts[full_name]},
+                repo.date_of_collection.strftime("%Y-%m-%d %H:%M:%S"),
+                None,
+                None,
+                store,
+            )
+    finally:
+        close_csv_writers(writers)
+    return list(repositories.values()), users
+
+
+def queue_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="collection.py queue",
+        description="Share a collection job between worker processes and hosts",
+    )
+    parser.add_argument(
+        "queue", help="SQLite file of the job, or a redis:// URL to share across hosts"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="Add repositories to the job")
+    submit.add_argument("repositories", nargs="*", help="owner/repo entries")
+    submit.add_argument("--file", help="File with one owner/repo per line")
+    submit.add_argument("--org", help="Collect every repository of an organization")
+    submit.add_argument("--backend", choices=["rest", "graphql"], default="rest")
+    submit.add_argument(
+        "--batch-size", type=int, default=100, help="Pull requests per task"
+    )
+
+    work = commands.add_parser("work", help="Run workers until the job is done")
+    work.add_argument("--processes", type=int, default=4)
+    work.add_argument("--detail-workers", type=int, default=8)
+    work.add_argument("--no-cache", action="store_true")
+    work.add_argument("--max-attempts", type=int, default=5)
+    work.add_argument(
+        "--visibility-timeout",
+        type=float,
+        default=600,
+        help="Seconds before a task leased by a silent worker is handed out again",
+    )
+
+    merge = commands.add_parser("merge", help="Write the results of a finished job")
+    merge.add_argument("--output-dir", default=".")
+    merge.add_argument("--parquet", help="Also save the results to this directory")
+    merge.add_argument(
+        "--store", help="Also upsert the results into this indexed SQLite store"
+    )
+
+    commands.add_parser("status", help="Show task counts and failures")
+    args = parser.parse_args(argv)
+
+    if args.command == "work":
+        processed = run_workers(
+            args.queue,
+            processes=args.processes,
+            detail_workers=args.detail_workers,
+            cache=not args.no_cache,
+            max_attempts=args.max_attempts,
+            visibility_timeout=args.visibility_timeout,
+        )
+        print(f"Processed {processed} tasks.")
+        return
+
+    queue = open_work_queue(args.queue)
+    try:
+        if args.command == "submit":
+            repository_names = list(args.repositories)
+            if args.file:
+                repository_names += read_repository_list(args.file)
+            if args.org:
+                repository_names += list(list_organization_repositories(args.org))
+            submitted = submit_repositories(
+                queue, dict.fromkeys(repository_names), args.backend, args.batch_size
+            )
+            print(f"Submitted {submitted} repositories.")
+        elif args.command == "merge":
+            store = DataStore(args.store) if args.store else None
+            try:
+                merged = merge_work_queue(queue, args.output_dir, store)
+            finally:
+                if store is not None:
+                    store.close()
+            if merged is not None:
+                if args.parquet:
+                    export_parquet(*merged, args.parquet)
+                for repo in merged[0]:
+                    repo.close()
+        else:
+            for status, count in queue.counts().items():
+                print(f"{status}: {count}")
+            for kind, payload, error in queue.failures():
+                print(f"Failed {kind} task {json.dumps(payload)[:100]}: {error}")
+    finally:
+        queue.close()
+
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="collection.py batch",
+        description="Collect GitHub repository data without the interactive menu",
+    )
+    parser.add_argument("repositories", nargs="*", help="owner/repo entries")
+    parser.add_argument("--file", help="File with one owner/repo per line")
+    parser.add_argument("--org", help="Collect every repository of an organization")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--detail-workers", type=int, default=8)
+    parser.add_argument("--backend", choices=["rest", "graphql"], default="rest")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--parquet", help="Also save the results to this directory")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--journal",
+        help="Checkpoint progress to this file; rerun with it to resume",
+    )
+    parser.add_argument(
+        "--store", help="Also upsert the results into this indexed SQLite store"
+    )
+    parser.add_argument(
+        "--async-concurrency",
+        type=int,
+        help="Collect on the asyncio client with this many requests in flight",
+    )
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument(
+        "--record", metavar="DIR", help="Archive every raw response in this directory"
+    )
+    archive_group.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="Rebuild everything from an archive instead of the network",
+    )
+    parser.add_argument("--metrics-json", help="Write run metrics as JSON here")
+    parser.add_argument(
+        "--metrics-prometheus", help="Write run metrics in Prometheus text format"
+    )
+    args = parser.parse_args(argv)
+
+    archive = None
+    if args.record or args.replay:
+        archive = ResponseArchive(args.record or args.replay, replay=bool(args.replay))
+    # Replayed responses never reach the cache
+    use_cache = not args.no_cache and not args.replay
+    client = GitHubClient(
+        pool_size=max(args.workers * args.detail_workers, 10),
+        cache=ResponseCache() if use_cache else None,
+        archive=archive,
+    )
+    repository_names = list(args.repositories)
+    if args.file:
+        repository_names += read_repository_list(args.file)
+    if args.org:
+        repository_names += list(list_organization_repositories(args.org, client))
+    if args.replay and not repository_names:
+        repository_names = archive.repositories()
+    repository_names = list(dict.fromkeys(repository_names))
+
+    if not repository_names:
+        parser.error("no repositories given; use owner/repo, --file or --org")
+
+    journal = CollectionJournal(args.journal) if args.journal else None
+    store = DataStore(args.store) if args.store else None
+    repositories = []
+    try:
+        if args.async_concurrency:
+            # The listing client above keeps the response cache; the async
+            # client opens its own connection to it
+            async_client = AsyncGitHubClient(
+                max_concurrency=args.async_concurrency,
+                cache=ResponseCache() if use_cache else None,
+                archive=archive,
+            )
+            users = UserRegistry(async_client, journal)
+
+            async def run():
+                async with async_client:
+                    return await collect_repositories_async(
+                        repository_names,
+                        async_client,
+                        users=users,
+                        backend=args.backend,
+                        incremental=args.incremental,
+                        output_dir=args.output_dir,
+                        journal=journal,
+                        store=store,
+                        parquet_directory=args.parquet,
+                    )
+
+            repositories = asyncio.run(run())
+        else:
+            users = UserRegistry(client, journal)
+            repositories = collect_repositories(
+                repository_names,
+                max_workers=args.workers,
+                detail_workers=args.detail_workers,
+                client=client,
+                users=users,
+                backend=args.backend,
+                incremental=args.incremental,
+                output_dir=args.output_dir,
+                journal=journal,
+                store=store,
+                parquet_directory=args.parquet,
+            )
+        if args.parquet:
+            export_parquet(repositories, users, args.parquet)
+    finally:
+        for repo in repositories:
+            repo.close()
+        client.close()
+        if journal is not None:
+            journal.close()
+        if store is not None:
+            store.close()
+        print("\nRun metrics:")
+        metrics.print_summary()
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prometheus:
+            metrics.write_prometheus(args.metrics_prometheus)
+
+
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "queue":
+        queue_main(sys.argv[2:])
+    else:
+        main()
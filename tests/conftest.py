@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import benchmark  # noqa: E402
+import collection  # noqa: E402
+
+
+@pytest.fixture
+def github(monkeypatch, tmp_path):
+    # Starts a mock GitHub API and points every client at it, including the
+    # ones batch_main and the workers build for themselves. Each test runs in
+    # its own directory, so watermarks and output files never leak between
+    # tests.
+    monkeypatch.chdir(tmp_path)
+    servers = []
+
+    def start(pull_requests=50, users=10, **config):
+        server = benchmark.MockGitHubServer(
+            pull_requests=pull_requests, users=users, **config
+        ).start()
+        servers.append(server)
+        for client_class in (collection.GitHubClient, collection.AsyncGitHubClient):
+            init = client_class.__init__
+
+            def patched(self, *args, init=init, **kwargs):
+                kwargs.update(api_url=f"{server.url}/api", web_url=server.url)
+                kwargs.setdefault("tokens", [])
+                init(self, *args, **kwargs)
+
+            monkeypatch.setattr(client_class, "__init__", patched)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def run_batch(*argv):
+    # batch_main without the per-repository chatter on stdout
+    import contextlib
+    import io
+
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        collection.batch_main(["--no-cache", *argv])
+    return output.getvalue()
@@ -0,0 +1,49 @@
+import collection
+
+
+def make_client(tmp_path, **cache_options):
+    cache = collection.ResponseCache(str(tmp_path / "cache.sqlite"), **cache_options)
+    return collection.GitHubClient(cache=cache)
+
+
+def first_listed(client):
+    response = client.api_get(
+        "/repos/octo/one/pulls",
+        params={"state": "all", "sort": "updated", "direction": "desc"},
+    )
+    return response.json()[0]["number"]
+
+
+def test_listings_are_revalidated_every_time(github, tmp_path):
+    server = github(pull_requests=30)
+    client = make_client(tmp_path)
+    assert first_listed(client) == 30
+    assert first_listed(client) == 30
+    assert client.cache.revalidated == 1
+    assert client.cache.hits == 0
+
+    # Within max-age a fresh entry would still hide the new update
+    server.touch(7)
+    assert first_listed(client) == 7
+
+
+def test_details_are_fresh_for_the_response_max_age(github, tmp_path):
+    github(pull_requests=5)
+    client = make_client(tmp_path)
+    first = client.api_get("/repos/octo/one/pulls/3").json()
+    assert client.api_get("/repos/octo/one/pulls/3").json() == first
+    assert client.cache.hits == 1
+
+    # The mock sends max-age=60; ttl still caps it
+    capped = make_client(tmp_path, ttl=0)
+    capped.api_get("/repos/octo/one/pulls/3")
+    assert capped.cache.hits == 0
+    assert capped.cache.revalidated == 1
+
+
+def test_max_age_comes_from_cache_control(tmp_path):
+    cache = collection.ResponseCache(str(tmp_path / "cache.sqlite"), ttl=3600)
+    assert cache.max_age({"Cache-Control": "private, max-age=60, s-maxage=60"}) == 60
+    assert cache.max_age({"cache-control": "max-age=86400"}) == 3600
+    assert cache.max_age({"Cache-Control": "no-cache"}) == 0
+    assert cache.max_age({}) == 0
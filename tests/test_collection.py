@@ -0,0 +1,217 @@
+import contextlib
+import csv
+import io
+import os
+import threading
+import time
+import types
+
+import requests
+
+import collection
+from conftest import run_batch
+
+
+def make_repository():
+    client = collection.GitHubClient()
+    return collection.GitHubRepository(
+        "octo", "one", "", "", "MIT", 0, 0, client=client
+    )
+
+
+def read_rows(file_name, drop_last=False):
+    with open(file_name, newline="", encoding="utf-8") as csv_file:
+        rows = list(csv.reader(csv_file))
+    return sorted(row[:-1] if drop_last else row for row in rows)
+
+
+def output_rows(directory):
+    # repositories.csv ends with the date of collection
+    return {
+        name: read_rows(os.path.join(directory, name), name == "repositories.csv")
+        for name in ("pull_requests.csv", "users.csv", "repositories.csv")
+    }
+
+
+def test_listing_pages_through_every_state(github):
+    github(pull_requests=250)
+    repo = make_repository()
+    pages = []
+    listed = list(repo.iter_pull_requests(on_page=lambda page, url: pages.append(url)))
+    assert [pr.number for pr in listed] == list(range(1, 251))
+    assert len(pages) == 3 and pages[-1] is None
+    assert {pr.state for pr in listed} == {"open", "closed"}
+
+    # GitHub only lists open pull requests unless asked for every state
+    open_numbers = [pr.number for pr in repo.iter_pull_requests(state="open")]
+    assert open_numbers == list(range(4, 251, 4))
+
+
+def test_hydration_keeps_input_order_within_the_window(github, monkeypatch):
+    github(pull_requests=200)
+    pull_requests = list(make_repository().iter_pull_requests())
+    lock = threading.Lock()
+    started = [0]
+    most_pending = [0]
+    yielded = [0]
+
+    def fetch_details(pr):
+        with lock:
+            started[0] += 1
+            most_pending[0] = max(most_pending[0], started[0] - yielded[0])
+        # Later pull requests finish first
+        time.sleep((200 - pr.number) % 7 * 0.001)
+        return True
+
+    monkeypatch.setattr(
+        collection.GitHubPullRequest, "fetch_pull_request_details", fetch_details
+    )
+    numbers = []
+    for pr in collection.hydrate_pull_requests(
+        iter(pull_requests), max_workers=4, authors=False, max_pending=10
+    ):
+        numbers.append(pr.number)
+        with lock:
+            yielded[0] += 1
+    assert numbers == list(range(1, 201))
+    assert most_pending[0] <= 10
+
+
+def test_hydration_reports_failures_and_keeps_going(github, monkeypatch):
+    github(pull_requests=20)
+    pull_requests = list(make_repository().iter_pull_requests())
+
+    def fetch_details(pr):
+        if pr.number == 5:
+            raise requests.ConnectionError("connection reset")
+        return pr.number != 7
+
+    monkeypatch.setattr(
+        collection.GitHubPullRequest, "fetch_pull_request_details", fetch_details
+    )
+    errors = []
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        hydrated = list(
+            collection.hydrate_pull_requests(
+                pull_requests, max_workers=3, authors=False, errors=errors
+            )
+        )
+    assert [pr.number for pr in hydrated] == list(range(1, 21))
+    assert errors == [(5, "connection reset"), (7, "request failed")]
+    assert "Error: Unable to fetch details for pull request #5" in output.getvalue()
+
+
+def test_resumed_run_matches_an_uninterrupted_one(github, monkeypatch):
+    github(pull_requests=300, users=12)
+    run_batch("octo/one", "--output-dir", "clean")
+
+    record_details = collection.CollectionJournal.record_details
+    recorded = [0]
+
+    def crash(self, full_name, pr):
+        recorded[0] += 1
+        if recorded[0] == 120:
+            raise KeyboardInterrupt
+        return record_details(self, full_name, pr)
+
+    monkeypatch.setattr(collection.CollectionJournal, "record_details", crash)
+    options = ["--output-dir", "resumed", "--journal", "journal.sqlite"]
+    try:
+        run_batch("octo/one", "--workers", "1", *options)
+    except KeyboardInterrupt:
+        pass
+    else:
+        raise AssertionError("the first run should have been interrupted")
+
+    monkeypatch.setattr(collection.CollectionJournal, "record_details", record_details)
+    run_batch("octo/one", *options)
+    assert output_rows("resumed") == output_rows("clean")
+
+
+def test_replay_rebuilds_the_recorded_run(github):
+    server = github(pull_requests=80, users=6)
+    run_batch("octo/one", "--output-dir", "recorded", "--record", "archive")
+    requests_served = server.windows["core"][1]
+
+    run_batch("octo/one", "--output-dir", "replayed", "--replay", "archive")
+    assert server.windows["core"][1] == requests_served
+    assert output_rows("replayed") == output_rows("recorded")
+
+
+def test_rate_limit_buckets_are_per_token_and_resource():
+    limiter = collection.RateLimiter(["a", "b"])
+    reset = str(time.time() + 3600)
+    exhausted = types.SimpleNamespace(
+        headers={
+            "X-RateLimit-Resource": "core",
+            "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset": reset,
+        }
+    )
+    limiter.update("a", exhausted)
+    assert limiter.reserve("core") == (True, "b")
+    # The GraphQL points of token a are untouched
+    assert limiter.reserve("graphql")[0]
+
+    limiter.update("b", exhausted)
+    acquired, wait = limiter.reserve("core")
+    assert not acquired and wait > 3500
+
+
+def test_analytics_notice_pull_requests_hydrated_in_place(github):
+    github(pull_requests=30)
+    repo = make_repository()
+    repo.fetch_pull_requests()
+    assert collection.analytics.frame(repo)["additions"].sum() == 0
+
+    collection.fetch_all_pull_request_details(repo.pull_requests, authors=False)
+    additions = sum(number % 500 for number in range(1, 31))
+    assert collection.analytics.frame(repo)["additions"].sum() == additions
+
+
+def test_async_hydration_fails_single_pull_requests_and_cleans_up(monkeypatch):
+    import asyncio
+
+    pull_requests = [
+        collection.GitHubPullRequest({"number": number}) for number in range(1, 21)
+    ]
+    started = []
+
+    async def fetch_details(pr):
+        started.append(pr.number)
+        if pr.number == 3:
+            raise ValueError("malformed response")
+        await asyncio.sleep(0.01 if pr.number > 2 else 0)
+        return True
+
+    monkeypatch.setattr(
+        collection.GitHubPullRequest, "fetch_pull_request_details_async", fetch_details
+    )
+
+    async def run():
+        errors = []
+        hydrated = collection.hydrate_pull_requests_async(
+            pull_requests, authors=False, errors=errors, max_pending=10
+        )
+        numbers = [(await hydrated.__anext__()).number for _ in range(4)]
+        await hydrated.aclose()
+        pending = [
+            task for task in asyncio.all_tasks() if task is not asyncio.current_task()
+        ]
+        return numbers, errors, pending
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        numbers, errors, pending = asyncio.run(run())
+    assert numbers == [1, 2, 3, 4]
+    assert errors == [(3, "malformed response")]
+    assert pending == []
+    assert len(started) < 20
+
+
+def test_rate_limit_wait_time_is_wall_clock():
+    limiter = collection.RateLimiter(["a"])
+    limiter._resource_buckets("core")["a"].update(remaining=0, reset=time.time() + 10)
+    # Eight threads blocked on the same reset wait about ten seconds, not 80
+    waits = [limiter.reserve()[1] for _ in range(8)]
+    assert limiter.wait_count == 8
+    assert max(waits) - 0.1 <= limiter.wait_time <= max(waits) + 0.1
@@ -0,0 +1,80 @@
+import contextlib
+import io
+
+import pytest
+
+import collection
+
+
+def collect(backend):
+    client = collection.GitHubClient()
+    users = collection.UserRegistry(client)
+    with contextlib.redirect_stdout(io.StringIO()):
+        repo = collection.collect_data_for_repository(
+            "octo", "one", users, client=client, backend=backend
+        )
+    client.close()
+    return repo
+
+
+def rows(repo):
+    return sorted(
+        (pr.to_row(), sorted(pr.authors.items())) for pr in repo.pull_requests
+    )
+
+
+@pytest.mark.parametrize("pull_requests", [7, 230])
+def test_graphql_matches_rest(github, pull_requests):
+    github(pull_requests=pull_requests, users=9)
+    rest = collect("rest")
+    graphql = collect("graphql")
+    assert len(rest.pull_requests) == pull_requests
+    assert rows(graphql) == rows(rest)
+
+
+def test_graphql_spends_fewer_requests(github):
+    github(pull_requests=120)
+    client = collection.GitHubClient()
+    users = collection.UserRegistry(client)
+    with contextlib.redirect_stdout(io.StringIO()):
+        collection.collect_data_for_repository(
+            "octo", "one", users, client=client, backend="rest"
+        )
+    rest_requests = client.stats()["requests"]
+    client.close()
+
+    client = collection.GitHubClient()
+    users = collection.UserRegistry(client)
+    with contextlib.redirect_stdout(io.StringIO()):
+        collection.collect_data_for_repository(
+            "octo", "one", users, client=client, backend="graphql"
+        )
+    # One detail request per pull request is saved; commit authors still
+    # come from REST
+    assert client.stats()["requests"] <= rest_requests - 120
+
+
+def test_graphql_parses_nodes():
+    node = {
+        "number": 5,
+        "title": "Fix",
+        "body": None,
+        "state": "MERGED",
+        "createdAt": "2024-01-01T00:00:00Z",
+        "closedAt": "2024-01-02T00:00:00Z",
+        "updatedAt": "2024-01-02T00:00:00Z",
+        "mergedAt": "2024-01-02T00:00:00Z",
+        "author": None,
+        "baseRepository": {"nameWithOwner": "octo/one"},
+        "commits": {"totalCount": 3},
+        "additions": 10,
+        "deletions": 2,
+        "changedFiles": 1,
+    }
+    pr = collection.GitHubPullRequest.from_graphql(node)
+    assert (pr.state, pr.repo_name, pr.commits, pr.merged_at) == (
+        "closed",
+        "octo/one",
+        3,
+        "2024-01-02T00:00:00Z",
+    )
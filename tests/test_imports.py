@@ -0,0 +1,44 @@
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmark import LAZY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing collection must stay cheap; the LAZY_MODULES stacks load on
+# first use
+IMPORT_BUDGET_MS = 300
+
+
+def import_collection():
+    # A fresh interpreter per run, so nothing is already in sys.modules.
+    # Returns the cumulative import time in ms and the lazy modules loaded.
+    check = (
+        "import sys, collection; "
+        f"print(*[name for name in {LAZY_MODULES!r} if name in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == "collection":
+            return int(fields[1]) / 1000, result.stdout.split()
+    raise AssertionError("collection missing from -X importtime output")
+
+
+def test_import_time_within_budget():
+    timings = [import_collection()[0] for _ in range(3)]
+    assert statistics.median(timings) <= IMPORT_BUDGET_MS, timings
+
+
+def test_heavy_stacks_are_not_imported_eagerly():
+    _, loaded = import_collection()
+    assert loaded == []
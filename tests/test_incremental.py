@@ -0,0 +1,67 @@
+import csv
+
+import collection
+from conftest import run_batch
+
+
+def read_csv(file_name):
+    with open(file_name, newline="", encoding="utf-8") as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+def user_counts(file_name="out/users.csv"):
+    return {
+        row["username"]: int(row["pull_requests_count"]) for row in read_csv(file_name)
+    }
+
+
+def store_counts(file_name="store.sqlite"):
+    store = collection.DataStore(file_name)
+    try:
+        return dict(store._query("SELECT username, pull_requests_count FROM users"))
+    finally:
+        store.close()
+
+
+def test_incremental_run_keeps_user_totals(github):
+    server = github(pull_requests=120, users=8)
+    options = ["--incremental", "--output-dir", "out", "--store", "store.sqlite"]
+    run_batch("octo/one", *options)
+    before = user_counts()
+    assert store_counts() == before
+
+    server.touch(3, 17, 40, 41, 99)
+    output = run_batch("octo/one", *options)
+    # The pull request at the watermark itself is listed again
+    assert "Updated pull requests: 6" in output
+    assert user_counts() == before
+    assert store_counts() == before
+
+    pull_requests = read_csv("out/pull_requests.csv")
+    assert len(pull_requests) == 120
+    assert len({row["number"] for row in pull_requests}) == 120
+
+
+def test_incremental_run_seeds_from_csv(github):
+    server = github(pull_requests=60, users=5)
+    run_batch("octo/one", "--incremental", "--output-dir", "out")
+    before = user_counts()
+
+    server.touch(1, 2)
+    repositories = collection.load_previous_repositories(["octo/one"], output_dir="out")
+    assert len(repositories["octo/one"].pull_requests) == 60
+    run_batch("octo/one", "--incremental", "--output-dir", "out")
+    assert user_counts() == before
+    assert len(read_csv("out/pull_requests.csv")) == 60
+
+
+def test_totals_cover_repositories_from_earlier_runs(github):
+    github(pull_requests=40, users=6)
+    options = ["--output-dir", "out", "--store", "store.sqlite"]
+    run_batch("octo/one", "octo/two", *options)
+    both = user_counts()
+
+    # A later run over one repository must not drop the other's share
+    run_batch("octo/two", *options)
+    assert user_counts() == both
+    assert store_counts() == both
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+import benchmark
+import collection
+
+# contributions in the last year, followers, following
+EXPECTED = {
+    "active.html": (2876, 942, 31),
+    "casual.html": (143, 27, 48),
+    "new.html": (0, 1, 0),
+}
+PARSERS = ["html.parser"] + (["lxml"] if collection.HTML_PARSER == "lxml" else [])
+
+
+def read_fixture(file_name):
+    with open(os.path.join(benchmark.PROFILE_FIXTURES, file_name), "rb") as fixture:
+        return fixture.read()
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("file_name", sorted(EXPECTED))
+def test_saved_profiles_parse(file_name, parser, capsys):
+    content = read_fixture(file_name)
+    user = collection.GitHubUser("fixture")
+    user.parse_profile_html(content, parser=parser)
+    counts = (user.contributions_last_year, user.followers_count, user.following_count)
+    assert counts == EXPECTED[file_name] == benchmark.legacy_parse(content)
+
+    user = collection.GitHubUser("fixture")
+    user.parse_profile_html(content, contributions_only=True, parser=parser)
+    assert user.contributions_last_year == EXPECTED[file_name][0]
+    assert "Error" not in capsys.readouterr().out
+
+
+def test_profile_benchmark_uses_the_saved_pages(capsys):
+    results = benchmark.benchmark_profiles(iterations=1)
+    assert len(results) == 1 + 2 * len(PARSERS)
+    assert f"Profile fixtures: {len(EXPECTED)}," in capsys.readouterr().out
@@ -0,0 +1,144 @@
+import csv
+import time
+
+import collection
+from conftest import run_batch
+
+
+def read_csv(file_name):
+    with open(file_name, newline="", encoding="utf-8") as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_csv_quotes_fields_and_upserts_on_key(tmp_path):
+    file_name = str(tmp_path / "rows.csv")
+    rows = [
+        ["1", 'a "quoted" title', "comma, separated"],
+        ["2", "line\nbreak", ""],
+        ["3", "plain", "text"],
+    ]
+    with collection.CSVWriter(file_name, ["id", "title", "body"], key=["id"]) as writer:
+        for row in rows:
+            writer.write_row(row)
+    assert read_csv(file_name) == [["id", "title", "body"]] + rows
+
+    # A second run replaces row 2, keeps the others and adds row 4
+    with collection.CSVWriter(
+        file_name, ["id", "title", "body"], batch_size=1, key=["id"]
+    ) as writer:
+        writer.write_row(["2", "edited,\r\n again", '""'])
+        writer.write_row(["4", "new", "row"])
+    assert read_csv(file_name) == [
+        ["id", "title", "body"],
+        rows[0],
+        rows[2],
+        ["2", "edited,\r\n again", '""'],
+        ["4", "new", "row"],
+    ]
+
+
+def test_incremental_rollups_match_a_rebuild(github):
+    server = github(pull_requests=150, users=9)
+    options = ["--incremental", "--output-dir", "out", "--store", "store.sqlite"]
+    run_batch("octo/one", "octo/two", *options)
+    server.touch(5, 60, 61, 149)
+    run_batch("octo/one", *options)
+
+    store = collection.DataStore("store.sqlite")
+    try:
+        periods = {period: store.rollups(period=period) for period in ("day", "week")}
+        one = store.rollups(["octo/one"], period="week")
+        assert sum(row["opened"] for row in periods["week"]) == 300
+        store.rebuild_rollups()
+        for period, rollups in periods.items():
+            assert store.rollups(period=period) == rollups
+        assert store.rollups(["octo/one"], period="week") == one
+    finally:
+        store.close()
+
+
+def test_queue_leases_once_and_requeues_expired_leases(tmp_path):
+    queue = collection.SQLiteWorkQueue(str(tmp_path / "queue.sqlite"))
+    assert queue.submit("repository", {"name": "octo/one"}, key="octo/one")
+    assert not queue.submit("repository", {"name": "octo/one"}, key="octo/one")
+
+    first = queue.lease("w1", visibility_timeout=0.2)
+    assert first["payload"] == {"name": "octo/one"} and first["attempts"] == 1
+    assert queue.lease("w2") is None
+
+    time.sleep(0.3)
+    second = queue.lease("w2")
+    assert (second["id"], second["attempts"]) == (first["id"], 2)
+    # The first worker's lease ran out, so its answer no longer counts
+    assert not queue.complete(first, {"pull_requests": 1})
+    assert not queue.extend(first)
+    assert queue.complete(second, {"pull_requests": 2})
+    assert list(queue.results("repository")) == [
+        ({"name": "octo/one"}, {"pull_requests": 2})
+    ]
+    assert queue.counts()["done"] == 1
+    queue.close()
+
+
+def test_queue_retries_failures_up_to_max_attempts(tmp_path):
+    queue = collection.SQLiteWorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2)
+    queue.retry_delay = lambda attempts: 0
+    queue.submit("repository", {"name": "octo/one"}, key="octo/one")
+
+    assert queue.fail(queue.lease("w1"), "boom")
+    assert queue.counts()["pending"] == 1
+    assert queue.fail(queue.lease("w1"), "boom again")
+    assert queue.lease("w1") is None
+    assert queue.failures() == [("repository", {"name": "octo/one"}, "boom again")]
+    assert queue.unfinished() == 0
+    queue.close()
+
+
+def make_pull_request(number, title, body):
+    return collection.GitHubPullRequest(
+        {"number": number, "title": title, "body": body, "state": "open"}
+    )
+
+
+def test_store_reuses_and_compacts_replaced_text(monkeypatch):
+    monkeypatch.setattr(collection.PullRequestStore, "_compact_threshold", 1000)
+    store = collection.PullRequestStore(
+        make_pull_request(number, f"title {number}", "body " * 100)
+        for number in range(1, 11)
+    )
+    spilled = store._body_end
+
+    # Shorter text is written over the old
+    store[0] = make_pull_request(1, "short", "edited")
+    assert store._body_end == spilled
+    assert (store[0].title, store[0].body) == ("short", "edited")
+
+    # Longer text is appended, until the unused bytes are compacted away
+    for length in range(600, 640):
+        store[0] = make_pull_request(1, "t" * length, "b" * length)
+    live = sum(len(pr.body) for pr in store)
+    assert live == 9 * 500 + 639
+    assert store._body_end <= 2 * live
+    assert len(store._titles) <= 2 * sum(len(pr.title) for pr in store)
+    assert (store[0].title, store[0].body) == ("t" * 639, "b" * 639)
+    assert [pr.body for pr in store[1:]] == ["body " * 100] * 9
+
+    bodies = store._bodies
+    with collection.GitHubRepository("octo", "one", "", "", "", 0, 0) as repo:
+        repo.pull_requests = store
+    assert bodies.closed
+
+
+def test_repository_task_reports_a_lease_lost_on_the_last_batch(github, tmp_path):
+    github(pull_requests=150)
+    queue = collection.SQLiteWorkQueue(str(tmp_path / "queue.sqlite"))
+    collection.submit_repositories(queue, ["octo/one"], batch_size=100)
+    task = queue.lease("w1")
+    extended = []
+    queue.extend = lambda task: extended.append(task) or len(extended) < 2
+
+    client = collection.GitHubClient()
+    result = collection._run_repository_task(queue, task, client, 1)
+    assert result == (None, "lease lost")
+    assert len(extended) == 2
+    queue.close()